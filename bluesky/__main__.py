@@ -21,6 +21,8 @@ def main():
         script/program. The corresponding modes are:
         - sim: The normal simulation process started by a BlueSky server
         - sim-detached: An isolated simulation node, without networking
+        - batch: An isolated simulation node that runs all scenarios of a
+          batch file in fast-time, and reports the simulation speed
     """
     # When importerror gives different name than (pip) install needs,
     # also advise latest version
@@ -31,13 +33,19 @@ def main():
     try:
         # Parse command-line arguments
         args = cmdargs.parse()
+        # In batch mode the scenario file is the batch file, which is not
+        # loaded as initial scenario
+        batchfile = args.pop('scenfile') if args['batch'] else None
         # Initialize bluesky modules. Pass command-line arguments parsed by cmdargs
         bs.init(**args)
 
-        # Only start a simulation node if called with --sim or --detached
+        # Only start a simulation node if called with --sim, --detached or --batch
         if bs.mode == 'sim':
             bs.net.connect()
-            bs.net.run()
+            if batchfile:
+                bs.sim.runbatch(batchfile)
+            else:
+                bs.net.run()
         else:
             # Only print start message in the non-sim cases to avoid printing
             # this for every started node
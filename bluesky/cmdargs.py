@@ -5,7 +5,7 @@ import argparse
 def parse():
     parser = argparse.ArgumentParser(prog="BlueSky", description="   *****   BlueSky Open ATM simulator *****")
 
-    def setmodegui(mode, gui=None, discoverable=None, detached=None):
+    def setmodegui(mode, gui=None, discoverable=None, detached=None, batch=None):
         class ModeGuiAction(argparse.Action):
             def __call__(self, parser, namespace, values=None, option_string=''):
                 namespace.mode = mode
@@ -15,13 +15,15 @@ def parse():
                     namespace.discoverable = discoverable
                 if detached is not None:
                     namespace.detached = detached
+                if batch is not None:
+                    namespace.batch = batch
 
         return ModeGuiAction
 
 
     # Add all possible arguments to bluesky here
     mode = parser.add_mutually_exclusive_group()
-    mode.set_defaults(mode="server", gui="qtgl", hostname=None, detached=False)
+    mode.set_defaults(mode="server", gui="qtgl", hostname=None, detached=False, batch=False)
     mode.add_argument("--headless", dest="mode", action=setmodegui("server", discoverable=True), nargs=0, help="Start simulation server only, without GUI.")
     mode.add_argument("--client", dest="hostname", action=setmodegui("client", "qtgl"),
                     nargs="?", default=None, help="Start QtGL graphical client, which can connect to an already running server. When no hostname is passed, a discovery dialog is shown to let the user select a BlueSky server")
@@ -31,6 +33,8 @@ def parse():
                     nargs=0, help="Start only one simulation node.")
     mode.add_argument("--detached", dest="mode", action=setmodegui("sim", detached=True),
                     nargs=0, help="Start only one simulation node, without networking.")
+    mode.add_argument("--batch", dest="mode", action=setmodegui("sim", detached=True, batch=True),
+                    nargs=0, help="Run all scenarios in the batch file passed as scenario file in fast-time, without networking, and report the simulation speed.")
 
 
     parser.add_argument("--configfile", dest="configfile",
@@ -45,5 +49,7 @@ def parse():
     parser.add_argument("--discoverable", dest="discoverable", action="store_const", const=True,
                         default=False, help="Make simulation server discoverable. (Default in headless mode).")
     cmdargs = parser.parse_args()
+    if cmdargs.batch and not getattr(cmdargs, "scenfile", None):
+        parser.error("--batch needs a batch scenario file.")
 
     return vars(cmdargs)
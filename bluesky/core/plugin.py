@@ -63,12 +63,16 @@ class Plugin:
 
             if self.plugin_type == 'sim':
                 dt = max(config.get('update_interval', 0.0), bs.sim.simdt)
+                # Plugins can stagger their timed functions with respect to
+                # the other periodic functions, to spread the load
+                stagger = config.get('stagger', False)
                 # Add timed functions if present
                 for hook in ('preupdate', 'update', 'reset'):
                     fun = config.get(hook)
                     if fun:
                         timed_function(
-                            fun, name=f'{self.plugin_name}.{fun.__name__}', dt=dt, hook=hook)
+                            fun, name=f'{self.plugin_name}.{fun.__name__}', dt=dt, hook=hook,
+                            stagger=stagger)
 
                 # Add the plugin as data parent to the variable explorer
                 ve.register_data_parent(self.imp, self.plugin_name.lower())
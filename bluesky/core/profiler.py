@@ -0,0 +1,164 @@
+''' Wall-clock profiler of the stages of the simulation loop. '''
+import csv
+from datetime import datetime
+from time import perf_counter_ns
+import numpy as np
+import bluesky as bs
+from bluesky import settings
+
+
+# profile:        Start the simulation with the profiler switched on
+# profile_window: Number of most recent calls of each stage that are kept
+#                 for the percentiles and histograms
+settings.set_variable_defaults(profile=False, profile_window=1000, log_path='output')
+
+# Upper edges [ns] of the histogram bins: decades from 1 us to 1 s
+BINS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9, np.inf)
+BINNAMES = ('<1us', '<10us', '<100us', '<1ms', '<10ms', '<100ms', '<1s', '>=1s')
+
+# Columns of the report and the csv dump
+FIELDS = ('stage', 'calls', 'total_ms', 'mean_ms', 'step_ms', 'p50_ms', 'p90_ms',
+          'p99_ms', 'max_ms') + BINNAMES
+
+# Switched on by PROFILE ON, or the profile setting
+active = settings.profile
+
+# Statistics of all profiled stages, as 'group.name': Stage
+stages = dict()
+
+
+class Stage:
+    ''' Accumulated and recent wall-clock times of one profiled stage. '''
+    def __init__(self, name):
+        self.name = name
+        self.ncalls = 0
+        self.total = 0
+        self.tmax = 0
+        self.recent = np.zeros(settings.profile_window, dtype=np.int64)
+
+    def add(self, ns):
+        ''' Add the time [ns] of one call of this stage. '''
+        self.recent[self.ncalls % len(self.recent)] = ns
+        self.ncalls += 1
+        self.total += ns
+        self.tmax = max(self.tmax, ns)
+
+    def window(self):
+        ''' The times [ns] of the most recent calls of this stage. '''
+        return self.recent[:min(self.ncalls, len(self.recent))]
+
+    def percentiles(self, q=(50, 90, 99)):
+        ''' Percentiles [ms] of the times of the most recent calls. '''
+        return np.percentile(self.window(), q) * 1e-6
+
+    def histogram(self):
+        ''' Number of recent calls in each of the decade bins of BINS. '''
+        return np.bincount(np.searchsorted(BINS, self.window(), side='right'),
+                           minlength=len(BINS))[:len(BINS)]
+
+    def row(self, nsteps):
+        ''' Statistics of this stage as a dict, with times in [ms]. '''
+        p50, p90, p99 = self.percentiles()
+        return dict(stage=self.name, calls=self.ncalls,
+                    total_ms=self.total * 1e-6, mean_ms=self.total / self.ncalls * 1e-6,
+                    step_ms=self.total / max(1, nsteps) * 1e-6, p50_ms=p50,
+                    p90_ms=p90, p99_ms=p99, max_ms=self.tmax * 1e-6,
+                    **dict(zip(BINNAMES, self.histogram().tolist())))
+
+
+def tic():
+    ''' Start time [ns] of a profiled stage, or zero when the profiler is off. '''
+    return perf_counter_ns() if active else 0
+
+
+def toc(name, tstart):
+    ''' Record the time of stage name, started at tstart.
+        Returns the start time of a following stage. '''
+    if not tstart:
+        return 0
+    tend = perf_counter_ns()
+    record(name, tend - tstart)
+    return tend
+
+
+def record(name, ns):
+    ''' Record ns nanoseconds for stage name, when the profiler is on. '''
+    if active:
+        stage = stages.get(name)
+        if stage is None:
+            stage = stages[name] = Stage(name)
+        stage.add(ns)
+
+
+def reset():
+    ''' Clear all statistics. The profiler stays on or off. '''
+    stages.clear()
+
+
+def nsteps():
+    ''' Number of simulation steps that were profiled. '''
+    stage = stages.get('sim.step')
+    return stage.ncalls if stage else 0
+
+
+def rows():
+    ''' Statistics of all stages, with the stages of each group from
+        most to least expensive. '''
+    n = nsteps()
+    return [stage.row(n) for stage in
+            sorted(stages.values(), key=lambda s: (s.name.split('.', 1)[0], -s.total))]
+
+
+def report():
+    ''' Text table of the statistics of all stages. '''
+    text = f'Profile of {nsteps()} steps [ms]:\n' + \
+        f'{"stage":<28}{"calls":>8}{"mean":>9}{"step":>9}{"p50":>9}{"p90":>9}{"p99":>9}{"max":>9}'
+    for row in rows():
+        text += f'\n{row["stage"]:<28}{row["calls"]:>8}' + \
+            ''.join(f'{row[key]:>9.3f}' for key in
+                    ('mean_ms', 'step_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms'))
+    return text
+
+
+def dump(fname=None):
+    ''' Write the statistics of all stages to a csv file in the log path. '''
+    if not fname:
+        timestamp = datetime.now().strftime('%Y%m%d_%H-%M-%S')
+        fname = f'PROFILE_{bs.stack.get_scenname()}_{timestamp}.csv'
+    path = settings.resolve_path(settings.log_path) / fname
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows())
+    return path
+
+
+def siminfo():
+    ''' Summary for the SIMINFO stream: mean time [ms] of the stages of
+        the simulation step over the recent window, empty when off. '''
+    if not active:
+        return dict()
+    return {name[4:]: float(stage.window().mean()) * 1e-6 for name, stage in
+            stages.items() if name.startswith('sim.')}
+
+
+def profile(cmd='REPORT', fname=''):
+    ''' PROFILE command: switch the profiler on or off, or report or dump
+        the statistics. '''
+    global active
+    cmd = cmd.upper()
+    if cmd == 'ON':
+        reset()
+        active = True
+        return True, 'Profiler on'
+    if cmd == 'OFF':
+        active = False
+        return True, 'Profiler off'
+    if cmd not in ('REPORT', 'DUMP'):
+        return False, f'PROFILE: unknown option {cmd}'
+    if not stages:
+        return True, 'No profile data' + ('' if active else ', use PROFILE ON')
+    if cmd == 'REPORT':
+        return True, report()
+    return True, f'Profile written to {dump(fname)}'
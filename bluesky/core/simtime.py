@@ -3,8 +3,10 @@ import inspect
 from collections import OrderedDict
 from inspect import signature
 from types import SimpleNamespace
-from decimal import Decimal
+from decimal import Decimal, ROUND_CEILING
+from time import perf_counter_ns
 from bluesky import settings
+from bluesky.core import profiler
 
 
 # Register settings defaults
@@ -30,6 +32,10 @@ def setdt(newdt=None, target='simdt'):
         text = f'Simulation timesteps:\nbase dt = {_clock.fdt}'
         for timer in _timers.values():
             text += f'\n{timer.name} = {timer.dt_act}'
+            if timer.ncalls:
+                # Measured cost per call, and averaged over all base timesteps
+                cost = timer.tcalls / timer.ncalls * 1e-6
+                text += f'  ({cost:.3f} ms/call, {cost / timer.rel_freq:.3f} ms/step)'
         return True, text
     if target == 'simdt':
         _clock.dt = Decimal(repr(newdt))
@@ -61,6 +67,24 @@ def step(recovery_time=0):
     return _clock.ft, _clock.fdt + float(recovery_time)
 
 
+def skip(tnext):
+    ''' Skip the base timesteps up to the one that ends at or after
+        simulation time tnext, without calling any timed functions.
+        The clock is incremented with a whole number of base timesteps, so
+        the next call of step() arrives at the first base timestep at or
+        after tnext, and all timers keep their phase.
+        Returns a floating-point representation of the skipped time. '''
+    nskip = int(((Decimal(repr(tnext)) - _clock.t) / _clock.dt).to_integral_value(ROUND_CEILING)) - 1
+    if nskip <= 0:
+        return 0.0
+    _clock.t += nskip * _clock.dt
+    _clock.ft = float(_clock.t)
+    for timer in _timers.values():
+        timer.step(nskip)
+
+    return nskip * _clock.fdt
+
+
 def preupdate():
     ''' Update function executed before traffic update.'''
     for fun in preupdate_funs.values():
@@ -84,39 +108,59 @@ def reset():
     _clock.dt = Decimal(repr(settings.simdt))
     _clock.ft = 0.0
     _clock.fdt = float(_clock.dt)
+    # Reset all timers before setting their intervals, so that staggered
+    # timers are phased with respect to the reset state of the other timers,
+    # and set the intervals of the staggered timers last
     for timer in _timers.values():
         timer.reset()
+    for timer in sorted(_timers.values(), key=lambda timer: timer.stagger):
+        timer.setdt()
 
 
 class Timer:
-    ''' Timer class for simulation-time periodic functions. '''
+    ''' Timer class for simulation-time periodic functions.
+
+        Timers with stagger=True don't trigger in the same base timestep as
+        all other timers with the same interval: their first trigger is
+        placed in the base timestep (within one interval) in which the
+        fewest other periodic timers trigger. This spreads the load of
+        periodic functions over the base timesteps. The choice only depends
+        on the timer intervals, so simulation results are reproducible.
+    '''
     @classmethod
-    def maketimer(cls, name, dt):
+    def maketimer(cls, name, dt, stagger=False):
         ''' Create and return a new timer if none with the given name exists.
             Return existing timer if present. '''
-        return _timers.get(name.upper(), cls(name, dt))
+        timer = _timers.get(name.upper())
+        return timer or cls(name, dt, stagger)
 
-    def __init__(self, name, dt):
+    def __init__(self, name, dt, stagger=False):
         self.name = name
+        self.stagger = stagger
         self.dt_default = Decimal(repr(dt))
         self.dt_requested = self.dt_default
         self.dt_act = self.dt_default
         self.rel_freq = 0
         self.counter = 0
         self.tprev = _clock.t
+        # Number of calls and total time [ns] of the function(s) of this timer
+        self.ncalls = 0
+        self.tcalls = 0
         self.setdt()
 
         # Add self to dictionary of timers
         _timers[name.upper()] = self
 
     def reset(self):
-        ''' Reset all simulation timers to their default time interval. '''
+        ''' Reset all simulation timers to their default time interval.
+            The interval is applied with setdt(). '''
         self.dt_requested = self.dt_default
         self.dt_act = self.dt_default
         self.rel_freq = 0
         self.counter = 0
         self.tprev = _clock.t
-        self.setdt()
+        self.ncalls = 0
+        self.tcalls = 0
 
     def setdt(self, dt=None):
         ''' Set the update interval of this timer. '''
@@ -130,8 +174,14 @@ class Timer:
         # Calculate the relative frequency of the simulation with respect to this timer
         rel_freq = max(1, int(self.dt_requested // _clock.dt))
         # Update timer to next trigger point
-        passed = self.rel_freq - self.counter
-        self.counter = max(0, rel_freq - passed)
+        if rel_freq == 1:
+            # Timers with the base dt are always ready
+            self.counter = 0
+        elif self.stagger and rel_freq != self.rel_freq:
+            self.counter = self.phase(rel_freq)
+        else:
+            passed = self.rel_freq - self.counter
+            self.counter = max(0, rel_freq - passed)
         self.rel_freq = rel_freq
         dtnew = self.rel_freq * _clock.dt
         if abs(self.dt_act - dtnew) < 0.0001:
@@ -142,9 +192,30 @@ class Timer:
                 f' dt set to {self.dt_act} to match integer multiple of base dt.'
         return True, self.name + f' dt set to {self.dt_act}'
 
-    def step(self):
-        ''' Step is called each base timestep to update this timer. '''
-        self.counter = (self.counter or self.rel_freq) - 1
+    def phase(self, rel_freq):
+        ''' Return the number of base timesteps until the first trigger of
+            this timer with interval rel_freq: the last of the steps in
+            which the fewest other periodic timers trigger. '''
+        load = [0] * rel_freq
+        for timer in _timers.values():
+            if timer is not self and timer.rel_freq > 1:
+                first = timer.counter or timer.rel_freq
+                for i in range(first - 1, rel_freq, timer.rel_freq):
+                    load[i] += 1
+        return min(range(rel_freq, 0, -1), key=lambda n: load[n - 1])
+
+    def record(self, tstart):
+        ''' Record the cost of a call of a function of this timer that
+            started at perf_counter_ns() time tstart. '''
+        ns = perf_counter_ns() - tstart
+        self.ncalls += 1
+        self.tcalls += ns
+        profiler.record('timer.' + self.name, ns)
+
+    def step(self, nsteps=1):
+        ''' Step is called each base timestep to update this timer, or once
+            for a number of skipped base timesteps. '''
+        self.counter = (self.counter - nsteps) % self.rel_freq
 
     def readynext(self):
         ''' Returns True if a time interval of this timer has passed. '''
@@ -159,7 +230,7 @@ class Timer:
 
 class TimedFunction:
     ''' Wrapper object to hold (periodically) timed functions. '''
-    def __init__(self, fun, name, dt=0, hook=''):
+    def __init__(self, fun, name, dt=0, hook='', stagger=False):
         self.trigger = None
         self.hook = hook
         if hasattr(fun, '__manualtimer__'):
@@ -170,7 +241,7 @@ class TimedFunction:
         else:
             self.name = name
             # reset is a special case: doesn't need timer, and fun is called directly
-            self.timer = None if hook == 'reset' else Timer.maketimer(name, dt)
+            self.timer = None if hook == 'reset' else Timer.maketimer(name, dt, stagger)
             self.callback = fun
 
     @property
@@ -201,12 +272,16 @@ class TimedFunction:
     def call_timeddt(self):
         ''' Wrapper method to call timed functions that accept dt as argument. '''
         if self.timer.counter == 0:
+            tstart = perf_counter_ns()
             self._callback(dt=float(self.timer.dt_act))
+            self.timer.record(tstart)
 
     def call_timed(self):
         ''' Wrapper method to call timed functions. '''
         if self.timer.counter == 0:
+            tstart = perf_counter_ns()
             self._callback()
+            self.timer.record(tstart)
 
     def notimplemented(self, *args, **kwargs):
         ''' This function is called when a (derived) class is selected that doesn't
@@ -214,8 +289,11 @@ class TimedFunction:
         pass
 
 
-def timed_function(fun=None, name='', dt=0, manual=False, hook='', timer=None):
-    ''' Decorator to turn a function into a (periodically) timed function. '''
+def timed_function(fun=None, name='', dt=0, manual=False, hook='', timer=None,
+                   stagger=False):
+    ''' Decorator to turn a function into a (periodically) timed function.
+        With stagger=True, the timer of the function is staggered with
+        respect to the other timers (see Timer). '''
     def deco(fun):
         # Return original function if it is already wrapped
         if hasattr(fun, '__timedfun__') or (hasattr(fun, '__manualtimer__') and not hook):
@@ -235,25 +313,29 @@ def timed_function(fun=None, name='', dt=0, manual=False, hook='', timer=None):
             tname = name
 
         if manual:
-            manualtimer = timer or Timer.maketimer(tname, dt)
+            manualtimer = timer or Timer.maketimer(tname, dt, stagger)
             if 'dt' in signature(fun).parameters:
                 def wrapper(*args, **kwargs):
                     if manualtimer.counter == 0:
+                        tstart = perf_counter_ns()
                         fun(*args, **kwargs, dt=float(manualtimer.dt_act))
+                        manualtimer.record(tstart)
             else:
                 def wrapper(*args, **kwargs):
                     if manualtimer.counter == 0:
+                        tstart = perf_counter_ns()
                         fun(*args, **kwargs)
+                        manualtimer.record(tstart)
             wrapper.__manualtimer__ = manualtimer
             wrapper.__func__ = fun
             return wrapper
         # Add automatically-triggered function to appropriate dict if not there yet.
         if hook == 'preupdate' and tname not in preupdate_funs:
-            preupdate_funs[tname] = TimedFunction(fun, tname, dt, hook)
+            preupdate_funs[tname] = TimedFunction(fun, tname, dt, hook, stagger)
         elif hook == 'reset' and tname not in reset_funs:
             reset_funs[tname] = TimedFunction(fun, tname, dt, hook)
         elif tname not in update_funs:
-            update_funs[tname] = TimedFunction(fun, tname, dt, 'update')
+            update_funs[tname] = TimedFunction(fun, tname, dt, 'update', stagger)
         return fun
     # Allow both @timed_function and @timed_function(args)
     return deco if fun is None else deco(fun)
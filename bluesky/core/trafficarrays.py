@@ -10,6 +10,9 @@ import numpy as np
 
 defaults = {"float": 0.0, "int": 0, "uint":0, "bool": False, "S": "", "str": ""}
 
+# Initial capacity of the storage buffers behind traffic arrays
+mincapacity = 16
+
 
 class RegisterElementParameters:
     """ Class to use in 'with'-syntax. This class automatically
@@ -51,6 +54,9 @@ class TrafficArrays:
         self._children = []
         self._ArrVars  = []
         self._LstVars  = []
+        # Over-allocated storage buffers for numpy traffic arrays:
+        # {name: (buffer, view)}, where view is buffer[:n] as handed out
+        self._ArrBufs  = dict()
 
     def reparent(self, newparent):
         ''' Give TrafficArrays object a new parent. '''
@@ -87,9 +93,40 @@ class TrafficArrays:
             lst.extend([defaults.get(vartype)] * n)
 
         for v in self._ArrVars:  # Numpy array
+            n0 = len(self.__dict__[v])
+            buf = self._arrbuffer(v, n0 + n)
             # Get type without byte length
-            vartype = ''.join(c for c in str(self.__dict__[v].dtype) if c.isalpha())
-            self.__dict__[v] = np.append(self.__dict__[v], [defaults.get(vartype, 0)] * n)
+            vartype = ''.join(c for c in str(buf.dtype) if c.isalpha())
+            buf[n0:n0 + n] = defaults.get(vartype, 0)
+            self._setview(v, buf, n0 + n)
+
+    def _arrbuffer(self, name, size):
+        ''' Return the storage buffer of traffic array 'name', with room for
+            at least 'size' elements, and filled with the current contents
+            of the array.
+
+            The buffer is reallocated with (at least) double its previous
+            capacity when it runs out of room, so that aircraft creation has
+            an amortised constant cost per array. '''
+        arr = self.__dict__[name]
+        buf, view = self._ArrBufs.get(name, (None, None))
+        if buf is None or buf.dtype != arr.dtype or len(buf) < size:
+            capacity = 0 if buf is None else 2 * len(buf)
+            newbuf = np.empty(max(size, capacity, mincapacity), dtype=arr.dtype)
+            newbuf[:len(arr)] = arr
+            self._ArrBufs[name] = (newbuf, None)
+            return newbuf
+        # The array can have been replaced by a newly calculated array
+        # (e.g., self.lat = self.lat + dlat). Copy its contents into the buffer.
+        if arr is not view:
+            buf[:len(arr)] = arr
+        return buf
+
+    def _setview(self, name, buf, n):
+        ''' Make traffic array 'name' a view on the first n elements of buf. '''
+        view = buf[:n]
+        self._ArrBufs[name] = (buf, view)
+        self.__dict__[name] = view
 
     def istrafarray(self, name):
         ''' Returns true if parameter 'name' is a traffic array. '''
@@ -101,14 +138,43 @@ class TrafficArrays:
             child.create(n)
             child.create_children(n)
 
+    def syncbuffers(self):
+        ''' Store the current contents of all traffic arrays of this object
+            and its children in their own storage buffers. '''
+        for child in self._children:
+            child.syncbuffers()
+
+        for v in self._ArrVars:
+            n = len(self.__dict__[v])
+            self._setview(v, self._arrbuffer(v, n), n)
+
     def delete(self, idx):
         ''' Aircraft delete. '''
+        # Arrays can refer to the (buffered) arrays of other objects,
+        # e.g., self.lastlat = bs.traf.lat. Make sure that all arrays have
+        # their own copy before compacting them in-place.
+        if self is TrafficArrays.root:
+            self.syncbuffers()
+
         # Remove element (aircraft) idx from all lists and arrays
         for child in self._children:
             child.delete(idx)
 
+        # Numpy arrays are compacted in-place in their storage buffer,
+        # preserving the order of the remaining elements
         for v in self._ArrVars:
-            self.__dict__[v] = np.delete(self.__dict__[v], idx)
+            n0 = len(self.__dict__[v])
+            buf = self._arrbuffer(v, n0)
+            if isinstance(idx, Collection):
+                keep = np.ones(n0, dtype=bool)
+                keep[idx] = False
+                n = np.count_nonzero(keep)
+                buf[:n] = buf[:n0][keep]
+            else:
+                i = idx if idx >= 0 else n0 + idx
+                n = n0 - 1
+                buf[i:n] = buf[i + 1:n0]
+            self._setview(v, buf, n)
 
         if self._LstVars:
             if isinstance(idx, Collection):
@@ -126,6 +192,7 @@ class TrafficArrays:
 
         for v in self._ArrVars:
             self.__dict__[v] = np.array([], dtype=self.__dict__[v].dtype)
+        self._ArrBufs.clear()
 
         for v in self._LstVars:
             self.__dict__[v] = []
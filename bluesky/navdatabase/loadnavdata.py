@@ -1,5 +1,5 @@
 ''' Loader functions for navigation data. '''
-import pickle
+import numpy as np
 
 from bluesky import settings
 from bluesky.tools import cachefile
@@ -18,25 +18,68 @@ sourcedir = settings.resolve_path(settings.navdata_path)
 
 def load_navdata():
     ''' Load navigation database. '''
-    with cachefile.openfile('navdata.p', navdb_version) as cache:
-        try:
-            wptdata       = cache.load()
-            awydata       = cache.load()
-            aptdata       = cache.load()
-            firdata       = cache.load()
-            codata        = cache.load()
-            rwythresholds = cache.load()
-        except (pickle.PickleError, cachefile.CacheError) as e:
-            print(e.args[0])
-
-            wptdata, aptdata, awydata, firdata, codata = loadnavdata_txt()
-            rwythresholds = loadthresholds_txt()
-
-            cache.dump(wptdata)
-            cache.dump(awydata)
-            cache.dump(aptdata)
-            cache.dump(firdata)
-            cache.dump(codata)
-            cache.dump(rwythresholds)
-
-    return wptdata, aptdata, awydata, firdata, codata, rwythresholds
+    cache = cachefile.openarrays('navdata', navdb_version)
+    try:
+        columns = cache.load()
+    except (OSError, ValueError, KeyError, cachefile.CacheError) as e:
+        print(e)
+
+        wptdata, aptdata, awydata, firdata, codata = loadnavdata_txt()
+        rwythresholds = loadthresholds_txt()
+
+        columns = tocolumns(wptdata, aptdata, awydata, firdata, codata, rwythresholds)
+        cache.dump(columns)
+
+    return fromcolumns(columns)
+
+
+def tocolumns(wptdata, aptdata, awydata, firdata, codata, rwythresholds):
+    ''' Convert the navigation data to a flat dict of columns for the cache. '''
+    columns = dict()
+    for group, data in (('wpt', wptdata), ('apt', aptdata), ('awy', awydata),
+                        ('co', codata)):
+        for key, col in data.items():
+            columns[group + '.' + key] = col
+
+    # FIR borders: names, number of points, and the points of all FIRs
+    columns.update({'fir.' + key: firdata[key] for key in
+                    ('firlat0', 'firlon0', 'firlat1', 'firlon1')})
+    columns['fir.name']  = [fir[0] for fir in firdata['fir']]
+    columns['fir.count'] = np.array([len(fir[1]) for fir in firdata['fir']], dtype=int)
+    columns['fir.lat']   = np.array([lat for fir in firdata['fir'] for lat in fir[1]])
+    columns['fir.lon']   = np.array([lon for fir in firdata['fir'] for lon in fir[2]])
+
+    # Runway thresholds: airports, their number of runways, and the runways
+    # of all airports
+    columns['thr.apt']   = list(rwythresholds.keys())
+    columns['thr.count'] = np.array([len(rwys) for rwys in rwythresholds.values()], dtype=int)
+    rwys = [(rwy, thr) for rwys in rwythresholds.values() for rwy, thr in rwys.items()]
+    columns['thr.rwy']   = [rwy for rwy, _ in rwys]
+    thr = np.array([thr for _, thr in rwys], dtype=float).reshape(-1, 3)
+    columns['thr.lat']   = thr[:, 0]
+    columns['thr.lon']   = thr[:, 1]
+    columns['thr.hdg']   = thr[:, 2]
+    return columns
+
+
+def fromcolumns(columns):
+    ''' Convert the cache columns back to the navigation data dicts. '''
+    data = dict(wpt=dict(), apt=dict(), awy=dict(), co=dict(), fir=dict())
+    for name, col in columns.items():
+        group, key = name.split('.', 1)
+        if group in data:
+            data[group][key] = col
+
+    ends = np.cumsum(data['fir']['count'])
+    lats, lons = data['fir']['lat'].tolist(), data['fir']['lon'].tolist()
+    fir = dict(fir=[[name, lats[end - n:end], lons[end - n:end]] for name, n, end in
+                    zip(data['fir']['name'], np.diff(ends, prepend=0), ends)])
+    fir.update((key, data['fir'][key]) for key in ('firlat0', 'firlon0', 'firlat1', 'firlon1'))
+
+    # Thresholds are tuples of numpy floats, as loaded from the text files
+    thr = iter(zip(columns['thr.rwy'], zip(columns['thr.lat'], columns['thr.lon'],
+                                           columns['thr.hdg'])))
+    rwythresholds = {apt: dict(next(thr) for _ in range(n)) for apt, n in
+                     zip(columns['thr.apt'], columns['thr.count'].tolist())}
+
+    return data['wpt'], data['apt'], data['awy'], fir, data['co'], rwythresholds
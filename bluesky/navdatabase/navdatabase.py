@@ -2,11 +2,21 @@ from math import *
 import numpy as np
 
 from .loadnavdata import load_navdata
+from .spatialindex import SpatialIndex
 from bluesky.tools import geo
 from bluesky.tools.aero import nm
-from bluesky.tools.misc import findall
 import bluesky as bs
 
+
+def nameindex(ids):
+    """Return a dict with for each identifier in list ids the list of
+       indices where it occurs, in order of occurrence."""
+    index = dict()
+    for i, name in enumerate(ids):
+        index.setdefault(name, []).append(i)
+    return index
+
+
 class Navdatabase:
     """
     Navdatabase class definition : command stack & processing class
@@ -14,7 +24,15 @@ class Navdatabase:
     Methods:
         Navdatabase()          :  constructor
 
-        findid(txt,lat,lon)    : find a nav closest to lat,lon
+        getwpidx(txt,lat,lon)  : find a nav closest to lat,lon
+        getwpidxs(names,lat,lon): find many navs at once, closest to lat,lon
+
+        getwpknear(lat,lon,k)  : find the k navs nearest to lat,lon
+        getwpinside(lat0,lat1,lon0,lon1): find all navs inside a box
+
+        Identifiers are looked up in dicts with the indices of each
+        identifier (wpindex, aptindex, awindex, awfromindex, awtoindex),
+        positions in spatial indices (wptree, apttree).
 
 
     Members:
@@ -95,6 +113,17 @@ class Navdatabase:
 
         self.rwythresholds = rwythresholds
 
+        # Indices of each waypoint, airport and airway identifier
+        self.wpindex     = nameindex(self.wpid)
+        self.aptindex    = nameindex(self.aptid)
+        self.awindex     = nameindex(self.awid)
+        self.awfromindex = nameindex(self.awfromwpid)
+        self.awtoindex   = nameindex(self.awtowpid)
+
+        # Spatial indices of waypoints and airports
+        self.wptree  = SpatialIndex(self.wplat, self.wplon)
+        self.apttree = SpatialIndex(self.aptlat, self.aptlon)
+
     def defwpt(self,name=None,lat=None,lon=None,wptype=None):
 
         # Prevent polluting the database: check arguments
@@ -106,7 +135,7 @@ class Navdatabase:
         # No data: give info on waypoint
         elif lat==None or lon==None:
             reflat, reflon = bs.scr.getviewctr()
-            if self.wpid.count(name.upper()) > 0:
+            if name.upper() in self.wpindex:
                 i = self.getwpidx(name.upper(),reflat,reflon)
                 txt = self.wpid[i]+" : "+str(self.wplat[i])+","+str(self.wplon[i])
                 if len(self.wptype[i]+self.wpco[i])>0:
@@ -119,8 +148,10 @@ class Navdatabase:
 
         # Still here? So there is data, then we add this waypoint
         self.wpid.append(name.upper())
+        self.wpindex.setdefault(name.upper(), []).append(len(self.wpid) - 1)
         self.wplat = np.append(self.wplat,lat)
         self.wplon = np.append(self.wplon,lon)
+        self.wptree = SpatialIndex(self.wplat, self.wplon)
 
         if wptype == None:
             self.wptype.append("")
@@ -139,82 +170,70 @@ class Navdatabase:
 
     def getwpidx(self, txt, reflat=999999., reflon=999999):
         """Get waypoint index to access data"""
-        name = txt.upper()
-        try:
-            i = self.wpid.index(name)
-        except:
+        idx = self.wpindex.get(txt.upper())
+        if idx is None:
             return -1
 
         # if no pos is specified, get first occurence
-        if not reflat < 99999.:
-            return i
+        if len(idx) == 1 or not reflat < 99999.:
+            return idx[0]
 
-        # If pos is specified check for more and return closest
-        else:
-            idx = []
-            idx.append(i)
-            found = True
-            while i < len(self.wpid) - 1 and found:
-                try:
-                    i = self.wpid.index(name, i + 1)
-                    idx.append(i)
-                except:
-                    found = False
-            if len(idx) == 1:
-                return idx[0]
-            else:
-                imin = idx[0]
-                dmin = geo.kwikdist(reflat, reflon, self.wplat[imin], self.wplon[imin])
-                for i in idx[1:]:
-                    d = geo.kwikdist(reflat, reflon, self.wplat[i], self.wplon[i])
-                    if d < dmin:
-                        imin = i
-                        dmin = d
-                return imin
+        # If pos is specified return closest
+        dist = geo.kwikdist(reflat, reflon, self.wplat[idx], self.wplon[idx])
+        return idx[np.argmin(dist)]
 
     def getwpindices(self, txt, reflat=999999., reflon=999999,crit=1852.0):
         """Get waypoint index to access data"""
-        name = txt.upper()
-        try:
-            i = self.wpid.index(name)
-        except:
+        idx = self.wpindex.get(txt.upper())
+        if idx is None:
             return [-1]
 
         # if no pos is specified, get first occurence
-        if not reflat < 99999.:
-            return [i]
-
-        # If pos is specified check for more and return closest
-        else:
-            idx = findall(self.wpid,name) # find indices of al occurences
+        if len(idx) == 1 or not reflat < 99999.:
+            return [idx[0]]
+
+        # If pos is specified return closest, and the ones co-located with it
+        dist = geo.kwikdist(reflat, reflon, self.wplat[idx], self.wplon[idx])
+        imin = idx[np.argmin(dist)]
+        dist = nm * geo.kwikdist(self.wplat[idx], self.wplon[idx],
+                                 self.wplat[imin], self.wplon[imin])
+        return [imin] + [i for i, d in zip(idx, dist) if d <= crit and i != imin]
+
+    def getwpidxs(self, names, reflat=999999., reflon=999999.):
+        """Get waypoint indices of a list of names in one vectorized lookup.
+           Of names that occur more than once, the waypoint closest to
+           reflat,reflon is selected. The reference position can be given
+           per name (as arrays), a reference latitude above 99999 selects
+           the first occurrence. Names that are not found get index -1."""
+        # Candidate waypoints: all occurrences of each name, grouped per name
+        cands = [self.wpindex.get(name.upper(), []) for name in names]
+        count = np.array([len(c) for c in cands], dtype=int)
+        offset = np.cumsum(count) - count
+        owner = np.repeat(np.arange(len(names)), count)
+        cand = np.fromiter((i for c in cands for i in c), dtype=int, count=count.sum())
+
+        # Select the closest candidate for each name, the first one on equal
+        # distance or without reference position
+        reflat = np.broadcast_to(reflat, count.shape)[owner]
+        reflon = np.broadcast_to(reflon, count.shape)[owner]
+        dist = np.where(reflat < 99999.,
+                        geo.kwikdist(reflat, reflon, self.wplat[cand], self.wplon[cand]), 0.)
+        closest = np.lexsort((dist, owner))
+
+        found = count > 0
+        idx = np.full(len(names), -1)
+        idx[found] = cand[closest[offset[found]]]
+        return idx
 
-            if len(idx) == 1:
-                return [idx[0]]
-            else:
-                imin = idx[0]
-                dmin = geo.kwikdist(reflat, reflon, self.wplat[imin], self.wplon[imin])
-                for i in idx[1:]:
-                    d = geo.kwikdist(reflat, reflon, self.wplat[i], self.wplon[i])
-                    if d < dmin:
-                        imin = i
-                        dmin = d
-                # Find co-located
-                indices = [imin]
-                for i in idx:
-                    if i!=imin:
-                        dist = nm*geo.kwikdist(self.wplat[i], self.wplon[i], \
-                                            self.wplat[imin], self.wplon[imin])
-                        if dist<=crit:
-                            indices.append(i)
-
-                return indices
+    def getaptidxs(self, names):
+        """Get airport indices of a list of names in one lookup.
+           Names that are not found get index -1."""
+        return np.array([self.aptindex.get(name.upper(), [-1])[0] for name in names],
+                        dtype=int)
 
     def getaptidx(self, txt):
         """Get waypoint index to access data"""
-        try:
-            return self.aptid.index(txt.upper())
-        except:
-            return -1
+        return self.aptindex.get(txt.upper(), [-1])[0]
 
     def getinear(self, wlat, wlon, lat, lon):  # lat,lon in degrees
         # t0 = time.clock()
@@ -229,11 +248,19 @@ class Navdatabase:
 
     def getwpinear(self, lat, lon):  # lat,lon in degrees
         """Get closest waypoint index"""
-        return self.getinear(self.wplat, self.wplon, lat, lon)
+        return self.wptree.knearest(lat, lon)[0]
 
     def getapinear(self, lat, lon):  # lat,lon in degrees
         """Get closest airport index"""
-        return self.getinear(self.aptlat, self.aptlon, lat, lon)
+        return self.apttree.knearest(lat, lon)[0]
+
+    def getwpknear(self, lat, lon, k):  # lat,lon in degrees
+        """Get indices of the k closest waypoints, closest first"""
+        return self.wptree.knearest(lat, lon, k)
+
+    def getapknear(self, lat, lon, k):  # lat,lon in degrees
+        """Get indices of the k closest airports, closest first"""
+        return self.apttree.knearest(lat, lon, k)
 
     def getinside(self, wlat, wlon, lat0, lat1, lon0, lon1):
         """Get indices inside given box"""
@@ -249,11 +276,11 @@ class Navdatabase:
 
     def getwpinside(self, lat0, lat1, lon0, lon1):
         """Get waypoint indices inside box"""
-        return self.getinside(self.wplat, self.wplon, lat0, lat1, lon0, lon1)
+        return list(self.wptree.inside(lat0, lat1, lon0, lon1))
 
     def getapinside(self, lat0, lat1, lon0, lon1):
         """Get airport indicex inside box"""
-        return self.getinside(self.aptlat, self.aptlon, lat0, lat1, lon0, lon1)
+        return list(self.apttree.inside(lat0, lat1, lon0, lon1))
 
     # returns all runways of given airport
     def listairway(self, airwayid):
@@ -262,7 +289,7 @@ class Navdatabase:
         airway = []     # identifier of waypoint   0 .. N-1
 
         # Does this airway exist?
-        if self.awid.count(awkey)>0:
+        if awkey in self.awindex:
             # Collect leg indices
             i = 0
             found = True
@@ -270,8 +297,7 @@ class Navdatabase:
             left  = []  # wps in left column in file
             right = []  # wps in right coumn in file
 
-            idx = findall(self.awid,awkey)
-            for i in idx:
+            for i in self.awindex[awkey]:
                 newleg = self.awfromwpid[i]+"-"+self.awtowpid[i]
                 if newleg not in legs:
                     legs.append(newleg)
@@ -354,23 +380,21 @@ class Navdatabase:
         connect = []
 
         # Check from-list first
-        if wpid in self.awfromwpid:
-            idx = findall(self.awfromwpid,wpid)
-            for i in idx:
+        idx = self.awfromindex.get(wpid, [])
+        if idx:
+            dist = geo.kwikdist(self.awfromlat[idx], self.awfromlon[idx], wplat, wplon)
+            for i, d in zip(idx, dist):
                 newitem = [self.awid[i],self.awtowpid[i]]
-                if (newitem not in connect) and \
-                         geo.kwikdist(self.awfromlat[i],self.awfromlon[i],
-                                  wplat,wplon) < 10.:
+                if (newitem not in connect) and d < 10.:
                     connect.append(newitem)
 
         # Check to-list nextt
-        if wpid in self.awtowpid:
-            idx = findall(self.awtowpid,wpid)
-            for i in idx:
+        idx = self.awtoindex.get(wpid, [])
+        if idx:
+            dist = geo.kwikdist(self.awtolat[idx], self.awtolon[idx], wplat, wplon)
+            for i, d in zip(idx, dist):
                 newitem = [self.awid[i],self.awfromwpid[i]]
-                if (newitem not in connect) and \
-                         geo.kwikdist(self.awtolat[i],self.awtolon[i],
-                                  wplat,wplon) < 10.:
+                if (newitem not in connect) and d < 10.:
                     connect.append(newitem)
 
         return connect # return list of [awid,wpid]
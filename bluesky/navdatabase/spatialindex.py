@@ -0,0 +1,67 @@
+""" Spatial index for nearest and inside queries on navigation data. """
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def unitxyz(lat, lon):
+    """Return the unit-sphere coordinates of positions lat,lon [deg]
+       as an (n, 3) array."""
+    lat = np.radians(np.atleast_1d(lat))
+    lon = np.radians(np.atleast_1d(lon))
+    coslat = np.cos(lat)
+    return np.column_stack((coslat * np.cos(lon), coslat * np.sin(lon), np.sin(lat)))
+
+
+class SpatialIndex:
+    """
+    k-nearest and box queries on a set of positions, using a k-d tree of
+    their unit-sphere coordinates. The tree is built at the first query.
+
+    Methods:
+        knearest(lat,lon,k)            : indices of the k nearest positions
+        inside(lat0,lat1,lon0,lon1)    : indices of the positions inside a box
+    """
+
+    def __init__(self, lat, lon):
+        self.lat  = np.asarray(lat, dtype=float)
+        self.lon  = np.asarray(lon, dtype=float)
+        self._tree = None
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            self._tree = cKDTree(unitxyz(self.lat, self.lon))
+        return self._tree
+
+    def knearest(self, lat, lon, k=1):
+        """Return the indices of the k positions nearest to lat,lon [deg],
+           nearest first."""
+        k = min(k, len(self.lat))
+        if k == 0:
+            return np.zeros(0, dtype=int)
+        _, idx = self.tree.query(unitxyz(lat, lon)[0], k)
+        return np.atleast_1d(idx)
+
+    def inside(self, lat0, lat1, lon0, lon1):
+        """Return the sorted indices of the positions inside the box with
+           latitudes lat0 to lat1 and longitudes lon0 to lon1 [deg].
+           When lon0 > lon1 the box crosses the date line."""
+        dlon = (lon1 - lon0) % 360.
+        if lat1 - lat0 > 90. or dlon > 90. or len(self.lat) == 0:
+            # Large boxes: check all positions
+            cand = np.arange(len(self.lat))
+        else:
+            # Candidates within the circle around the centre of the box that
+            # passes through its farthest corner
+            centre = unitxyz(0.5 * (lat0 + lat1), lon0 + 0.5 * dlon)[0]
+            corners = unitxyz([lat0, lat0, lat1, lat1], [lon0, lon1, lon0, lon1])
+            radius = np.max(np.linalg.norm(corners - centre, axis=1))
+            cand = np.sort(np.array(self.tree.query_ball_point(centre, radius * (1. + 1e-9)),
+                                    dtype=int))
+
+        lat, lon = self.lat[cand], self.lon[cand]
+        if lon0 < lon1:
+            inlon = (lon > lon0) & (lon < lon1)
+        else:
+            inlon = (lon > lon0) | (lon < lon1)
+        return cand[(lat > lat0) & (lat < lat1) & inlon]
@@ -6,6 +6,7 @@ import numpy as np
 import bluesky as bs
 from bluesky import stack
 from bluesky.tools import areafilter, aero
+from bluesky.core import profiler
 from bluesky.core.walltime import Timer
 
 class ScreenIO:
@@ -119,7 +120,7 @@ class ScreenIO:
             groupmask = bs.traf.groups.groups[name]
             data['groupid'] = groupmask
             self.custgrclr[groupmask] = (r, g, b)
-        elif name in bs.traf.id:
+        elif name in bs.traf.idmap:
             data['acid'] = name
             self.custacclr[name] = (r, g, b)
         elif areafilter.hasArea(name):
@@ -226,7 +227,8 @@ class ScreenIO:
         dt = np.maximum(t - self.prevtime, 0.00001)  # avoid divide by 0
         speed = (self.samplecount - self.prevcount) / dt * bs.sim.simdt
         bs.net.send_stream(b'SIMINFO', (speed, bs.sim.simdt, bs.sim.simt,
-            str(bs.sim.utc.replace(microsecond=0)), bs.traf.ntraf, bs.sim.state, stack.get_scenname()))
+            str(bs.sim.utc.replace(microsecond=0)), bs.traf.ntraf, bs.sim.state, stack.get_scenname(),
+            profiler.siminfo()))
         self.prevtime  = t
         self.prevcount = self.samplecount
 
@@ -257,9 +259,9 @@ class ScreenIO:
         data['inconf'] = bs.traf.cd.inconf
         data['tcpamax'] = bs.traf.cd.tcpamax
         data['rpz'] = bs.traf.cd.rpz
-        data['nconf_cur'] = len(bs.traf.cd.confpairs_unique)
+        data['nconf_cur'] = len(bs.traf.cd.confunique_idx)
         data['nconf_tot'] = len(bs.traf.cd.confpairs_all)
-        data['nlos_cur'] = len(bs.traf.cd.lospairs_unique)
+        data['nlos_cur'] = len(bs.traf.cd.losunique_idx)
         data['nlos_tot'] = len(bs.traf.cd.lospairs_all)
         data['trk']        = bs.traf.trk
         data['vs']         = bs.traf.vs
@@ -302,19 +304,22 @@ def _sendrte(sender, acid):
     data['acid']       = acid
     idx   = bs.traf.id2idx(acid)
     if idx >= 0:
-        route          = bs.traf.ap.route[idx]
-        data['iactwp'] = route.iactwp
+        # Send the rows of this route in the route table
+        table          = bs.traf.ap.routetable
+        rid            = bs.traf.ap.routeid[idx]
+        rows           = table.rows(rid)
+        data['iactwp'] = int(table.iactwp[rid])
 
         # We also need the corresponding aircraft position
         data['aclat']  = bs.traf.lat[idx]
         data['aclon']  = bs.traf.lon[idx]
 
-        data['wplat']  = route.wplat
-        data['wplon']  = route.wplon
+        data['wplat']  = table.lat[rows]
+        data['wplon']  = table.lon[rows]
 
-        data['wpalt']  = route.wpalt
-        data['wpspd']  = route.wpspd
+        data['wpalt']  = table.alt[rows]
+        data['wpspd']  = table.spd[rows]
 
-        data['wpname'] = route.wpname
+        data['wpname'] = table.name[rows].tolist()
 
     bs.net.send_stream(b'ROUTEDATA' + (sender or b'*'), data)  # Send route data to GUI
@@ -7,7 +7,7 @@ from random import seed
 # Local imports
 import bluesky as bs
 import bluesky.core as core
-from bluesky.core import plugin, simtime
+from bluesky.core import plugin, profiler, simtime
 from bluesky.stack import simstack, recorder
 from bluesky.tools import datalog, areafilter, plotter
 
@@ -15,7 +15,10 @@ from bluesky.tools import datalog, areafilter, plotter
 MINSLEEP = 1e-3
 
 # Register settings defaults
-bs.settings.set_variable_defaults(simdt=0.05)
+# batch_pollsteps: Number of simulation steps between the processing of timers
+#                  and events in a headless batch run
+# idle_skip:       Skip ahead to the next scenario command when there is no traffic
+bs.settings.set_variable_defaults(simdt=0.05, batch_pollsteps=1000, idle_skip=False)
 
 
 class Simulation:
@@ -50,6 +53,12 @@ class Simulation:
         # Flag indicating whether timestep can be varied to ensure realtime op
         self.rtmode = False
 
+        # Flag indicating whether idle periods without traffic are skipped
+        self.skipmode = bs.settings.idle_skip
+
+        # Flag indicating that the current scenario is part of a batch
+        self.batchmode = False
+
         # Keep track of known clients
         self.clients = set()
 
@@ -65,13 +74,22 @@ class Simulation:
                 self.op()
 
         # Always update stack
+        tstep = t = profiler.tic()
         simstack.process()
+        t = profiler.toc('sim.stack', t)
 
         if self.state == bs.OP:
             # Plot/log the current timestep, and call preupdate functions
             plotter.update()
+            t = profiler.toc('sim.plotter', t)
             datalog.update()
+            t = profiler.toc('sim.datalog', t)
             simtime.preupdate()
+            t = profiler.toc('sim.preupdate', t)
+
+            # Without traffic, skip ahead to the next scenario command
+            if self.skipmode and bs.traf.ntraf == 0:
+                self.skipidle()
 
             # Determine interval towards next timestep                
             self.simt, self.simdt = simtime.step(dt_increment)
@@ -81,7 +99,10 @@ class Simulation:
 
             # Update traffic and other update functions for the next timestep
             bs.traf.update()
+            t = profiler.toc('sim.traffic', t)
             simtime.update()
+            profiler.toc('sim.update', t)
+            profiler.toc('sim.step', tstep)
 
     def update(self):
         ''' Perform a simulation update. 
@@ -127,6 +148,9 @@ class Simulation:
 
         # Inform main of our state change
         if self.state != self.prevstate:
+            # A batch scenario ends when the simulation leaves OP
+            if self.batchmode and self.prevstate == bs.OP and profiler.stages:
+                bs.scr.echo(f'Profile written to {profiler.dump()}')
             bs.net.send_event(b'STATECHANGE', self.state)
             self.prevstate = self.state
 
@@ -164,6 +188,7 @@ class Simulation:
     def reset(self):
         ''' Reset all simulation objects. '''
         self.state = bs.INIT
+        self.batchmode = False
         self.syst = -1.0
         self.simt = 0.0
         self.simdt = bs.settings.simdt
@@ -173,6 +198,7 @@ class Simulation:
         self.set_dtmult(1.0)
         simtime.reset()
         core.reset()
+        profiler.reset()
         bs.navdb.reset()
         bs.traf.reset()
         simstack.reset()
@@ -191,6 +217,25 @@ class Simulation:
 
         return True, 'Realtime mode is o' + ('n' if self.rtmode else 'ff')
 
+    def idleskip(self, flag=None):
+        ''' Switch skipping of idle periods without traffic on or off. '''
+        if flag is not None:
+            self.skipmode = flag
+
+        return True, 'Idle skip is o' + ('n' if self.skipmode else 'ff')
+
+    def skipidle(self):
+        ''' Skip the base timesteps up to the next scenario command (or the
+            end of a fast-forward period), so that the next timestep
+            arrives at the time of that command. The timed functions of the
+            skipped timesteps are not called. '''
+        tnext = simstack.nextcmdtime()
+        if tnext is None:
+            return
+        if self.ffstop is not None:
+            tnext = min(tnext, self.ffstop)
+        self.utc += datetime.timedelta(seconds=simtime.skip(tnext))
+
     def fastforward(self, nsec=None):
         ''' Run in fast-time (for nsec seconds if specified). '''
         self.state = bs.OP
@@ -218,6 +263,49 @@ class Simulation:
 
         return True
 
+    def runbatch(self, fname):
+        ''' Run all scenarios of batch file fname in this process, as fast
+            as possible.
+
+            Each scenario runs in a tight loop of simulation steps, without
+            real-time pacing or screen updates, until it leaves OP (e.g.,
+            with HOLD). Wall-clock timers and events are only processed every
+            batch_pollsteps steps. The achieved simulation speed, in simulated
+            seconds per wall-clock second, is printed for each scenario and
+            for the whole batch. '''
+        try:
+            scentime, scencmd = zip(*simstack.readscn(fname))
+        except (FileNotFoundError, ValueError):
+            print(f'BATCH: No scenarios found in {fname}')
+            return False
+
+        simtotal = walltotal = 0.0
+        for scen in bs.stack.split_scenarios(scentime, scencmd):
+            self.reset()
+            bs.stack.set_scendata(list(scen['scentime']), list(scen['scencmd']))
+            self.batchmode = True
+            self.op()
+            tstart = time.perf_counter()
+            nsteps = 0
+            while self.state == bs.OP and bs.net.running:
+                self.step()
+                nsteps += 1
+                if nsteps % bs.settings.batch_pollsteps == 0:
+                    bs.net.update()
+            walltime = time.perf_counter() - tstart
+            simtotal += self.simt
+            walltotal += walltime
+            print(f'{scen["name"]}: {self.simt:.0f} s simulated in {walltime:.1f} s '
+                  f'({self.simt / max(walltime, 1e-9):.1f} sim-s per wall-s)')
+            if profiler.stages:
+                print(f'Profile written to {profiler.dump()}')
+            if not bs.net.running:
+                break
+
+        print(f'Batch complete: {simtotal:.0f} s simulated in {walltotal:.1f} s '
+              f'({simtotal / max(walltotal, 1e-9):.1f} sim-s per wall-s)')
+        return True
+
     def event(self, eventname, eventdata, sender_rte):
         ''' Handle events coming from the network. '''
         # Keep track of event processing
@@ -232,6 +320,7 @@ class Simulation:
             # We are in a batch simulation, and received an entire scenario. Assign it to the stack.
             self.reset()
             bs.stack.set_scendata(eventdata['scentime'], eventdata['scencmd'])
+            self.batchmode = True
             self.op()
             event_processed = True
 
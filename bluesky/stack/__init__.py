@@ -3,7 +3,8 @@
     The stack parses all text-based commands in the simulation.
 '''
 from bluesky import settings
-from bluesky.stack.stackbase import stack, forward, sender, routetosender, get_scenname, get_scendata, set_scendata
+from bluesky.stack.stackbase import stack, forward, sender, routetosender, get_scenname, get_scendata, set_scendata, \
+    split_scenarios
 from bluesky.stack.cmdparser import command, commandgroup, append_commands, \
     remove_commands, get_commands
 from bluesky.stack.argparser import refdata, ArgumentError
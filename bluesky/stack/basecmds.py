@@ -4,7 +4,7 @@ from pathlib import Path
 
 import bluesky as bs
 from bluesky import settings
-from bluesky.core import select_implementation, simtime, varexplorer as ve
+from bluesky.core import select_implementation, profiler, simtime, varexplorer as ve
 from bluesky.tools import geo, aero, areafilter, plotter
 from bluesky.tools.calculator import calculator
 from bluesky.stack.cmdparser import append_commands
@@ -207,7 +207,7 @@ def initbasecmds():
             "DT [dt] OR [target,dt]",
             "[float/txt,float]",
             lambda *args: simtime.setdt(*reversed(args)),
-            "Set simulation time step",
+            "Set simulation time step or timer interval, or list all timers with their cost",
         ],
         "DTMULT": [
             "DTMULT multiplier",
@@ -250,6 +250,12 @@ def initbasecmds():
             + "A group is created when a group with the given name doesn't exist yet.",
         ],
         "HOLD": ["HOLD", "", bs.sim.hold, "Pause(hold) simulation"],
+        "IDLESKIP": [
+            "IDLESKIP [ON/OFF]",
+            "[bool]",
+            bs.sim.idleskip,
+            "En-/disable skipping to the next scenario command when there is no traffic",
+        ],
         "IMPLEMENTATION": [
             "IMPLEMENTATION [base, implementation]",
             "[txt,txt]",
@@ -354,12 +360,24 @@ def initbasecmds():
             bs.traf.poscommand,
             "Get info on aircraft, airport or waypoint",
         ],
+        "PROFILE": [
+            "PROFILE [ON/OFF/REPORT/DUMP] [filename]",
+            "[txt,word]",
+            profiler.profile,
+            "Profile the wall-clock time of the simulation stages, timers and commands",
+        ],
         "QUIT": ["QUIT", "", bs.sim.stop, "Quit program/Stop simulation"],
         "REALTIME": [
             "REALTIME [ON/OFF]",
             "[bool]",
             bs.sim.realtime,
             "En-/disable realtime running allowing a variable timestep."],
+        "RENAME": [
+            "RENAME acid,newid",
+            "acid,txt",
+            bs.traf.rename,
+            "Rename an aircraft",
+        ],
         "RESET": ["RESET", "", bs.sim.reset, "Reset simulation"],
         "SEED": [
             "SEED value",
@@ -1,9 +1,12 @@
 ''' Main simulation-side stack functions. '''
 from fnmatch import fnmatch
 import math
+import re
 from pathlib import Path
 import traceback
+import numpy as np
 import bluesky as bs
+from bluesky.core import profiler
 from bluesky.stack.stackbase import Stack, stack, checkscen, forward
 from bluesky.stack.cmdparser import Command, command
 from bluesky.stack.basecmds import initbasecmds
@@ -17,7 +20,7 @@ settings.set_variable_defaults(start_location="EHAM", scenario_path="scenario")
 
 # List of TMX commands not yet implemented in BlueSky
 tmxlist = ("BGPASAS", "DFFLEVEL", "FFLEVEL", "FILTCONF", "FILTTRED", "FILTTAMB",
-           "GRAB", "HDGREF", "MOVIE", "NAVDB", "PREDASAS", "RENAME", "RETYPE",
+           "GRAB", "HDGREF", "MOVIE", "NAVDB", "PREDASAS", "RETYPE",
            "SWNLRPASAS", "TRAFRECDT", "TRAFLOGDT", "TREACT", "WINDGRID")
 
 
@@ -41,6 +44,8 @@ def reset():
     """ Reset the stack. """
 
     Stack.reset()
+    crebatch.clear()
+    crebatchids.clear()
 
     # Close recording file and reset scenario recording settings
     recorder.reset()
@@ -65,8 +70,16 @@ def process(from_pcall=None):
         cmdu = cmd.upper()
         cmdobj = Command.cmddict.get(cmdu)
 
+        # Consecutive CRE commands are collected, and the aircraft are
+        # created in one go before the first other command is processed
+        if cmdobj is not None and cmdobj is Command.cmddict.get('CRE') and \
+                cmdobj.callback == bs.traf.cre:
+            batchcre(cmdobj, argstring, cmdline)
+            continue
+        flushcre()
+
         # If no function is found for 'cmd', check if cmd is actually an aircraft id
-        if not cmdobj and cmdu in bs.traf.id:
+        if not cmdobj and cmdu in bs.traf.idmap:
             cmd, argstring = argparser.getnextarg(argstring)
             argstring = cmdu + " " + argstring
             # When no other args are parsed, command is POS
@@ -77,7 +90,9 @@ def process(from_pcall=None):
         if cmdobj:
             try:
                 # Call the command, passing the argument string
+                tstart = profiler.tic()
                 success, echotext = cmdobj(argstring)
+                profiler.toc('stack.' + cmdobj.name, tstart)
                 if not success:
                     if not argstring:
                         echotext = echotext or cmdobj.brieftext()
@@ -131,11 +146,92 @@ def process(from_pcall=None):
         if echotext:
             bs.scr.echo(echotext, echoflags)
 
+    # Create any remaining aircraft from CRE commands
+    flushcre()
+
     # Clear the processed commands
     if from_pcall is None:
         Stack.clear()
 
 
+# CRE commands collected for batched aircraft creation: (cmdline, args),
+# and the callsigns of the aircraft in the batch
+crebatch = []
+crebatchids = set()
+
+
+def batchcre(cmdobj, argstring, cmdline):
+    ''' Parse a CRE command and add it to the batch of aircraft to create. '''
+    # Arguments can refer to aircraft that are still in the batch
+    # (e.g., CRE KL205 B744 KL204 ...). Create these aircraft first.
+    if not crebatchids.isdisjoint(re.split(r'[\s,]+', argstring.upper())):
+        flushcre()
+
+    try:
+        acid, actype, aclat, aclon, *args = cmdobj.parse(argstring)
+    except ArgumentError as e:
+        echoflags = bs.BS_ARGERR
+        header = '' if not argstring else e.args[0] if e.args else 'Argument error.'
+        echotext = f'{header}\nUsage:\n{cmdobj.brieftext()}'
+    except Exception as e:
+        echoflags = bs.BS_FUNERR
+        header = '' if not argstring else e.args[0] if e.args else 'Function error.'
+        echotext = f'Error calling function implementation of CRE: {header}\n' + \
+            'Traceback printed to terminal.'
+        traceback.print_exc()
+    else:
+        if acid not in crebatchids and acid not in bs.traf.idmap:
+            achdg, acalt, acspd = args + [None, 0, 0][len(args):]
+            # Default heading depends on the reference data of this command
+            achdg = (argparser.refdata.hdg or 0.0) if achdg is None else achdg
+            crebatch.append((cmdline, (acid, actype, aclat, aclon, achdg, acalt, acspd)))
+            crebatchids.add(acid)
+            return
+        echoflags = bs.BS_FUNERR
+        echotext = f'Syntax error: {acid} already exists.'
+
+    if not Stack.sender_rte:
+        echotext = f'{cmdline}\n{echotext}'
+    bs.scr.echo(echotext, echoflags)
+
+
+def flushcre():
+    ''' Create all aircraft in the batch of CRE commands with a single call
+        to Traffic.cre. '''
+    if not crebatch:
+        return
+    cmdlines = [c[0] for c in crebatch]
+    acid, actype, aclat, aclon, achdg, acalt, acspd = zip(*(c[1] for c in crebatch))
+    crebatch.clear()
+    crebatchids.clear()
+    tstart = profiler.tic()
+    try:
+        bs.traf.cre(list(acid), list(actype), np.array(aclat, dtype=float),
+                    np.array(aclon, dtype=float), np.array(achdg, dtype=float),
+                    np.array(acalt, dtype=float), np.array(acspd, dtype=float))
+    except Exception as e:
+        header = e.args[0] if e.args else 'Function error.'
+        bs.scr.echo(f'Error calling function implementation of CRE: {header}\n' +
+                    'Traceback printed to terminal.', bs.BS_FUNERR)
+        traceback.print_exc()
+        return
+
+    profiler.toc('stack.CRE', tstart)
+
+    # Recording of actual validated commands
+    for cmdline in cmdlines:
+        recorder.savecmd('CRE', cmdline)
+
+
+def nextcmdtime():
+    """ Simulation time of the next command: the current time when commands
+        are waiting on the stack, the time of the next scenario command, or
+        None when there are no commands. """
+    if Stack.cmdstack:
+        return bs.sim.simt
+    return Stack.scentime[0] if Stack.scencmd else None
+
+
 def readscn(fname):
     ''' Read a scenario file. '''
     if not fname:
@@ -191,7 +287,7 @@ def pcall(fname, *pcall_arglst):
     """
     # Check for a/c id as first argument (use case: procedure files)
     # CALL KL204 myproc should have effect as if: CALL myproc KL204
-    if pcall_arglst and fname in bs.traf.id:
+    if pcall_arglst and fname in bs.traf.idmap:
         acid = fname
         fname = pcall_arglst[0]
         pcall_arglst = [acid] + list(pcall_arglst[1:])
@@ -25,6 +25,22 @@ def traffic_():
     yield bluesky.traf
 
 
+@pytest.fixture(scope="session")
+def sim_(traffic_):
+    """
+    Suite-level setup and teardown function, for those test functions
+    naming `sim_` in their parameter lists. The networking of the
+    simulation node, which is never connected in the tests, is replaced
+    by that of a detached node, so that the simulation can be reset and
+    stepped without blocking on sending events.
+    """
+    from bluesky.network.detached import Node
+    net = bluesky.net
+    bluesky.net = Node()
+    yield bluesky.sim
+    bluesky.net = net
+
+
 @pytest.fixture(scope="session")
 def route_(traffic_):
     """
@@ -33,3 +49,12 @@ def route_(traffic_):
     """
     from bluesky.traffic import route
     yield route
+
+
+@pytest.fixture(scope="session")
+def navdb_(traffic_):
+    """
+    Suite-level setup and teardown function, for those test functions
+    naming `navdb_` in their parameter lists.
+    """
+    yield bluesky.navdb
@@ -0,0 +1,128 @@
+"""
+Tests conflict detection implementations
+"""
+import numpy as np
+
+from bluesky.traffic.asas import ConflictDetection
+from bluesky.traffic.asas.detection import pairs2idx
+
+
+def create_random_traffic(traffic_, n, seed):
+    """
+    Create n aircraft at random positions, flight levels, and headings
+    around the date line, a tenth of which are climbing or descending.
+    """
+    rng = np.random.default_rng(seed)
+    traffic_.reset()
+    traffic_.cre([f'KL{i}' for i in range(n)], 'B744',
+                 52.0 + rng.uniform(-2.0, 2.0, n), 179.0 + rng.uniform(0.0, 2.0, n),
+                 rng.uniform(0.0, 360.0, n), rng.choice(np.arange(30, 400, 10), n) * 30.48,
+                 rng.uniform(100.0, 250.0, n))
+    traffic_.vs[:] = np.where(rng.random(n) < 0.1, rng.uniform(-10.0, 10.0, n), 0.0)
+    traffic_.gs[:] = traffic_.tas
+    traffic_.trk[:] = traffic_.hdg
+
+
+def detect(traffic_, method, vprefilter=False, blocks=None):
+    """
+    Select CD method and return the conflict data for the current traffic,
+    and the number of pairs pruned by the vertical prefilter.
+    """
+    ConflictDetection.setmethod(method)
+    cd = traffic_.cd
+    cd.setvprefilter(vprefilter)
+    if blocks:
+        cd.setblocks(*blocks)
+    result = cd.detect(traffic_, traffic_, cd.rpz, cd.hpz, cd.dtlookahead)
+    npruned = cd.npruned
+    ConflictDetection.setmethod('OFF')
+    return result, npruned
+
+
+def assert_equal_conflicts(result, expected):
+    """
+    Check that the output of two detect functions is identical.
+    """
+    for res, exp in zip(result, expected):
+        assert np.array_equal(res, exp)
+
+
+def test_pairs2idx_callsigns(traffic_):
+    """
+    Conflict pairs returned as lists of callsign tuples, as by the casas
+    detector, should give the same index pairs as the index arrays.
+    """
+    create_random_traffic(traffic_, 200, 41)
+    (confpairs, lospairs, *_), _ = detect(traffic_, 'STATEBASED')
+    for pairs in (confpairs, lospairs):
+        callsigns = [(traffic_.id[i], traffic_.id[j]) for i, j in pairs.tolist()]
+        assert np.array_equal(pairs2idx(callsigns, traffic_), pairs)
+        assert np.array_equal(pairs2idx(pairs, traffic_), pairs)
+    traffic_.reset()
+
+    assert len(confpairs) and len(lospairs)
+    assert pairs2idx([], traffic_).shape == (0, 2)
+
+
+def test_spatial_statebased_equal(traffic_):
+    """
+    The spatial broad phase should give exactly the same conflict data
+    as the full state-based conflict detection.
+    """
+    create_random_traffic(traffic_, 200, 42)
+    expected, _ = detect(traffic_, 'STATEBASED')
+    result, _ = detect(traffic_, 'SPATIALSTATEBASED')
+    traffic_.reset()
+
+    assert len(expected[0]) and len(expected[1])
+    assert_equal_conflicts(result, expected)
+
+
+def test_vertical_prefilter_equal(traffic_):
+    """
+    The vertical prefilter should prune pairs without changing the
+    conflict data.
+    """
+    create_random_traffic(traffic_, 200, 43)
+    expected, _ = detect(traffic_, 'STATEBASED')
+    result, npruned = detect(traffic_, 'STATEBASED', vprefilter=True)
+    traffic_.reset()
+
+    assert npruned > 0
+    assert_equal_conflicts(result, expected)
+
+
+def test_statebased_blocked_equal(traffic_):
+    """
+    Processing the ownship rows in blocks, with or without threads, should
+    give exactly the same conflict data as processing all rows at once.
+    """
+    create_random_traffic(traffic_, 200, 44)
+    expected, _ = detect(traffic_, 'STATEBASED', blocks=(0, 1))
+    result, _ = detect(traffic_, 'STATEBASED', blocks=(64, 1))
+    result_mt, _ = detect(traffic_, 'STATEBASED', blocks=(48, 3))
+    traffic_.reset()
+
+    assert_equal_conflicts(result, expected)
+    assert_equal_conflicts(result_mt, expected)
+
+
+def test_parallel_statebased_equal(traffic_):
+    """
+    Dividing the blocks over worker processes should give exactly the same
+    conflict data as the serial state-based conflict detection.
+    """
+    create_random_traffic(traffic_, 200, 45)
+    expected, _ = detect(traffic_, 'STATEBASED', blocks=(0, 1))
+    ConflictDetection.setmethod('PARALLELSTATEBASED')
+    cd = traffic_.cd
+    cd.setblocks(32, 1)
+    cd.setnworkers(2)
+    result = cd.detect(traffic_, traffic_, cd.rpz, cd.hpz, cd.dtlookahead)
+    nworkers = cd.nworkers
+    cd.stopworkers()
+    ConflictDetection.setmethod('OFF')
+    traffic_.reset()
+
+    assert nworkers == 2
+    assert_equal_conflicts(result, expected)
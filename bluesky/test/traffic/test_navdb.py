@@ -0,0 +1,255 @@
+"""
+Tests the lookups of the navigation database.
+"""
+import numpy as np
+import pytest
+from bluesky import settings
+from bluesky.navdatabase import loadnavdata
+from bluesky.navdatabase.navdatabase import Navdatabase, nameindex
+from bluesky.navdatabase.spatialindex import SpatialIndex, unitxyz
+from bluesky.tools import geo
+from bluesky.tools.aero import nm
+
+
+def find_wpidx(navdb, wpid, name, reflat, reflon):
+    """ Index of waypoint name closest to reflat, reflon, by a full scan
+        of the waypoint identifiers wpid. """
+    idx = np.flatnonzero(wpid == name)
+    if len(idx) == 0:
+        return -1
+    if reflat > 99999.:
+        return idx[0]
+    return idx[np.argmin(geo.kwikdist(reflat, reflon, navdb.wplat[idx], navdb.wplon[idx]))]
+
+
+def test_navdb_getwpidxs(navdb_):
+    """
+    Test the lookup of waypoint indices by name.
+
+    Expects the same index from the bulk and the single lookup as from a
+    full scan, for names that occur once or more, and for names that are
+    not found, with and without reference position.
+    """
+    rng = np.random.default_rng(18)
+    ids, count = np.unique(navdb_.wpid, return_counts=True)
+    names = list(rng.choice(ids[count > 1], 1000)) + list(rng.choice(ids, 900)) + \
+        [f'NOWPT{i}' for i in range(100)]
+    rng.shuffle(names)
+    reflat = rng.uniform(-80., 80., len(names))
+    reflon = rng.uniform(-180., 180., len(names))
+    reflat[::10] = 999999.
+
+    wpid = np.array(navdb_.wpid)
+    idx = navdb_.getwpidxs(names, reflat, reflon)
+    for i, name in enumerate(names):
+        assert idx[i] == navdb_.getwpidx(name, reflat[i], reflon[i]) == \
+            find_wpidx(navdb_, wpid, name, reflat[i], reflon[i])
+    assert np.sum(idx < 0) == 100
+
+    # A single reference position for all names
+    idx = navdb_.getwpidxs(names, 52., 4.)
+    assert all(i == navdb_.getwpidx(name, 52., 4.) for i, name in zip(idx, names))
+
+
+def test_navdb_getwpindices(navdb_):
+    """
+    Test the lookup of a waypoint and the waypoints co-located with it.
+
+    Expects the waypoint closest to the reference position first, followed
+    by the other waypoints with the same name within the criterion, in
+    database order.
+    """
+    rng = np.random.default_rng(18)
+    ids, count = np.unique(navdb_.wpid, return_counts=True)
+    wpid = np.array(navdb_.wpid)
+    for name in rng.choice(ids[count > 1], 200):
+        reflat, reflon = rng.uniform(-80., 80.), rng.uniform(-180., 180.)
+        imin = find_wpidx(navdb_, wpid, name, reflat, reflon)
+        colocated = [i for i in np.flatnonzero(wpid == name) if i != imin and
+                     nm * geo.kwikdist(navdb_.wplat[i], navdb_.wplon[i],
+                                       navdb_.wplat[imin], navdb_.wplon[imin]) <= 1852.]
+        assert navdb_.getwpindices(name, reflat, reflon) == [imin] + colocated
+
+    assert navdb_.getwpindices('NOWPT') == [-1]
+    name = ids[count > 1][0]
+    assert navdb_.getwpindices(name) == [navdb_.wpid.index(name)]
+
+
+def test_navdb_listconnections():
+    """
+    Test the list of airway legs connected to a waypoint.
+
+    Expects the same airway and waypoint pairs, in the same order, as a
+    full scan of the airway legs from and to the waypoint, for synthetic
+    airways with waypoint names that occur at more than one position.
+    """
+    rng = np.random.default_rng(18)
+    # Waypoints: each name at one to three positions, some of which are
+    # within 10 nm of each other
+    wpname = [f'W{i}' for i in range(300) for _ in range(1 + i % 3)]
+    wplat = rng.uniform(40., 60., len(wpname))
+    wplon = rng.uniform(-10., 20., len(wpname))
+    wplat[1::7] = wplat[::7][:len(wplat[1::7])] + 0.05
+
+    # Airway legs between random waypoints, with duplicate legs
+    navdb = Navdatabase.__new__(Navdatabase)
+    ifrom, ito = rng.integers(len(wpname), size=(2, 2000))
+    ifrom[1000:1200], ito[1000:1200] = ifrom[:200], ito[:200]
+    navdb.awid = [f'A{i}' for i in rng.integers(50, size=2000)]
+    navdb.awfromwpid = [wpname[i] for i in ifrom]
+    navdb.awfromlat, navdb.awfromlon = wplat[ifrom], wplon[ifrom]
+    navdb.awtowpid = [wpname[i] for i in ito]
+    navdb.awtolat, navdb.awtolon = wplat[ito], wplon[ito]
+    navdb.awfromindex = nameindex(navdb.awfromwpid)
+    navdb.awtoindex = nameindex(navdb.awtowpid)
+
+    for wpid, lat, lon in zip(wpname, wplat, wplon):
+        connect = []
+        for fromwpid, fromlat, fromlon, towpid in (
+                (navdb.awfromwpid, navdb.awfromlat, navdb.awfromlon, navdb.awtowpid),
+                (navdb.awtowpid, navdb.awtolat, navdb.awtolon, navdb.awfromwpid)):
+            for j in range(len(fromwpid)):
+                leg = [navdb.awid[j], towpid[j]]
+                if fromwpid[j] == wpid and leg not in connect and \
+                        geo.kwikdist(fromlat[j], fromlon[j], lat, lon) < 10.:
+                    connect.append(leg)
+        assert navdb.listconnections(wpid, lat, lon) == connect
+
+    assert navdb.listconnections('NOWPT', 52., 4.) == []
+
+
+def test_navdb_inside(navdb_):
+    """
+    Test the selection of waypoints and airports inside a box.
+
+    Expects the same indices from the spatial index as from a full scan,
+    for small and large boxes.
+    """
+    rng = np.random.default_rng(19)
+    for _ in range(200):
+        lat0, lon0 = rng.uniform(-80., 70.), rng.uniform(-180., 150.)
+        lat1 = min(90., lat0 + rng.choice([0.5, 5., 100.]) * rng.random())
+        lon1 = min(180., lon0 + rng.choice([0.5, 5., 200.]) * rng.random())
+        assert navdb_.getwpinside(lat0, lat1, lon0, lon1) == \
+            navdb_.getinside(navdb_.wplat, navdb_.wplon, lat0, lat1, lon0, lon1)
+        assert navdb_.getapinside(lat0, lat1, lon0, lon1) == \
+            navdb_.getinside(navdb_.aptlat, navdb_.aptlon, lat0, lat1, lon0, lon1)
+
+
+def test_navdb_inside_dateline(navdb_):
+    """
+    Test the selection of waypoints inside a box across the date line.
+
+    Expects the waypoints on both sides of the date line, where a full
+    scan of the box, which takes lon0 > lon1 as empty, finds none.
+    """
+    lat0, lat1, lon0, lon1 = 50., 70., 170., -170.
+    lat, lon = np.asarray(navdb_.wplat), np.asarray(navdb_.wplon)
+    inside = list(np.flatnonzero((lat > lat0) & (lat < lat1) &
+                                 ((lon > lon0) | (lon < lon1))))
+    assert navdb_.getinside(navdb_.wplat, navdb_.wplon, lat0, lat1, lon0, lon1) == []
+    assert navdb_.getwpinside(lat0, lat1, lon0, lon1) == inside
+    assert np.any(lon[inside] > 0.) and np.any(lon[inside] < 0.)
+
+
+def test_navdb_knearest(navdb_):
+    """
+    Test the selection of the nearest waypoints and airports.
+
+    Expects the positions nearest by great-circle distance, nearest first,
+    which near the database positions is also the nearest position of the
+    flat-earth full scan.
+    """
+    rng = np.random.default_rng(19)
+    for wplat, wplon, knear in ((navdb_.wplat, navdb_.wplon, navdb_.getwpknear),
+                                (navdb_.aptlat, navdb_.aptlon, navdb_.getapknear)):
+        tree = SpatialIndex(wplat, wplon)
+        for i in rng.integers(len(wplat), size=200):
+            lat = wplat[i] + rng.uniform(-0.05, 0.05)
+            lon = wplon[i] + rng.uniform(-0.05, 0.05)
+            idx = knear(lat, lon, 10)
+            assert list(idx) == list(tree.knearest(lat, lon, 10))
+            # Chord distance, which increases with great-circle distance
+            dist = np.linalg.norm(unitxyz(wplat, wplon) - unitxyz(lat, lon), axis=1)
+            assert np.allclose(dist[idx], np.sort(dist)[:10], rtol=0., atol=1e-12)
+            inear = navdb_.getinear(wplat, wplon, lat, lon)
+            assert (wplat[idx[0]], wplon[idx[0]]) == (wplat[inear], wplon[inear])
+
+    assert navdb_.getwpinear(52., 4.) == navdb_.getwpknear(52., 4., 1)[0]
+    assert len(SpatialIndex([], []).knearest(52., 4.)) == 0
+    assert len(SpatialIndex([52.], [4.]).knearest(52., 4., 5)) == 1
+
+
+def assert_same(loaded, data):
+    """ Assert that the data loaded from the cache has the same values and
+        types as the original data, with arrays as read-only memory maps. """
+    if isinstance(data, np.ndarray):
+        assert isinstance(loaded, np.memmap) and not loaded.flags.writeable
+        assert loaded.dtype == data.dtype and np.array_equal(loaded, data)
+    elif isinstance(data, dict):
+        assert list(loaded) == list(data)
+        for key in data:
+            assert_same(loaded[key], data[key])
+    else:
+        assert type(loaded) is type(data)
+        if isinstance(data, (list, tuple)):
+            assert len(loaded) == len(data)
+            for lvalue, value in zip(loaded, data):
+                assert_same(lvalue, value)
+        else:
+            assert loaded == data
+
+
+def roundtrip(navdata):
+    """ Write navigation data to the array cache, and load it again. """
+    loadnavdata.cachefile.openarrays('navdata', 'test').dump(loadnavdata.tocolumns(*navdata))
+    return loadnavdata.fromcolumns(loadnavdata.cachefile.openarrays('navdata', 'test').load())
+
+
+def test_navdb_cache(navdb_, tmp_path, monkeypatch):
+    """
+    Test the navigation data cache.
+
+    Expects the data loaded from the cache to have the same values and
+    types as the data loaded from the text files, with read-only memory
+    maps of the arrays.
+    """
+    monkeypatch.setattr(settings, 'cache_path', str(tmp_path))
+    navdata = loadnavdata.loadnavdata_txt() + (loadnavdata.loadthresholds_txt(),)
+    loaded = roundtrip(navdata)
+    for ldata, data in zip(loaded, navdata):
+        assert_same(ldata, data)
+
+    # Lists of mixed integers and floats keep their integers
+    assert {type(f) for f in loaded[0]['wpfreq']} == {int, float}
+    with pytest.raises(ValueError):
+        loaded[0]['wplat'][0] = 0.
+
+    with pytest.raises(loadnavdata.cachefile.CacheError):
+        loadnavdata.cachefile.openarrays('navdata', 'other').load()
+
+
+def test_navdb_cache_columns(navdb_, tmp_path, monkeypatch):
+    """
+    Test the conversion of airways, FIR borders and runway thresholds to
+    and from cache columns.
+
+    Expects the same nested FIR lists and runway threshold dicts, and the
+    same string and number lists, after a round trip through the cache.
+    """
+    monkeypatch.setattr(settings, 'cache_path', str(tmp_path))
+    wptdata = dict(wpid=['SPY', '', 'ÅRE', 'SPY'], wplat=np.array([52.5, 0., 63.4, -10.]),
+                   wpfreq=[113, 1.5, 0., 112])
+    aptdata = dict(apid=['EHAM'], aptype=np.array([1]))
+    awydata = dict(awid=['A1', 'UL620'], awfromlat=np.array([52., 53.]),
+                   awndir=[1, 2], awlowfl=[0., 245.])
+    firdata = dict(fir=[['EHAA', [52., 53., 54.], [4., 5., 4.]], ['EDWW', [50.], [8.]]],
+                   firlat0=np.array([52., 53.]), firlon0=np.array([4., 5.]),
+                   firlat1=np.array([53., 54.]), firlon1=np.array([5., 4.]))
+    codata = dict(coname=['Netherlands'], conr=[1])
+    rwythresholds = {'EHAM': {'06': tuple(np.array([52.29, 4.73, 58.5])),
+                              '24': tuple(np.array([52.3, 4.78, 238.5]))},
+                     'EHRD': {}, 'EDDF': {'25C': tuple(np.array([50.04, 8.59, 249.0]))}}
+    navdata = (wptdata, aptdata, awydata, firdata, codata, rwythresholds)
+    for ldata, data in zip(roundtrip(navdata), navdata):
+        assert_same(ldata, data)
@@ -7,6 +7,10 @@ GNU General Public License v3.
 Author <ahfarrell@sparkl.com> Andrew Farrell
 Tests route module, wpt functionality
 """
+import numpy as np
+import bluesky
+from bluesky.tools import aero, geo
+from bluesky.tools.aero import nm
 from . import assert_fl
 
 
@@ -113,6 +117,56 @@ def test_addwpt_data(route_):
     assert route.wpflyby == [True, True]
 
 
+def test_route_calcfp(traffic_, route_):
+    """
+    Tests the flight plan calculations of a route with altitude, speed
+    and RTA constraints.
+
+    Expects for each waypoint the index, value and distance of the next
+    altitude constraint and RTA, with the legs after speed constraints
+    taken out of the distance to the RTA, and their flight time out of
+    the time to the RTA.
+    """
+    Route = route_.Route
+    route = Route()
+    # Name, type, altitude [m], speed [m/s or Mach] and RTA [s] of the
+    # waypoints, half a degree apart along the equator
+    wpts = [('A', Route.wplatlon, -999., -999., -999.),
+            ('B', Route.wplatlon, 3000., 150., -999.),
+            ('C', Route.wplatlon, -999., -999., -999.),
+            ('D', Route.wplatlon, -999., -999., 1000.),
+            ('E', Route.wplatlon, 6000., 0.7, -999.),
+            ('F', Route.wplatlon, -999., -999., 2000.),
+            ('G', Route.dest, -999., -999., -999.)]
+    for i, (name, wptype, alt, spd, rta) in enumerate(wpts):
+        route.addwpt_data(False, i, name, 0., 0.5 * i, wptype, alt, spd)
+        route.wprta[i] = rta
+    route.calcfp()
+
+    # Leg distances [nm] to each waypoint
+    d = [0.] + [geo.qdrdist(0., 0.5 * i, 0., 0.5 * (i + 1))[1] for i in range(6)]
+    # Flight times [s] of the legs after the speed constraints, at the
+    # next altitude constraint. Like the leg distances these are in [nm]
+    t1 = d[2] / aero.cas2tas(150., 3000.)
+    t4 = d[5] / aero.mach2tas(0.7, 6000.)
+
+    assert list(route.wpialt) == [1, 1, 4, 4, 4, 6, 6]
+    assert np.allclose(route.wptoalt, [3000., 3000., 6000., 6000., 6000., 0., 0.])
+    assert np.allclose(route.wpxtoalt, np.array(
+        [d[1], 0., d[3] + d[4], d[4], 0., d[6], 0.]) * nm)
+
+    assert list(route.wpirta) == [3, 3, 3, 3, 5, 5, -1]
+    assert np.allclose(route.wptorta, [1000. - t1, 1000. - t1, 1000., 1000.,
+                                       2000. - t4, 2000., -999.])
+    assert np.allclose(route.wpxtorta, np.array(
+        [d[1] + d[3], d[3], d[3], 0., 0., 0., 0.]) * nm)
+
+    # Without RTAs, the RTA data is reset
+    route.wprta[3] = route.wprta[5] = -999.
+    route.calcfp()
+    assert np.all(route.wpirta == -1) and np.all(route.wptorta == -999.)
+
+
 def test_add_wp_orig(traffic_, route_):
     """
     Tests addition of origin waypoint.
@@ -399,3 +453,74 @@ def test_before_addwpt_stack(traffic_):
     assert route.wpspd[1] == 200.
     assert route.wpname[1] == 'BA222001'
     assert route.wptype[1] == 0
+
+
+def test_route_addnavwpts(traffic_, route_):
+    """
+    Tests bulk addition of waypoints by name.
+
+    Expects the waypoints to be added in order before the destination,
+    each at the navaid/fix nearest to the previous waypoint, and no
+    waypoints to be added when a name is not found.
+    """
+    navdb = bluesky.navdb
+    traffic_.cre('BULK1', 'B744', 52.0, 4.0, 90., 6000., 120.)
+    acidx = traffic_.id2idx('BULK1')
+    route = traffic_.ap.route[acidx]
+    route.addwpt(acidx, 'EDDF', route_.Route.dest, 50.0, 8.5)
+
+    names = ['SPY', 'PAM', 'SUGOL', 'ARTIP']
+    assert route.addnavwpts(acidx, names) == []
+    assert list(route.wpname) == ['SPY', 'PAM', 'SUGOL', 'ARTIP', 'EDDF']
+
+    # Like ADDWPT, the lookup starts at the destination when it is the
+    # only waypoint in the route
+    lat, lon = route.wplat[-1], route.wplon[-1]
+    for i, name in enumerate(names):
+        wpidx = navdb.getwpidx(name, lat, lon)
+        lat, lon = navdb.wplat[wpidx], navdb.wplon[wpidx]
+        assert abs(route.wplat[i] - lat) < 1e-9
+        assert abs(route.wplon[i] - lon) < 1e-9
+
+    assert route.addnavwpts(acidx, ['PAM', 'NOSUCHWPT']) == ['NOSUCHWPT']
+    assert route.nwp == 5
+
+
+def fly_route(traffic_, fmsdt):
+    """
+    Fly a route with flyby, flyover and flyturn waypoints, with a full
+    FMS update every fmsdt seconds, and return the simulation time at
+    which each waypoint became active.
+    """
+    bluesky.sim.reset()
+    traffic_.ap.fmstimer.setdt(fmsdt)
+    bluesky.stack.stack('CRE FMS1 B744 52.0 4.0 90 FL100 250',
+                        'ADDWPT FMS1 52.0 4.3', 'ADDWPT FMS1 52.2 4.5',
+                        'ADDWPT FMS1 FLYOVER', 'ADDWPT FMS1 52.2 4.8',
+                        'ADDWPT FMS1 FLYTURN', 'ADDWPT FMS1 TURNRAD 2',
+                        'ADDWPT FMS1 52.0 5.0', 'ADDWPT FMS1 51.9 4.7',
+                        'LNAV FMS1 ON')
+    tactive = []
+    while bluesky.sim.simt < 800.0:
+        bluesky.sim.step()
+        route = traffic_.ap.route[0]
+        if len(tactive) <= route.iactwp:
+            tactive.append(bluesky.sim.simt)
+    return tactive
+
+
+def test_route_fms_dt(traffic_, sim_):
+    """
+    Test waypoint passing in between full FMS updates.
+
+    Expects the same waypoints to be passed, at nearly the same time,
+    as with a full FMS update every simulation step.
+    """
+    reference = fly_route(traffic_, bluesky.settings.simdt)
+    tactive = fly_route(traffic_, 2.0)
+    bluesky.sim.reset()
+
+    assert len(reference) == 5
+    assert len(tactive) == len(reference)
+    for t, tref in zip(tactive, reference):
+        assert abs(t - tref) < 1.0
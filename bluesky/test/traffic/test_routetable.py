@@ -0,0 +1,84 @@
+"""
+Tests the columnar route table.
+"""
+import numpy as np
+from bluesky.traffic.routetable import RouteTable
+
+
+def add(table, rid, wpidx, name):
+    """ Insert waypoint name in route rid before waypoint wpidx. """
+    row = table.insert(rid, wpidx)
+    table.name[row] = name
+    table.lat[row] = float(name[1:])
+
+
+def names(table, rid):
+    """ Return the waypoint names of route rid. """
+    return list(table.name[table.rows(rid)])
+
+
+def test_routetable_insert_remove():
+    """
+    Test insertion and removal of waypoints.
+
+    Expects routes to keep their own waypoints in order while they
+    grow beyond their reserved rows, and while other routes change.
+    """
+    table = RouteTable()
+    r0, r1 = table.newroute(), table.newroute()
+    for i in range(20):
+        add(table, r0, i, f'A{i}')
+        add(table, r1, 0, f'B{i}')
+
+    assert names(table, r0) == [f'A{i}' for i in range(20)]
+    assert names(table, r1) == [f'B{i}' for i in range(19, -1, -1)]
+    assert list(table.lat[table.rows(r0)]) == list(range(20))
+
+    table.remove(r0, 5)
+    add(table, r0, 0, 'A99')
+    assert names(table, r0) == ['A99'] + [f'A{i}' for i in range(20) if i != 5]
+    assert table.stack[table.start[r0]] == []
+
+
+def test_routetable_delete_compact():
+    """
+    Test deletion of routes.
+
+    Expects deleted route ids to be reused, and the rows of deleted routes
+    to be reclaimed without changing the remaining routes.
+    """
+    table = RouteTable()
+    rids = [table.newroute() for _ in range(10)]
+    for rid in rids:
+        for i in range(10):
+            add(table, rid, i, f'W{rid * 100 + i}')
+
+    table.delroute(rids[:8])
+    assert table.newroute() in rids[:8]
+
+    table.compact()
+    assert table.nrows == table.nused == int(table.cap.sum())
+    for rid in rids[8:]:
+        assert names(table, rid) == [f'W{rid * 100 + i}' for i in range(10)]
+    assert np.all(table.name[table.nrows:] == '')
+
+
+def test_routetable_findnext():
+    """
+    Test the search for the next waypoint with a column set.
+
+    Expects the first matching waypoint at or after the given index in
+    each route, and -1 when there is none.
+    """
+    table = RouteTable()
+    rids = np.array([table.newroute() for _ in range(3)])
+    for rid in rids:
+        for i in range(6):
+            add(table, rid, i, f'W{i}')
+    for rid, wpidx in zip(rids, ([1, 4], [], [5])):
+        table.flyturn[table.start[rid] + np.array(wpidx, dtype=int)] = True
+
+    result = table.findnext('flyturn', rids, np.array([2, 0, 5]))
+    assert list(result) == [4, -1, 5]
+    result = table.findnext('flyturn', rids[[0, 0]], np.array([0, 5]))
+    assert list(result) == [1, -1]
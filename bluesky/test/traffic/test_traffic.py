@@ -8,7 +8,11 @@ Author <ahfarrell@sparkl.com> Andrew Farrell
 Tests traffic module
 """
 
-from bluesky.tools.aero import casormach
+import numpy as np
+import bluesky
+from bluesky.tools import geo
+from bluesky.tools.aero import casormach, ft, nm, tas2cas
+from bluesky.tools.misc import degto180
 
 
 def test_traffic_create_missingarg_fail(traffic_):
@@ -146,4 +150,279 @@ def test_traffic_reset(traffic_):
     validate_lengths(traffic_, 0)
 
 
+def test_traffic_uid(traffic_):
+    """
+    Test unique aircraft ids.
+
+    Expects ids that are kept after deletion of other aircraft, and
+    -1 from uid2idx for deleted aircraft.
+    """
+    traffic_.reset()
+    traffic_.cre(['UID1', 'UID2', 'UID3'], 'B744', 52.0, 4.0, 0.0, 1000.0, 100.0)
+    uid = traffic_.uid.copy()
+    assert len(set(uid)) == 3
+
+    traffic_.delete(1)
+    assert list(traffic_.uid2idx(uid)) == [0, -1, 1]
+    assert traffic_.uid2idx(uid[2]) == 1
+
+    traffic_.cre('UID4', 'B744', 52.0, 4.0, 0.0, 1000.0, 100.0)
+    assert traffic_.uid[-1] > uid[2]
+    traffic_.reset()
+
+
+def test_traffic_idmap(traffic_):
+    """
+    Test the callsign to index lookup.
+
+    Expects indices that follow creation, deletion and renaming of aircraft.
+    """
+    traffic_.reset()
+    traffic_.cre(['MAP1', 'MAP2', 'MAP3', 'MAP4'], 'B744', 52.0, 4.0, 0.0, 1000.0, 100.0)
+    assert list(traffic_.ids2idx(['map3', 'MAP1', 'NONE'])) == [2, 0, -1]
+
+    traffic_.delete([0, 2])
+    assert traffic_.id2idx('MAP4') == 1
+    assert list(traffic_.ids2idx(['MAP1', 'MAP2', 'MAP3', 'MAP4'])) == [-1, 0, -1, 1]
+
+    assert traffic_.rename(1, 'NEW4')[0]
+    assert not traffic_.rename(0, 'NEW4')[0]
+    assert traffic_.id2idx('MAP4') == -1
+    assert traffic_.id2idx('NEW4') == 1
+    assert traffic_.idmap == {acid: i for i, acid in enumerate(traffic_.id)}
+    traffic_.reset()
+
+
+def test_traffic_vnav(traffic_):
+    """
+    Test the VNAV and RTA speed calculations of a leg, for aircraft that
+    climb, descend, are late for their descent, fly level, and fly to an
+    RTA.
+
+    Expects each aircraft to get the altitude, vertical speed and speed of
+    the classic VNAV logic, when all aircraft are prepared in one call.
+    """
+    traffic_.reset()
+    alt = np.array([1000.0, 30000.0, 30000.0, 10000.0, 20000.0]) * ft
+    traffic_.cre(['VNV1', 'VNV2', 'VNV3', 'VNV4', 'VNV5'], 'B744', 52.0, 4.0,
+                 90.0, alt, 150.0)
+    traffic_.tas[:] = traffic_.gs[:] = 200.0
+    traffic_.actwp.lat[:], traffic_.actwp.lon[:] = geo.qdrpos(52.0, 4.0, 90.0, 20.0)
+    ap = traffic_.ap
+    ap.dist2wp[:] = geo.kwikdist(52.0, 4.0, traffic_.actwp.lat, traffic_.actwp.lon) * nm
+    ap.alt[:] = traffic_.alt
+    ap.dist2vs[:] = 0.0
+    traffic_.actwp.spd[:] = -999.0
+    traffic_.swvnav[:] = traffic_.swvnavspd[:] = True
+
+    # Next altitude constraint, and distance to it after the active waypoint
+    toalt = np.array([10000.0, 10000.0, 10000.0, 10000.0, -999.0]) * ft
+    xtoalt = np.array([30.0, 50.0, 10.0, 10.0, 0.0]) * nm
+    # RTA in 600 s, flying at the current ground speed
+    torta = np.array([-999.0, -999.0, -999.0, -999.0, bluesky.sim.simt + 600.0])
+    xtorta = np.array([0.0, 0.0, 0.0, 0.0, 200.0 * 600.0]) - ap.dist2wp
+    ap.ComputeVNAV(np.arange(5), toalt, xtoalt, torta, xtorta)
+
+    # Climb: immediately, to the next altitude constraint
+    t2go = (ap.dist2wp[0] + xtoalt[0]) / 200.0
+    assert ap.alt[0] == toalt[0] and ap.dist2vs[0] == 99999.0
+    assert np.isclose(traffic_.actwp.vs[0], max(ap.steepness * 200.0,
+                                                (toalt[0] - alt[0]) / t2go))
+    # Descent: top of descent on this leg, at the default steepness
+    descdist = (alt[1] - toalt[1]) / ap.steepness
+    assert ap.alt[1] == alt[1]
+    assert np.isclose(ap.dist2vs[1], descdist - xtoalt[1])
+    assert np.isclose(traffic_.actwp.vs[1], -ap.steepness * 200.0)
+    # Late for the descent: descend now, over the remainder of the leg
+    t2go = ap.dist2wp[2] / 200.0
+    assert ap.alt[2] == toalt[2]
+    assert np.isclose(traffic_.actwp.vs[2], (alt[2] - toalt[2]) / t2go)
+    # Level, and no altitude constraint: no climb or descent on this leg
+    assert ap.dist2vs[3] == -999.0 and ap.dist2vs[4] == -999999.0
+    assert list(traffic_.actwp.nextaltco[:3]) == list(toalt[:3])
+
+    # Only the aircraft with an RTA gets a speed: its current speed
+    assert np.all(traffic_.actwp.spd[:4] == -999.0)
+    assert np.isclose(traffic_.actwp.spd[4], tas2cas(200.0, alt[4]), rtol=1e-3)
+    traffic_.reset()
+
+
+def test_traffic_conditional(traffic_):
+    """
+    Test conditional commands.
+
+    Expects conditions to follow their aircraft when other aircraft are
+    deleted, and to be removed when triggered or when their aircraft is deleted.
+    """
+    traffic_.reset()
+    traffic_.cre(['CND1', 'CND2', 'CND3'], 'B744', 52.0, 4.0, 0.0, 1000.0, 100.0)
+    traffic_.cond.ataltcmd(1, 2000.0, 'CND2 SPD 250')
+    traffic_.cond.ataltcmd(2, 2000.0, 'CND3 SPD 250')
+    traffic_.cond.atdistcmd(2, 53.0, 4.0, 10.0, 'CND3 SPD 250')
+    traffic_.cond.update()
+    assert traffic_.cond.ncond == 3
+
+    traffic_.delete(0)
+    traffic_.alt[0] = 2500.0
+    traffic_.cond.update()
+    assert traffic_.cond.ncond == 2
+
+    traffic_.lat[1] = 52.95
+    traffic_.cond.update()
+    assert list(traffic_.cond.condtype) == [0]
+
+    traffic_.delete(1)
+    traffic_.cond.update()
+    assert traffic_.cond.ncond == 0
+    traffic_.reset()
+
+
+def test_traffic_legcache(traffic_):
+    """
+    Test the cached bearing and distance to the active waypoint.
+
+    Expects values close to the exact great-circle calculation while the
+    aircraft fly towards their waypoints, and exact values directly after
+    a waypoint change.
+    """
+    traffic_.reset()
+    traffic_.cre(['LEG1', 'LEG2', 'LEG3'], 'B744', np.array([52.0, 10.0, -60.0]),
+                 np.array([4.0, 179.9, 20.0]), 0.0, 10000.0, 250.0)
+    leg = traffic_.ap.leg
+    wplat = np.array([52.5, 10.5, -59.0])
+    wplon = np.array([5.0, -179.5, 22.0])
+    for step in range(200):
+        qdr, dist = geo.qdrdist(traffic_.lat, traffic_.lon, wplat, wplon)
+        cqdr, cdist = leg.qdrdist(traffic_.lat, traffic_.lon, wplat, wplon)
+        assert np.all(np.abs(degto180(cqdr - qdr)) < 0.01)
+        assert np.all(np.abs(cdist - dist) < 1e-3 * dist + 1e-4)
+        # Fly 250 m along the great circle to the waypoint
+        traffic_.lat, traffic_.lon = geo.qdrpos(traffic_.lat, traffic_.lon, qdr, 250.0 / nm)
+        if step == 100:
+            wplat[1] = 11.0
+            cqdr, cdist = leg.qdrdist(traffic_.lat, traffic_.lon, wplat, wplon)
+            qdr, dist = geo.qdrdist(traffic_.lat, traffic_.lon, wplat, wplon)
+            assert cqdr[1] == qdr[1] and cdist[1] == dist[1]
+    traffic_.reset()
+
+
+def fly_kinematics(traffic_, fused):
+    """
+    Fly aircraft that take off, climb, descend, accelerate and turn in
+    wind, with the standard or the in-place kinematics, and return their
+    final states.
+    """
+    bluesky.sim.reset()
+    bluesky.settings.fused_kinematics = fused
+    bluesky.stack.stack('WIND 52 4 5000 270 30 20000 300 60',
+                        'CRE KIN1 B744 52.0 4.0 90 FL100 250',
+                        'KIN1 HDG 200', 'KIN1 ALT FL200', 'KIN1 SPD 300',
+                        'CRE KIN2 A320 52.2 4.0 270 FL150 280',
+                        'KIN2 HDG 10', 'KIN2 ALT FL50', 'KIN2 SPD 200',
+                        'CRE KIN3 B744 52.1 4.5 0 0 0',
+                        'KIN3 SPD 160', 'KIN3 ALT FL60')
+    while bluesky.sim.simt < 300.0:
+        bluesky.sim.step()
+    bluesky.settings.fused_kinematics = False
+    return {name: np.copy(getattr(traffic_, name)) for name in
+            ('lat', 'lon', 'alt', 'tas', 'cas', 'M', 'hdg', 'trk', 'gs', 'vs',
+             'gsnorth', 'gseast', 'distflown', 'work')}
+
+
+def test_traffic_fused_kinematics(traffic_, sim_):
+    """
+    Test the in-place kinematics update.
+
+    Expects exactly the same aircraft states as the standard kinematics.
+    """
+    states = fly_kinematics(traffic_, False)
+    fused = fly_kinematics(traffic_, True)
+    for name, value in states.items():
+        assert np.array_equal(fused[name], value), name
+    assert states['alt'][2] > 0.0
+
+
+def test_traffic_stage_stagger(traffic_, sim_):
+    """
+    Test the update intervals of the traffic subsystems.
+
+    Expects subsystems with the same interval as the ASAS to be updated
+    once per interval, each in a different simulation timestep.
+    """
+    from bluesky.core import simtime
+    bluesky.sim.reset()
+    names = ('ASAS', 'ADSB', 'COND', 'TRAILS')
+    for name in names[1:]:
+        simtime.setdt(1.0, name)
+    bluesky.stack.stack('CRE STAG1 B744 52.0 4.0 90 FL100 250')
+    triggers = {name: [] for name in names}
+    while bluesky.sim.simt < 2.0:
+        bluesky.sim.step()
+        for name in names:
+            if simtime._timers[name].readynext():
+                triggers[name].append(round(bluesky.sim.simt, 2))
+    for name, times in triggers.items():
+        assert len(times) == 2 and round(times[1] - times[0], 2) == 1.0, name
+    assert len({times[0] for times in triggers.values()}) == len(names)
+    bluesky.sim.reset()
+
+
+def test_traffic_profile(traffic_, sim_):
+    """
+    Test the profiler of the simulation stages.
+
+    Expects the simulation, traffic and timer stages and the stack commands
+    to be timed once profiling is switched on, and nothing to be added
+    once it is switched off.
+    """
+    from bluesky.core import profiler
+    bluesky.sim.reset()
+    bluesky.stack.stack('PROFILE ON')
+    bluesky.stack.stack('CRE PROF1 B744 52.0 4.0 90 FL100 250')
+    while bluesky.sim.simt < 1.0:
+        bluesky.sim.step()
+    for name in ('sim.step', 'sim.traffic', 'traffic.kinematics', 'timer.asas', 'stack.CRE'):
+        assert name in profiler.stages, name
+    nsteps = profiler.nsteps()
+    assert nsteps > 0 and profiler.siminfo()['step'] > 0.0
+    assert profiler.report().count('\n') == len(profiler.stages) + 1
+
+    bluesky.stack.stack('PROFILE OFF')
+    bluesky.sim.step()
+    bluesky.sim.step()
+    assert profiler.nsteps() == nsteps and profiler.siminfo() == dict()
+    bluesky.sim.reset()
+    assert not profiler.stages
+
+
+def test_traffic_idle_skip(traffic_, sim_):
+    """
+    Test skipping of idle periods without traffic.
+
+    Expects the simulation to skip to the scenario command that creates
+    the next aircraft, in far fewer steps, with the same simulation time,
+    aircraft state and timer phase as without skipping.
+    """
+    from bluesky.core import simtime
+    results = []
+    for flag in ('OFF', 'ON'):
+        bluesky.sim.reset()
+        simtime.setdt(1.0, 'ADSB')
+        bluesky.stack.stack(f'IDLESKIP {flag}')
+        bluesky.stack.set_scendata([0.0, 100.03],
+                                   ['ECHO start', 'CRE SKIP1 B744 52.0 4.0 90 FL100 250'])
+        bluesky.sim.op()
+        nsteps = 0
+        while bluesky.sim.simt < 110.0:
+            bluesky.sim.step()
+            nsteps += 1
+        results.append((nsteps, simtime._clock.t, simtime._timers['ADSB'].counter,
+                        bluesky.traf.lon.tolist()))
+    bluesky.sim.idleskip(False)
+    bluesky.sim.reset()
+    (nsteps0, *state0), (nsteps1, *state1) = results
+    assert state0 == state1
+    assert nsteps1 < nsteps0 // 5
+
+
 # test remaining traffic functions
@@ -142,3 +142,32 @@ def test_trafficarrays_reset(t_a):
 
     assert not root.fl_list
     assert not root.children[0].np_array_bool
+
+
+def test_trafficarrays_buffer(t_a):
+    """
+    Tests that arrays grow inside an over-allocated buffer,
+    and that deletion keeps the order of the remaining elements.
+    """
+    root, _tcclass = t_a
+    child = root._children[0]
+
+    root.reset()
+    root.create(3)
+    root.create_children(3)
+    child.np_array_int[:] = [0, 1, 2]
+    buf = child.np_array_int.base
+
+    # Creating aircraft within the buffer capacity doesn't reallocate
+    root.create(2)
+    root.create_children(2)
+    assert child.np_array_int.base is buf
+    assert list(child.np_array_int) == [0, 1, 2, 0, 0]
+
+    # Replaced arrays are copied back into the buffer
+    child.np_array_int = child.np_array_int + 1
+    root.delete([0, 3])
+    assert child.np_array_int.base is buf
+    assert list(child.np_array_int) == [2, 3, 1]
+
+    root.reset()
@@ -1,5 +1,8 @@
 from pathlib import Path
+import json
+import os
 import pickle
+import numpy as np
 
 from bluesky import settings
 
@@ -11,6 +14,10 @@ def openfile(*args):
     return CacheFile(*args)
 
 
+def openarrays(*args):
+    return ArrayCache(*args)
+
+
 class CacheError(Exception):
     ''' Exception class for CacheFile errors. '''
     pass
@@ -59,3 +66,84 @@ class CacheFile():
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.file:
             self.file.close()
+
+
+class ArrayCache():
+    ''' Cache of named columns, stored as numpy .npy files in a cache directory.
+
+        Numpy arrays are memory-mapped read-only when loaded, so that all
+        processes that load the same cache share its pages through the OS
+        page cache. Lists of strings are stored as a string table, and other
+        lists as arrays that are converted back to lists when loaded.
+    '''
+    def __init__(self, dirname, version_ref='1'):
+        self.path = settings.resolve_path(settings.cache_path) / dirname
+        self.version_ref = version_ref
+
+    def load(self):
+        ''' Load all columns from the cache directory. '''
+        fmanifest = self.path / 'manifest.json'
+        if not fmanifest.is_file():
+            raise CacheError('Cachefile not found: ' + str(self.path))
+
+        with open(fmanifest) as f:
+            manifest = json.load(f)
+
+        # Version check
+        if not manifest['version'] == self.version_ref:
+            raise CacheError('Cache file out of date: ' + str(self.path))
+        print('Reading cache:', self.path)
+
+        columns = dict()
+        for name, (kind, n) in manifest['columns'].items():
+            data = np.load(self.path / (name + '.npy'), mmap_mode='r', allow_pickle=False)
+            if kind == 'array':
+                columns[name] = data
+            elif kind == 'str':
+                columns[name] = bytes(data).decode('utf-8').split('\0') if n else []
+            else:
+                columns[name] = data.tolist()
+                if kind == 'mixed':
+                    # Restore the integers in lists of mixed int and float
+                    isint = np.load(self.path / (name + '.int.npy'), allow_pickle=False)
+                    for i in np.flatnonzero(isint):
+                        columns[name][i] = int(columns[name][i])
+        return columns
+
+    def dump(self, columns):
+        ''' Write a dict of columns (numpy arrays, or lists of strings or
+            numbers) to the cache directory. '''
+        print("Writing cache:", self.path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        kinds = dict()
+        for name, col in columns.items():
+            if isinstance(col, np.ndarray):
+                kinds[name] = ('array', len(col))
+                self.save(name + '.npy', col)
+            elif all(isinstance(v, str) for v in col):
+                kinds[name] = ('str', len(col))
+                self.save(name + '.npy', np.frombuffer(
+                    '\0'.join(col).encode('utf-8'), dtype=np.uint8))
+            else:
+                isint = np.array([isinstance(v, int) for v in col], dtype=bool)
+                mixed = isint.any() and not isint.all()
+                kinds[name] = ('mixed' if mixed else 'list', len(col))
+                self.save(name + '.npy', np.array(col))
+                if mixed:
+                    self.save(name + '.int.npy', isint)
+
+        # The manifest is written last: without it the cache is not used
+        self.save('manifest.json', json.dumps(
+            dict(version=self.version_ref, columns=kinds)).encode('utf-8'))
+
+    def save(self, fname, data):
+        ''' Write one cache file. Each file is written under a temporary name
+            and then renamed, so that processes that build the same cache at
+            the same time never read an incomplete file. '''
+        tmpname = self.path / '{}.{}.tmp'.format(fname, os.getpid())
+        with open(tmpname, 'wb') as f:
+            if isinstance(data, bytes):
+                f.write(data)
+            else:
+                np.save(f, data, allow_pickle=False)
+        os.replace(tmpname, self.path / fname)
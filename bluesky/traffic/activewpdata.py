@@ -64,32 +64,42 @@ class ActiveWaypoint(Entity, replaceable=True):
         self.curlegdir[-n:]  = -999.0   # [deg] direction to active waypoint upon activation
         self.curleglen[-n:]  = -999.0   # [nm] distance to active waypoint upon activation
   
-    def Reached(self, qdr, dist, flyby, flyturn, turnradnm,swlastwp):
+    def Reached(self, qdr, dist, flyby, flyturn, turnradnm,swlastwp, idx=None):
         # Calculate distance before waypoint where to start the turn
         # Note: this is a vectorized function, called with numpy traffic arrays
         # It returns the indices where the Reached criterion is True
+        # When an index array idx is given, only those aircraft are checked
         #
         # Turn radius:      R = V2 tan phi / g
         # Distance to turn: wpturn = R * tan (1/2 delhdg) but max 4 times radius
         # using default bank angle per flight phase
 
+        if idx is not None:
+            qdr, dist, flyby, flyturn, turnradnm, swlastwp = \
+                qdr[idx], dist[idx], flyby[idx], flyturn[idx], turnradnm[idx], swlastwp[idx]
+        sel = slice(None) if idx is None else idx
+
         # First calculate turn distance
-        next_qdr = np.where(self.next_qdr < -900., qdr, self.next_qdr)
-        turntas = np.where(bs.traf.actwp.turnspd<0.0,bs.traf.tas,bs.traf.actwp.turnspd)
-        flybyturndist,turnrad = self.calcturn(turntas,bs.traf.ap.bankdef,qdr,next_qdr,turnradnm)
+        next_qdr = np.where(self.next_qdr[sel] < -900., qdr, self.next_qdr[sel])
+        turntas = np.where(self.turnspd[sel]<0.0,bs.traf.tas[sel],self.turnspd[sel])
+        flybyturndist,turnrad = self.calcturn(turntas,bs.traf.ap.bankdef[sel],qdr,next_qdr,turnradnm)
 
         # Turb dist iz ero for flyover, calculated distance for others
-        self.turndist = np.logical_or(flyby,flyturn)*flybyturndist
+        turndist = np.logical_or(flyby,flyturn)*flybyturndist
+        if idx is None:
+            self.turndist = turndist
+        else:
+            self.turndist[idx] = turndist
 
         # Avoid circling by checking for flying away on almost straight legs with small turndist
         # difference between direction to and track larger than 90
         # and close to waypoint based on ground speed, assumption using vicinity criterion:
         # flying away and within 4 sec distance based on ground speed (4 sec = sensitivity tuning parameter)
 
-        close2wp = dist/(np.maximum(0.0001,np.abs(bs.traf.gs)))<4.0 # Waypoint is within 4 seconds flight time
+        close2wp = dist/(np.maximum(0.0001,np.abs(bs.traf.gs[sel])))<4.0 # Waypoint is within 4 seconds flight time
 
         # When close to waypoint or passing the last waypoint, switch when flying away from active waypoint
-        away  = np.logical_or(close2wp,swlastwp)*(np.abs(degto180(bs.traf.trk%360. - qdr%360.)) > 90.) # difference large than 90
+        away  = np.logical_or(close2wp,swlastwp)*(np.abs(degto180(bs.traf.trk[sel]%360. - qdr%360.)) > 90.) # difference large than 90
 
         # Ratio between distance close enough to switch to next wp when flying away
         # When within pro1 nm and flying away: switch also
@@ -99,10 +109,10 @@ class ActiveWaypoint(Entity, replaceable=True):
 
         # Check whether shift based dist is required, set closer than WP turn distance
         # Detect indices
-        swreached = np.where(bs.traf.swlnav * np.logical_or(away,np.logical_or(dist < self.turndist,circling)))[0]
+        swreached = np.where(bs.traf.swlnav[sel] * np.logical_or(away,np.logical_or(dist < turndist,circling)))[0]
 
         # Return indices for which condition is True/1.0 for a/c where we have reached waypoint
-        return swreached
+        return swreached if idx is None else idx[swreached]
 
     # Calculate turn distance for array or scalar
     def calcturn(self,tas,bank,wpqdr,next_wpqdr,turnradnm=-999.):
@@ -2,7 +2,10 @@
 import numpy as np
 import bluesky as bs
 from bluesky.tools.aero import ft
-from bluesky.core import Entity
+from bluesky.core import Entity, timed_function
+
+# Update interval of the ADS-B model, 0 to update every simulation timestep
+bs.settings.set_variable_defaults(adsb_dt=0.0)
 
 
 class ADSB(Entity, replaceable=True):
@@ -41,6 +44,7 @@ class ADSB(Entity, replaceable=True):
         self.tas[-n:] = bs.traf.tas[-n:]
         self.gs[-n:]  = bs.traf.gs[-n:]
 
+    @timed_function(name='adsb', dt=bs.settings.adsb_dt, manual=True, stagger=True)
     def update(self):
         up = np.where(self.lastupdate + self.trunctime < bs.sim.simt)
         nup = len(up)
@@ -1,7 +1,11 @@
 """ Pilot logic."""
 import numpy as np
 import bluesky as bs
-from bluesky.core import TrafficArrays
+from bluesky.core import TrafficArrays, timed_function
+
+# Update interval of the autopilot/ASAS selection, 0 to update every simulation timestep
+bs.settings.set_variable_defaults(aporasas_dt=0.0)
+
 
 class APorASAS(TrafficArrays):
     def __init__(self):
@@ -21,6 +25,7 @@ class APorASAS(TrafficArrays):
         self.hdg[-n:] = bs.traf.hdg[-n:]
         self.trk[-n:] = bs.traf.trk[-n:]
 
+    @timed_function(name='aporasas', dt=bs.settings.aporasas_dt, manual=True, stagger=True)
     def update(self):
         #--------- Input to Autopilot settings to follow: destination or ASAS ----------
         # Convert the ASAS commanded speed from ground speed to TAS
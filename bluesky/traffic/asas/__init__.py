@@ -1,4 +1,6 @@
 from .detection import ConflictDetection
 from .resolution import ConflictResolution
 from .statebased import StateBased
+from .spatial import SpatialStateBased
+from .parallel import ParallelStateBased
 from .mvp import MVP
\ No newline at end of file
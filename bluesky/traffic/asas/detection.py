@@ -8,7 +8,7 @@ from bluesky.stack import command
 
 
 bs.settings.set_variable_defaults(asas_pzr=5.0, asas_pzh=1000.0,
-                                  asas_dtlookahead=300.0)
+                                  asas_dtlookahead=300.0, asas_vprefilter=False)
 
 
 class ConflictDetection(Entity, replaceable=True):
@@ -28,17 +28,32 @@ class ConflictDetection(Entity, replaceable=True):
         self.dtnolook_def = 0.0
         self.global_dtnolook = True
 
+        # Vertical prefilter: skip pairs that can't meet vertically
+        self.vprefilter = bs.settings.asas_vprefilter
+        # Number of candidate pairs and pairs pruned by the vertical prefilter
+        # in the last update
+        self.npairs = 0
+        self.npruned = 0
+
         # Conflicts and LoS detected in the current timestep (used for resolving)
-        self.confpairs = list()
-        self.lospairs = list()
+        # as (ownship index, intruder index) pairs. Callsign tuples are
+        # available through the confpairs and lospairs properties.
+        self.confpairs_idx = np.empty((0, 2), dtype=np.int32)
+        self.lospairs_idx = np.empty((0, 2), dtype=np.int32)
         self.qdr = np.array([])
         self.dist = np.array([])
         self.dcpa = np.array([])
         self.tcpa = np.array([])
         self.tLOS = np.array([])
-        # Unique conflicts and LoS in the current timestep (a, b) = (b, a)
-        self.confpairs_unique = set()
-        self.lospairs_unique = set()
+        # Unique conflicts and LoS in the current timestep (a, b) = (b, a),
+        # identified by a key made from the unique ids of both aircraft
+        self.confkeys = np.array([], dtype=np.int64)
+        self.loskeys = np.array([], dtype=np.int64)
+        self.confunique_idx = np.empty((0, 2), dtype=np.int32)
+        self.losunique_idx = np.empty((0, 2), dtype=np.int32)
+        # Callsigns at the time of detection, and lazily generated callsign pairs
+        self.pairids = list()
+        self._pairs = dict()
 
         # All conflicts and LoS since simt=0
         self.confpairs_all = list()
@@ -58,10 +73,14 @@ class ConflictDetection(Entity, replaceable=True):
 
     def clearconfdb(self):
         ''' Clear conflict database. '''
-        self.confpairs_unique.clear()
-        self.lospairs_unique.clear()
-        self.confpairs.clear()
-        self.lospairs.clear()
+        self.confpairs_idx = np.empty((0, 2), dtype=np.int32)
+        self.lospairs_idx = np.empty((0, 2), dtype=np.int32)
+        self.confkeys = np.array([], dtype=np.int64)
+        self.loskeys = np.array([], dtype=np.int64)
+        self.confunique_idx = np.empty((0, 2), dtype=np.int32)
+        self.losunique_idx = np.empty((0, 2), dtype=np.int32)
+        self.pairids = list()
+        self._pairs.clear()
         self.qdr = np.array([])
         self.dist = np.array([])
         self.dcpa = np.array([])
@@ -70,6 +89,41 @@ class ConflictDetection(Entity, replaceable=True):
         self.inconf = np.zeros(bs.traf.ntraf)
         self.tcpamax = np.zeros(bs.traf.ntraf)
 
+    @property
+    def confpairs(self):
+        ''' Conflict pairs of the current timestep as (ownship, intruder)
+            callsign tuples. '''
+        return self.idx2pairs('conf', self.confpairs_idx, tuple)
+
+    @property
+    def lospairs(self):
+        ''' LoS pairs of the current timestep as (ownship, intruder)
+            callsign tuples. '''
+        return self.idx2pairs('los', self.lospairs_idx, tuple)
+
+    @property
+    def confpairs_unique(self):
+        ''' Unique conflict pairs of the current timestep as a set of
+            callsign frozensets. '''
+        return self.idx2pairs('confunique', self.confunique_idx, frozenset)
+
+    @property
+    def lospairs_unique(self):
+        ''' Unique LoS pairs of the current timestep as a set of
+            callsign frozensets. '''
+        return self.idx2pairs('losunique', self.losunique_idx, frozenset)
+
+    def idx2pairs(self, name, pairs, pairtype):
+        ''' Convert index pairs to callsign pairs, only when requested. '''
+        ret = self._pairs.get(name)
+        if ret is None:
+            ids = self.pairids
+            ret = [pairtype((ids[i], ids[j])) for i, j in pairs.tolist()]
+            if pairtype is frozenset:
+                ret = set(ret)
+            self._pairs[name] = ret
+        return ret
+
     def create(self, n):
         super().create(n)
         # Initialise values of own states
@@ -89,6 +143,8 @@ class ConflictDetection(Entity, replaceable=True):
         self.dtnolook_def = 0.0
         self.global_rpz = self.global_hpz = True
         self.global_dtlook = self.global_dtnolook = True
+        self.vprefilter = bs.settings.asas_vprefilter
+        self.npairs = self.npruned = 0
 
     @staticmethod
     @command(name='CDMETHOD', aliases=('ASAS',))
@@ -206,32 +262,66 @@ class ConflictDetection(Entity, replaceable=True):
             self.dtnolook[:] = time
         return True, f'Setting default CD no-look to {time} sec'
 
+    @command(name='CDVFILTER', aliases=('VPREFILTER',))
+    def setvprefilter(self, flag: 'onoff' = None):
+        ''' Switch the vertical prefilter of conflict detection on or off.
+            When on, aircraft pairs that cannot come within the vertical
+            separation distance within the lookahead time are discarded
+            before the horizontal closest point of approach is calculated. '''
+        if flag is None:
+            return True, f'CDVFILTER [ON/OFF]\nVertical prefilter is ' + \
+                ('ON' if self.vprefilter else 'OFF') + \
+                f'\nPruned {self.npruned} of {self.npairs} pairs in last update'
+        self.vprefilter = flag
+        return True, 'Vertical prefilter switched ' + ('on' if flag else 'off')
+
     def update(self, ownship, intruder):
         ''' Perform an update step of the Conflict Detection implementation. '''
-        self.confpairs, self.lospairs, self.inconf, self.tcpamax, self.qdr, \
+        confpairs, lospairs, self.inconf, self.tcpamax, self.qdr, \
             self.dist, self.dcpa, self.tcpa, self.tLOS = \
                 self.detect(ownship, intruder, self.rpz, self.hpz, self.dtlookahead)
+        self.confpairs_idx = pairs2idx(confpairs, ownship)
+        self.lospairs_idx = pairs2idx(lospairs, ownship)
+
+        # Callsign pairs are generated from the callsigns at this timestep
+        self._pairs.clear()
+        hasconf = len(self.confpairs_idx) > 0
+        haslos = len(self.lospairs_idx) > 0
+        self.pairids = ownship.id.copy() if hasconf or haslos else list()
 
         # confpairs has conflicts observed from both sides (a, b) and (b, a)
-        # confpairs_unique keeps only one of these
-        confpairs_unique = {frozenset(pair) for pair in self.confpairs}
-        lospairs_unique = {frozenset(pair) for pair in self.lospairs}
+        # confunique_idx keeps only one of these
+        confkeys, iunique = np.unique(pairkeys(self.confpairs_idx, ownship.uid),
+                                      return_index=True)
+        self.confunique_idx = self.confpairs_idx[iunique]
+        loskeys, iunique = np.unique(pairkeys(self.lospairs_idx, ownship.uid),
+                                     return_index=True)
+        self.losunique_idx = self.lospairs_idx[iunique]
 
-        self.confpairs_all.extend(confpairs_unique - self.confpairs_unique)
-        self.lospairs_all.extend(lospairs_unique - self.lospairs_unique)
+        # Add the callsigns of new conflicts and LoS to confpairs_all and lospairs_all
+        ids = self.pairids
+        new = np.isin(confkeys, self.confkeys, assume_unique=True, invert=True)
+        self.confpairs_all.extend(frozenset((ids[i], ids[j]))
+                                  for i, j in self.confunique_idx[new].tolist())
+        new = np.isin(loskeys, self.loskeys, assume_unique=True, invert=True)
+        self.lospairs_all.extend(frozenset((ids[i], ids[j]))
+                                 for i, j in self.losunique_idx[new].tolist())
 
-        # Update confpairs_unique and lospairs_unique
-        self.confpairs_unique = confpairs_unique
-        self.lospairs_unique = lospairs_unique
+        self.confkeys = confkeys
+        self.loskeys = loskeys
 
     def detect(self, ownship, intruder, rpz, hpz, dtlookahead):
         ''' Detect any conflicts between ownship and intruder.
             This function should be reimplemented in a subclass for actual
             detection of conflicts. See for instance
             bluesky.traffic.asas.statebased.
+
+            Conflict and LoS pairs are returned as (n, 2) arrays of
+            (ownship index, intruder index). Lists of callsign tuples are
+            also accepted from implementations that return those.
         '''
-        confpairs = []
-        lospairs = []
+        confpairs = np.empty((0, 2), dtype=np.int32)
+        lospairs = np.empty((0, 2), dtype=np.int32)
         inconf = np.zeros(ownship.ntraf)
         tcpamax = np.zeros(ownship.ntraf)
         qdr = np.array([])
@@ -240,3 +330,74 @@ class ConflictDetection(Entity, replaceable=True):
         tcpa = np.array([])
         tLOS = np.array([])
         return confpairs, lospairs, inconf, tcpamax, qdr, dist, dcpa, tcpa, tLOS
+
+    def vertical_prefilter(self, ownship, intruder, hpz, dtlookahead, idx=None, jdx=None):
+        ''' Vertical prefilter stage that can be used by any conflict
+            detection implementation.
+
+            Returns the (ownship, intruder) index pairs, in row-major order,
+            for which the altitude difference minus the vertical separation
+            distance can be closed by the vertical speeds within the
+            lookahead time. Only these pairs can be in conflict or in LoS.
+            When candidate pairs idx, jdx are passed these are filtered,
+            otherwise all pairs are considered, by sorting the intruders
+            on altitude. The number of pruned pairs is stored in npruned.
+        '''
+        ntraf = ownship.ntraf
+        ownvs = np.abs(ownship.vs)
+        intvs = np.abs(intruder.vs)
+        dtlook = np.maximum(0.0, dtlookahead)
+        if idx is None:
+            self.npairs = ntraf * (ntraf - 1)
+            if ntraf < 2:
+                self.npruned = 0
+                return np.array([], dtype=int), np.array([], dtype=int)
+
+            # Altitude window per row using the largest vertical speeds and
+            # hpz of all aircraft, which is refined per pair below
+            order = np.argsort(ownship.alt, kind='stable')
+            altsorted = ownship.alt[order]
+            reach = np.max(hpz) + (np.max(ownvs) + np.max(intvs) + 1e-6) * dtlook
+            reach = reach * (1.0 + 1e-6) + 1e-3
+            lo = np.searchsorted(altsorted, intruder.alt - reach, side='left')
+            hi = np.searchsorted(altsorted, intruder.alt + reach, side='right')
+            count = hi - lo
+            idx = np.repeat(np.arange(ntraf), count)
+            start = np.cumsum(count) - count
+            jdx = order[np.arange(idx.size) - np.repeat(start - lo, count)]
+            keep = idx != jdx
+            idx, jdx = idx[keep], jdx[keep]
+            rowmajor = np.argsort(idx * ntraf + jdx, kind='stable')
+            idx, jdx = idx[rowmajor], jdx[rowmajor]
+        else:
+            self.npairs = len(idx)
+
+        # Same pairwise definitions as in the state-based detection:
+        # dalt[i, j] = alt[j] - alt[i], with the largest hpz of the pair
+        dalt = np.abs(ownship.alt[jdx] - intruder.alt[idx])
+        hpzpair = np.maximum(hpz[jdx], hpz[idx])
+        # Vertical speeds are bounded below by 1e-6 in the detection
+        closing = (ownvs[jdx] + intvs[idx] + 1e-6) * dtlook[idx]
+        keep = dalt - hpzpair <= closing * (1.0 + 1e-6) + 1e-3
+        self.npruned = self.npairs - np.count_nonzero(keep)
+        return idx[keep], jdx[keep]
+
+
+def pairs2idx(pairs, ownship):
+    ''' Return conflict pairs as an (n, 2) array of aircraft indices. '''
+    if isinstance(pairs, np.ndarray):
+        return pairs.astype(np.int32, copy=False).reshape(-1, 2)
+    # Convert a list of callsign tuples
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int32)
+    own, intr = zip(*pairs)
+    return np.column_stack((ownship.id2idx(own), ownship.id2idx(intr))).astype(np.int32)
+
+
+def pairkeys(pairs, uid):
+    ''' Return a key for each aircraft pair that is independent of the order
+        of the aircraft in the pair, and remains valid when aircraft are
+        created and deleted. '''
+    uid1 = uid[pairs[:, 0]]
+    uid2 = uid[pairs[:, 1]]
+    return (np.minimum(uid1, uid2) << 32) | np.maximum(uid1, uid2)
@@ -168,9 +168,7 @@ class MVP(ConflictResolution):
         timesolveV = np.ones(ownship.ntraf) * 1e9
 
         # Call MVP function to resolve conflicts-----------------------------------
-        for ((ac1, ac2), qdr, dist, tcpa, tLOS) in zip(conf.confpairs, conf.qdr, conf.dist, conf.tcpa, conf.tLOS):
-            idx1 = ownship.id.index(ac1)
-            idx2 = intruder.id.index(ac2)
+        for ((idx1, idx2), qdr, dist, tcpa, tLOS) in zip(conf.confpairs_idx.tolist(), conf.qdr, conf.dist, conf.tcpa, conf.tLOS):
 
             # If A/C indexes are found, then apply MVP on this conflict pair
             # Because ADSB is ON, this is done for each aircraft separately
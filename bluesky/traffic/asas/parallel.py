@@ -0,0 +1,141 @@
+''' State-based conflict detection distributed over a pool of worker processes. '''
+import atexit
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+from types import SimpleNamespace
+import numpy as np
+
+import bluesky as bs
+from bluesky import stack
+from bluesky.traffic.asas.statebased import StateBased, detect_block, \
+    merge_blocks, BLOCKBUFS, BLOCKMASKS
+
+
+bs.settings.set_variable_defaults(asas_nworkers=0)
+
+# Rows of the shared input array
+INPUTS = ('ownlat', 'ownlon', 'ownalt', 'ownvs', 'intlat', 'intlon', 'intalt',
+          'intvs', 'ownu', 'ownv', 'intu', 'intv', 'rpz', 'hpz', 'dtlookahead')
+
+# Shared memory and work buffers, as attached to in each worker process
+worker = SimpleNamespace(shm=None, blockbufs=None)
+
+
+class ParallelStateBased(StateBased):
+    ''' State-based conflict detection, where the blocks of ownship rows are
+        divided over a pool of worker processes. The aircraft states are
+        passed to the workers in shared memory. The results are merged in
+        row order, and are identical to those of StateBased. '''
+    def __init__(self):
+        super().__init__()
+        # Number of worker processes. Zero uses the number of CPUs
+        self.nworkers = bs.settings.asas_nworkers or os.cpu_count()
+        self.workers = None
+        self.shm = None
+        atexit.register(self.stopworkers)
+
+    def reset(self):
+        super().reset()
+        self.stopworkers()
+        self.nworkers = bs.settings.asas_nworkers or os.cpu_count()
+
+    def stopworkers(self):
+        ''' Stop the worker processes and release the shared memory. '''
+        if self.workers is not None:
+            self.workers.shutdown()
+            self.workers = None
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    @stack.command(name='CDWORKERS')
+    def setnworkers(self, nworkers: int = None):
+        ''' Set the number of worker processes for parallel conflict detection.
+            Zero uses the number of CPUs. '''
+        if nworkers is None:
+            return True, f'CDWORKERS [nworkers]\nUsing {self.nworkers} worker process(es)'
+        self.stopworkers()
+        self.nworkers = max(0, nworkers) or os.cpu_count()
+        return True, f'Using {self.nworkers} worker process(es) for conflict detection'
+
+    def detect(self, ownship, intruder, rpz, hpz, dtlookahead):
+        ''' Conflict detection between ownship (traf) and intruder (traf/adsb).'''
+        blocksize = self.blocksize or ownship.ntraf
+        if self.vprefilter or self.nworkers < 2 or ownship.ntraf <= blocksize:
+            return super().detect(ownship, intruder, rpz, hpz, dtlookahead)
+        try:
+            return self.detect_parallel(ownship, intruder, rpz, hpz, dtlookahead)
+        except (BrokenProcessPool, OSError) as e:
+            bs.scr.echo(f'Parallel conflict detection failed ({e}), '
+                        'continuing with a single process.')
+            self.stopworkers()
+            self.nworkers = 1
+            return super().detect(ownship, intruder, rpz, hpz, dtlookahead)
+
+    def detect_parallel(self, ownship, intruder, rpz, hpz, dtlookahead):
+        ''' Divide the ownship rows over the worker processes, and merge
+            their results. '''
+        ntraf = ownship.ntraf
+        if self.workers is None:
+            self.workers = ProcessPoolExecutor(self.nworkers,
+                                               mp_context=get_context('spawn'))
+
+        # Copy the aircraft states to shared memory, which grows with ntraf
+        capacity = 0 if self.shm is None else self.shm.size // (8 * len(INPUTS))
+        if capacity < ntraf:
+            if self.shm is not None:
+                self.shm.close()
+                self.shm.unlink()
+            capacity = max(2 * capacity, ntraf)
+            self.shm = shared_memory.SharedMemory(create=True,
+                                                  size=8 * len(INPUTS) * capacity)
+        inputs = np.ndarray((len(INPUTS), capacity), buffer=self.shm.buf)
+        owntrkrad = np.radians(ownship.trk)
+        inttrkrad = np.radians(intruder.trk)
+        for row, value in enumerate((
+                ownship.lat, ownship.lon, ownship.alt, ownship.vs,
+                intruder.lat, intruder.lon, intruder.alt, intruder.vs,
+                ownship.gs * np.sin(owntrkrad), ownship.gs * np.cos(owntrkrad),
+                intruder.gs * np.sin(inttrkrad), intruder.gs * np.cos(inttrkrad),
+                rpz, hpz, dtlookahead)):
+            inputs[row, :ntraf] = value
+
+        # Each worker gets a contiguous range of whole blocks
+        nblocks = -(-ntraf // self.blocksize)
+        bounds = [self.blocksize * (nblocks * w // self.nworkers)
+                  for w in range(self.nworkers + 1)]
+        futures = [self.workers.submit(detect_rows, self.shm.name, capacity,
+                                       ntraf, r0, min(r1, ntraf), self.blocksize)
+                   for r0, r1 in zip(bounds[:-1], bounds[1:]) if r0 < r1]
+        blockresults = [res for future in futures for res in future.result()]
+        return merge_blocks(blockresults)
+
+
+def detect_rows(shmname, capacity, ntraf, r0, r1, blocksize):
+    ''' Worker process function: run the blocked state-based detection
+        for ownship rows r0 to r1, using the aircraft states in shared
+        memory shmname. '''
+    if worker.shm is None or worker.shm.name != shmname:
+        if worker.shm is not None:
+            worker.shm.close()
+        worker.shm = shared_memory.SharedMemory(name=shmname)
+    inputs = dict(zip(INPUTS, np.ndarray((len(INPUTS), capacity),
+                                         buffer=worker.shm.buf)[:, :ntraf]))
+
+    shape = (blocksize, ntraf)
+    if worker.blockbufs is None or worker.blockbufs['A'].shape != shape:
+        worker.blockbufs = {**{name: np.empty(shape) for name in BLOCKBUFS},
+                            **{name: np.empty(shape, dtype=bool) for name in BLOCKMASKS}}
+
+    ownship = SimpleNamespace(lat=inputs['ownlat'], lon=inputs['ownlon'],
+                              alt=inputs['ownalt'], vs=inputs['ownvs'])
+    intruder = SimpleNamespace(lat=inputs['intlat'], lon=inputs['intlon'],
+                               alt=inputs['intalt'], vs=inputs['intvs'])
+    vel = (inputs['ownu'], inputs['ownv'], inputs['intu'], inputs['intv'])
+    return [detect_block(ownship, intruder, inputs['rpz'], inputs['hpz'],
+                         inputs['dtlookahead'], vel, b0, min(b0 + blocksize, r1),
+                         worker.blockbufs)
+            for b0 in range(r0, r1, blocksize)]
@@ -0,0 +1,87 @@
+''' State-based conflict detection with a spatial broad phase. '''
+import numpy as np
+from scipy.spatial import cKDTree
+
+from bluesky.traffic.asas import ConflictDetection
+from bluesky.traffic.asas.statebased import REARTH, detect_pairs
+
+
+class SpatialStateBased(ConflictDetection):
+    ''' State-based conflict detection that only evaluates the closest
+        point of approach for aircraft pairs that can possibly come within
+        the protected zone within the lookahead time.
+
+        A KD-tree over the aircraft positions is used as a broad phase to find
+        these candidate pairs. The resulting conflict data is identical
+        to that of StateBased, but the cost scales with the number of nearby
+        pairs instead of with the square of the number of aircraft.
+    '''
+    def detect(self, ownship, intruder, rpz, hpz, dtlookahead):
+        ''' Conflict detection between ownship (traf) and intruder (traf/adsb).'''
+        idx, jdx = self.candidates(ownship, intruder, rpz, dtlookahead)
+        if self.vprefilter:
+            idx, jdx = self.vertical_prefilter(ownship, intruder, hpz,
+                                               dtlookahead, idx, jdx)
+        return detect_pairs(ownship, intruder, rpz, hpz, dtlookahead, idx, jdx)
+
+    @staticmethod
+    def candidates(ownship, intruder, rpz, dtlookahead):
+        ''' Broad phase: return the (ownship, intruder) index pairs, sorted
+            in row-major order, that can possibly be in conflict or in loss
+            of separation.
+
+            The search radius is the largest protected zone plus the distance
+            that can be closed at the largest relative speed during the
+            largest lookahead time.
+        '''
+        ntraf = ownship.ntraf
+        if ntraf < 2:
+            return np.array([], dtype=int), np.array([], dtype=int)
+
+        lat = np.concatenate((ownship.lat, intruder.lat))
+        vmax = np.max(np.abs(ownship.gs)) + np.max(np.abs(intruder.gs))
+        reach = np.max(rpz) + vmax * max(0.0, np.max(dtlookahead))
+        # Small relative and absolute margin to stay on the safe side of rounding
+        reach = reach * (1.0 + 1e-6) + 1.0
+
+        # The kwik distance is never smaller than the flat distance in degrees
+        # where longitude differences are scaled with the smallest cos(lat)
+        # of all aircraft. Use a periodic box to take the date line into account.
+        coslat = np.cos(np.radians(np.max(np.abs(lat))))
+        if coslat > 1e-6:
+            boxsize = [360.0, 360.0 * coslat]
+            lonscale = coslat
+        else:
+            # Close to the poles only the latitude difference is usable
+            boxsize = [360.0, 1.0]
+            lonscale = 0.0
+
+        def treepos(traf):
+            pos = np.empty((ntraf, 2))
+            pos[:, 0] = traf.lat + 90.0
+            pos[:, 1] = np.mod(traf.lon + 180.0, 360.0) * lonscale
+            # Make sure rounding doesn't put points outside of the periodic box
+            pos[:, 1] = np.where(pos[:, 1] < boxsize[1], pos[:, 1], 0.0)
+            return cKDTree(pos, boxsize=boxsize)
+
+        radius = np.degrees(reach / REARTH)
+        owntree = treepos(ownship)
+        if intruder is ownship:
+            pairs = owntree.query_pairs(radius, output_type='ndarray')
+        else:
+            # Intruder positions can differ from the ownship positions (e.g.,
+            # when they come from ADS-B), so pairs are searched between trees
+            inttree = treepos(intruder)
+            pairs = owntree.sparse_distance_matrix(inttree, radius,
+                                                   output_type='ndarray')
+            pairs = np.column_stack((pairs['i'], pairs['j']))
+            pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+            # Pairs within reach in either direction are evaluated both ways
+            pairs = np.unique(np.sort(pairs, axis=1), axis=0)
+
+        # Each unordered pair is evaluated from both sides
+        idx = np.concatenate((pairs[:, 0], pairs[:, 1]))
+        jdx = np.concatenate((pairs[:, 1], pairs[:, 0]))
+        order = np.argsort(idx * ntraf + jdx, kind='stable')
+        return idx[order], jdx[order]
+
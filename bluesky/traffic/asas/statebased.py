@@ -1,14 +1,76 @@
 ''' State-based conflict detection. '''
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+import bluesky as bs
 from bluesky import stack
 from bluesky.tools import geo
 from bluesky.tools.aero import nm
 from bluesky.traffic.asas import ConflictDetection
 
 
+# [m] Radius of the earth as used by the kwik flat-earth approximations in geo
+REARTH = 6371000.0
+
+# Names of the float and boolean work buffers used by detect_block
+BLOCKBUFS = 'ABCDEFGHIJKLM'
+BLOCKMASKS = 'STU'
+
+
+bs.settings.set_variable_defaults(asas_blocksize=256, asas_nthreads=1)
+
+
 class StateBased(ConflictDetection):
+    def __init__(self):
+        super().__init__()
+        # Number of ownship rows processed at once. Zero disables blocking
+        self.blocksize = bs.settings.asas_blocksize
+        # Number of threads to process blocks with
+        self.nthreads = bs.settings.asas_nthreads
+        self.pool = None
+        # Work buffers of the blocked detection, one set per thread
+        self.blockbufs = list()
+
+    def reset(self):
+        super().reset()
+        self.blocksize = bs.settings.asas_blocksize
+        self.setnthreads(bs.settings.asas_nthreads)
+
+    def setnthreads(self, nthreads):
+        ''' Set the number of threads used by the blocked detection. '''
+        self.nthreads = max(1, nthreads)
+        self.blockbufs.clear()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        if self.nthreads > 1:
+            self.pool = ThreadPoolExecutor(self.nthreads)
+
+    @stack.command(name='CDBLOCKS')
+    def setblocks(self, blocksize: int = None, nthreads: int = None):
+        ''' Set the number of ownship rows that state-based conflict detection
+            processes at once, and optionally the number of threads to
+            process these blocks with. A block size of zero processes all
+            aircraft at once. '''
+        if blocksize is None:
+            return True, f'CDBLOCKS [blocksize, nthreads]\nCurrent block size: ' + \
+                f'{self.blocksize}, using {self.nthreads} thread(s)'
+        self.blocksize = max(0, blocksize)
+        self.blockbufs.clear()
+        if nthreads is not None:
+            self.setnthreads(nthreads)
+        return True, f'Setting CD block size to {self.blocksize}, ' + \
+            f'using {self.nthreads} thread(s)'
+
     def detect(self, ownship, intruder, rpz, hpz, dtlookahead):
         ''' Conflict detection between ownship (traf) and intruder (traf/adsb).'''
+        if self.vprefilter:
+            # Only evaluate the pairs that pass the vertical prefilter
+            idx, jdx = self.vertical_prefilter(ownship, intruder, hpz, dtlookahead)
+            return detect_pairs(ownship, intruder, rpz, hpz, dtlookahead, idx, jdx)
+
+        if 0 < self.blocksize < ownship.ntraf:
+            return self.detect_blocked(ownship, intruder, rpz, hpz, dtlookahead)
+
         # Identity matrix of order ntraf: avoid ownship-ownship detected conflicts
         I = np.eye(ownship.ntraf)
 
@@ -96,14 +158,302 @@ class StateBased(ConflictDetection):
         tcpamax = np.max(tcpa * swconfl, 1)
 
         # Select conflicting pairs: each a/c gets their own record
-        confpairs = [(ownship.id[i], ownship.id[j]) for i, j in zip(*np.where(swconfl))]
+        confpairs = np.argwhere(swconfl).astype(np.int32)
         swlos = (dist < rpz) * (np.abs(dalt) < hpz)
-        lospairs = [(ownship.id[i], ownship.id[j]) for i, j in zip(*np.where(swlos))]
+        lospairs = np.argwhere(swlos).astype(np.int32)
 
         return confpairs, lospairs, inconf, tcpamax, \
             qdr[swconfl], dist[swconfl], np.sqrt(dcpa2[swconfl]), \
                 tcpa[swconfl], tinconf[swconfl]
 
+    def detect_blocked(self, ownship, intruder, rpz, hpz, dtlookahead):
+        ''' Conflict detection that processes blocks of ownship rows, using
+            preallocated work buffers. The results are identical to those
+            of the full matrix calculation. '''
+        ntraf = ownship.ntraf
+        blocks = [(r0, min(ntraf, r0 + self.blocksize))
+                  for r0 in range(0, ntraf, self.blocksize)]
+        nsets = min(self.nthreads, len(blocks))
+
+        # (Re)allocate the work buffers when the number of aircraft changed
+        shape = (self.blocksize, ntraf)
+        if len(self.blockbufs) < nsets or self.blockbufs[0]['A'].shape != shape:
+            self.blockbufs = [
+                {**{name: np.empty(shape) for name in BLOCKBUFS},
+                 **{name: np.empty(shape, dtype=bool) for name in BLOCKMASKS}}
+                for _ in range(nsets)]
+
+        # Ownship and intruder horizontal speed components
+        owntrkrad = np.radians(ownship.trk)
+        inttrkrad = np.radians(intruder.trk)
+        vel = (ownship.gs * np.sin(owntrkrad), ownship.gs * np.cos(owntrkrad),
+               intruder.gs * np.sin(inttrkrad), intruder.gs * np.cos(inttrkrad))
+
+        def process(iset):
+            buf = self.blockbufs[iset]
+            return [detect_block(ownship, intruder, rpz, hpz, dtlookahead, vel,
+                                 r0, r1, buf) for r0, r1 in blocks[iset::nsets]]
+
+        if nsets > 1:
+            # Blocks are distributed round-robin over the threads
+            results = list(self.pool.map(process, range(nsets)))
+            blockresults = [results[i % nsets][i // nsets] for i in range(len(blocks))]
+        else:
+            blockresults = process(0)
+
+        return merge_blocks(blockresults)
+
+
+def detect_block(ownship, intruder, rpz, hpz, dtlookahead, vel, r0, r1, buf):
+    ''' Evaluate the state-based conflict detection for ownship rows r0 to r1.
+
+        All matrix calculations are done in place in the work buffers of
+        buf, following the order of operations of StateBased.detect.
+        Returns the row and column indices of conflict and LoS pairs, the
+        per-aircraft inconf and tcpamax of the block rows, and the
+        qdr, dist, dcpa, tcpa, and tLOS of the conflict pairs.
+    '''
+    ownu, ownv, intu, intv = vel
+    nrows = r1 - r0
+    rows = slice(r0, r1)
+    A, B, C, D, E, F, G, H, I, J, K, L, M = (buf[name][:nrows] for name in BLOCKBUFS)
+    S, T, U = (buf[name][:nrows] for name in BLOCKMASKS)
+    # Flat indices of the ownship-ownship elements in the block
+    diag = (np.arange(nrows), np.arange(r0, r1))
+
+    # Horizontal conflict ------------------------------------------------------
+    # qdr from i to j, as in geo.kwikqdrdist_matrix
+    np.subtract(intruder.lat, ownship.lat[rows, None], out=A)
+    np.radians(A, out=A)  # dlat
+    np.subtract(intruder.lon, ownship.lon[rows, None], out=B)
+    B += 180
+    np.mod(B, 360, out=B)
+    B -= 180
+    np.radians(B, out=B)  # dlon
+    np.add(intruder.lat, ownship.lat[rows, None], out=C)
+    np.radians(C, out=C)
+    C *= 0.5
+    np.cos(C, out=C)  # cavelat
+    np.multiply(B, C, out=D)
+    np.arctan2(D, A, out=D)
+    np.degrees(D, out=D)
+    np.mod(D, 360., out=D)  # qdr
+
+    # Distance in meters, with a large value for own/own pairs
+    A *= A
+    B *= B
+    C *= C
+    B *= C
+    A += B
+    np.sqrt(A, out=A)
+    A *= REARTH
+    A /= nm
+    A *= nm
+    A[diag] += 1e9  # dist
+
+    # Calculate horizontal closest point of approach (CPA)
+    np.radians(D, out=B)  # qdrrad
+    np.cos(B, out=C)
+    np.sin(B, out=B)
+    B *= A  # dx: pos j rel to i
+    C *= A  # dy: pos j rel to i
+
+    np.subtract(ownu, intu[rows, None], out=E)  # du
+    np.subtract(ownv, intv[rows, None], out=F)  # dv
+
+    np.multiply(E, E, out=G)
+    np.multiply(F, F, out=H)
+    G += H
+    np.maximum(G, 1e-6, out=G)  # dv2, limit lower absolute value
+    np.sqrt(G, out=H)  # vrel
+
+    E *= B
+    F *= C
+    E += F
+    np.negative(E, out=E)
+    E /= G
+    E[diag] += 1e9  # tcpa
+
+    # Calculate distance^2 at CPA (minimum distance^2)
+    np.multiply(A, A, out=B)
+    np.multiply(E, E, out=C)
+    C *= G
+    B -= C
+    np.abs(B, out=B)  # dcpa2
+
+    # RPZ can differ per aircraft, get the largest value per aircraft pair
+    np.maximum(rpz, rpz[rows, None], out=C)
+    np.multiply(C, C, out=G)  # R2
+    np.less(B, G, out=S)  # swhorconf
+
+    # Calculate times of entering and leaving horizontal conflict
+    np.subtract(G, B, out=F)
+    np.maximum(0., F, out=F)
+    np.sqrt(F, out=F)  # half the distance travelled inzide zone
+    F /= H  # dtinhor
+
+    np.logical_not(S, out=T)
+    np.subtract(E, F, out=G)
+    np.copyto(G, 1e8, where=T)  # tinhor, set very large if no conf
+    F += E
+    np.copyto(F, -1e8, where=T)  # touthor, set very large if no conf
+
+    # Vertical conflict --------------------------------------------------------
+    np.subtract(ownship.alt, intruder.alt[rows, None], out=H)
+    H[diag] += 1e9  # dalt
+    np.subtract(ownship.vs, intruder.vs[rows, None], out=I)
+    np.abs(I, out=J)
+    np.less(J, 1e-6, out=T)
+    np.copyto(I, 1e-6, where=T)  # dvs, prevent division by zero
+    np.negative(I, out=I)
+
+    # hPZ can differ per aircraft, get the largest value per aircraft pair
+    np.maximum(hpz, hpz[rows, None], out=J)
+
+    # LoS pairs
+    np.less(A, C, out=T)
+    np.abs(H, out=K)
+    np.less(K, J, out=U)
+    T &= U
+    losi, losj = np.nonzero(T)
+
+    np.add(H, J, out=K)
+    K /= I  # tcrosshi
+    np.subtract(H, J, out=L)
+    L /= I  # tcrosslo
+    np.minimum(K, L, out=M)  # tinver
+    np.maximum(K, L, out=K)  # toutver
+
+    # Combine vertical and horizontal conflict----------------------------------
+    np.maximum(M, G, out=M)  # tinconf
+    np.minimum(K, F, out=K)  # toutconf
+
+    np.less_equal(M, K, out=T)
+    S &= T
+    np.greater(K, 0.0, out=T)
+    S &= T
+    np.less(M, dtlookahead[rows, None], out=T)
+    S &= T
+    S[diag] = False  # swconfl
+
+    # Ownship conflict flag and max tCPA
+    inconf = np.any(S, 1)
+    np.multiply(E, S, out=L)
+    tcpamax = np.max(L, 1)
+
+    confi, confj = np.nonzero(S)
+    return confi + r0, confj, losi + r0, losj, inconf, tcpamax, \
+        D[S], A[S], np.sqrt(B[S]), E[S], M[S]
+
+
+def merge_blocks(blockresults):
+    ''' Merge the results of detect_block, given in row order. '''
+    res = [np.concatenate(arrs) for arrs in zip(*blockresults)]
+    confi, confj, losi, losj, inconf, tcpamax, qdr, dist, dcpa, tcpa, tLOS = res
+
+    # Select conflicting pairs: each a/c gets their own record
+    confpairs = np.column_stack((confi, confj)).astype(np.int32)
+    lospairs = np.column_stack((losi, losj)).astype(np.int32)
+
+    return confpairs, lospairs, inconf, tcpamax, qdr, dist, dcpa, tcpa, tLOS
+
+
+def detect_pairs(ownship, intruder, rpz, hpz, dtlookahead, idx, jdx):
+    ''' Narrow phase: evaluate the state-based closest point of approach
+        for the ownship/intruder pairs (idx[k], jdx[k]) only.
+
+        The calculations follow StateBased.detect element by element, so
+        that the results for the evaluated pairs are identical.
+    '''
+    ntraf = ownship.ntraf
+
+    # Horizontal conflict ------------------------------------------------------
+    # qdr and dist for each pair, evaluated in the same order of operations
+    # as geo.kwikqdrdist_matrix
+    lata, lona = ownship.lat[idx], ownship.lon[idx]
+    latb, lonb = intruder.lat[jdx], intruder.lon[jdx]
+    dlat = np.radians(latb - lata)
+    dlon = np.radians(((lonb - lona) + 180) % 360 - 180)
+    cavelat = np.cos(np.radians(latb + lata) * 0.5)
+    dangle = np.sqrt(dlat * dlat + (dlon * dlon) * (cavelat * cavelat))
+    dist = REARTH * dangle / nm * nm
+    qdr = np.degrees(np.arctan2(dlon * cavelat, dlat)) % 360.
+
+    # Calculate horizontal closest point of approach (CPA)
+    qdrrad = np.radians(qdr)
+    dx = dist * np.sin(qdrrad)  # is pos j rel to i
+    dy = dist * np.cos(qdrrad)  # is pos j rel to i
+
+    # Ownship and intruder track angle and speed
+    owntrkrad = np.radians(ownship.trk)
+    ownu = ownship.gs * np.sin(owntrkrad)  # m/s
+    ownv = ownship.gs * np.cos(owntrkrad)  # m/s
+    inttrkrad = np.radians(intruder.trk)
+    intu = intruder.gs * np.sin(inttrkrad)  # m/s
+    intv = intruder.gs * np.cos(inttrkrad)  # m/s
+
+    du = ownu[jdx] - intu[idx]
+    dv = ownv[jdx] - intv[idx]
+
+    dv2 = du * du + dv * dv
+    dv2 = np.where(np.abs(dv2) < 1e-6, 1e-6, dv2)  # limit lower absolute value
+    vrel = np.sqrt(dv2)
+
+    tcpa = -(du * dx + dv * dy) / dv2
+
+    # Calculate distance^2 at CPA (minimum distance^2)
+    dcpa2 = np.abs(dist * dist - tcpa * tcpa * dv2)
+
+    # Check for horizontal conflict
+    # RPZ can differ per aircraft, get the largest value per aircraft pair
+    rpz = np.maximum(rpz[jdx], rpz[idx])
+    R2 = rpz * rpz
+    swhorconf = dcpa2 < R2  # conflict or not
+
+    # Calculate times of entering and leaving horizontal conflict
+    dxinhor = np.sqrt(np.maximum(0., R2 - dcpa2))  # half the distance travelled inzide zone
+    dtinhor = dxinhor / vrel
+
+    tinhor = np.where(swhorconf, tcpa - dtinhor, 1e8)  # Set very large if no conf
+    touthor = np.where(swhorconf, tcpa + dtinhor, -1e8)  # set very large if no conf
+
+    # Vertical conflict --------------------------------------------------------
+    dalt = ownship.alt[jdx] - intruder.alt[idx]
+    dvs = ownship.vs[jdx] - intruder.vs[idx]
+    dvs = np.where(np.abs(dvs) < 1e-6, 1e-6, dvs)  # prevent division by zero
+
+    # hPZ can differ per aircraft, get the largest value per aircraft pair
+    hpz = np.maximum(hpz[jdx], hpz[idx])
+    tcrosshi = (dalt + hpz) / -dvs
+    tcrosslo = (dalt - hpz) / -dvs
+    tinver = np.minimum(tcrosshi, tcrosslo)
+    toutver = np.maximum(tcrosshi, tcrosslo)
+
+    # Combine vertical and horizontal conflict----------------------------------
+    tinconf = np.maximum(tinver, tinhor)
+    toutconf = np.minimum(toutver, touthor)
+
+    swconfl = swhorconf & (tinconf <= toutconf) & (toutconf > 0.0) & \
+        (tinconf < dtlookahead[idx])
+
+    # --------------------------------------------------------------------------
+    # Update conflict lists
+    # --------------------------------------------------------------------------
+    # Ownship conflict flag and max tCPA
+    inconf = np.zeros(ntraf, dtype=bool)
+    inconf[idx[swconfl]] = True
+    tcpamax = np.zeros(ntraf)
+    np.maximum.at(tcpamax, idx[swconfl], tcpa[swconfl])
+
+    # Select conflicting pairs: each a/c gets their own record
+    confpairs = np.column_stack((idx[swconfl], jdx[swconfl])).astype(np.int32)
+    swlos = (dist < rpz) & (np.abs(dalt) < hpz)
+    lospairs = np.column_stack((idx[swlos], jdx[swlos])).astype(np.int32)
+
+    return confpairs, lospairs, inconf, tcpamax, \
+        qdr[swconfl], dist[swconfl], np.sqrt(dcpa2[swconfl]), \
+        tcpa[swconfl], tinconf[swconfl]
+
 
 try:
     from bluesky.traffic.asas import casas
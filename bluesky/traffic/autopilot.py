@@ -1,5 +1,5 @@
 """ Autopilot Implementation."""
-from math import sin, cos, radians, sqrt, atan
+from time import perf_counter_ns
 import numpy as np
 try:
     from collections.abc import Collection
@@ -11,14 +11,19 @@ from bluesky import stack
 from bluesky.tools import geo
 from bluesky.tools.misc import degto180
 from bluesky.tools.position import txt2pos
-from bluesky.tools.aero import ft, nm, fpm, vcasormach2tas, vcas2tas, tas2cas, cas2tas, g0
+from bluesky.tools.aero import ft, nm, fpm, vcasormach2tas, vcas2tas, vtas2cas, g0
 from bluesky.core import Entity, timed_function
+from bluesky.core.simtime import Timer
 from .route import Route
+from .routetable import RouteTable
+from .leggeometry import LegGeometry
 
 #debug
 from inspect import stack as callstack
 
-bs.settings.set_variable_defaults(fms_dt=10.5)
+# fms_guidance_dt: Interval of the full FMS guidance update. With the default
+#                  of 0.0 the guidance is updated every simulation timestep
+bs.settings.set_variable_defaults(fms_guidance_dt=0.0)
 
 
 class Autopilot(Entity, replaceable=True):
@@ -29,6 +34,12 @@ class Autopilot(Entity, replaceable=True):
         # Standard self.steepness for descent
         self.steepness = 3000. * ft / (10. * nm)
 
+        # Waypoint table with the routes of all aircraft
+        self.routetable = RouteTable()
+
+        # Timer of the full FMS update (waypoint passing and guidance of all aircraft)
+        self.fmstimer = Timer.maketimer('fms', bs.settings.fms_guidance_dt)
+
         # From here, define object arrays
         with self.settrafarrays():
 
@@ -58,6 +69,15 @@ class Autopilot(Entity, replaceable=True):
             self.dist2turn   = np.array([]) # Distance to next turn [m]
 
             self.inturn = np.array([]) # If we're in a turn maneuver or not
+
+            # [s] Simulation time from which the aircraft could reach its active waypoint,
+            # and is therefore checked every step in between full FMS updates
+            self.twpcheck = np.array([])
+
+            # Cached bearing and distance to the active waypoint (used when
+            # the legcache setting is switched on)
+            self.leg = LegGeometry()
+
              # Traffic navigation information
             self.orig = []  # Four letter code of origin airport
             self.dest = []  # Four letter code of destination airport
@@ -69,8 +89,9 @@ class Autopilot(Entity, replaceable=True):
             # Currently used roll/bank angle [rad]
             self.turnphi = np.array([])  # [rad] bank angle setting of autopilot
 
-            # Route objects
+            # Route objects, and their id in the route table
             self.route = []
+            self.routeid = np.array([], dtype=int)
 
 
         self.idxreached = []    # List indices of aircraft who have reached their active waypoint
@@ -100,182 +121,235 @@ class Autopilot(Entity, replaceable=True):
 
         # Route objects
         for ridx, acid in enumerate(bs.traf.id[-n:]):
-            self.route[ridx - n] = Route(acid)
+            self.route[ridx - n] = Route(acid, self.routetable)
+            self.routeid[ridx - n] = self.route[ridx - n].rid
 
         # Default ToC/ToD logic on
         self.swtoc[-n:] = True
         self.swtod[-n:] = True
 
-    #no longer timed @timed_function(name='fms', dt=bs.settings.fms_dt, manual=True)
-    def update_fms(self, qdr, dist):
+    def delete(self, idx):
+        # Release the route table rows of the deleted aircraft
+        self.routetable.delroute(self.routeid[idx])
+        super().delete(idx)
+
+    def reset(self):
+        super().reset()
+        self.routetable.reset()
+
+    def update_fms(self, qdr, dist, icheck=None):
         """
         Waypoint switching function:
         - Check which aircraft i have reached their active waypoint
         - Reached function return list of indices where reached logic is True
         - Shift waypoint (last,next etc.) data for aircraft i where necessary
         - Compute VNAV profile for this new leg
+        All aircraft that reached their active waypoint are switched at once,
+        using array operations on the route table.
+        In between full FMS updates only the aircraft with indices icheck are
+        checked, and the RTA speed guidance is skipped.
         """
         # List of indices of aircraft which have reached their active waypoint
         self.idxreached = bs.traf.actwp.Reached(qdr, dist, bs.traf.actwp.flyby,
-                                       bs.traf.actwp.flyturn,bs.traf.actwp.turnrad,bs.traf.actwp.swlastwp)
-        for i in self.idxreached:
-
+                                       bs.traf.actwp.flyturn,bs.traf.actwp.turnrad,bs.traf.actwp.swlastwp,
+                                       icheck)
+        idx = self.idxreached
+        if len(idx) > 0:
             # Save current wp speed for use on next leg when we pass this waypoint
             # VNAV speeds are always FROM-speeds, so we accelerate/decellerate at the waypoint
             # where this speed is specified, so we need to save it for use now
             # before getting the new data for the next waypoint
 
             # Get speed for next leg from the waypoint we pass now
-            bs.traf.actwp.spd[i]    = bs.traf.actwp.nextspd[i]
-            bs.traf.actwp.spdcon[i] = bs.traf.actwp.nextspd[i]
-
-            # Execute stack commands for the still active waypoint, which we pass
-            self.route[i].runactwpstack()
+            bs.traf.actwp.spd[idx]    = bs.traf.actwp.nextspd[idx]
+            bs.traf.actwp.spdcon[idx] = bs.traf.actwp.nextspd[idx]
 
             # If specified, use the given turn radius of passing wp for bank angle
-            if bs.traf.actwp.flyturn[i]:
-                if bs.traf.actwp.turnspd[i]>=0.:
-                    turnspd = bs.traf.actwp.turnspd[i]
-                else:
-                    turnspd = bs.traf.tas[i]
-
-                if bs.traf.actwp.turnrad[i] > 0.:
-                    self.turnphi[i] = atan(turnspd*turnspd/(bs.traf.actwp.turnrad[i]*nm*g0)) # [rad]
-                else:
-                    self.turnphi[i] = 0.0  # [rad] or leave untouched???
-
-            else:
-                self.turnphi[i] = 0.0  #[rad] or leave untouched???
-
-            # Get next wp, if there still is one
-            if not bs.traf.actwp.swlastwp[i]:
-                lat, lon, alt, bs.traf.actwp.nextspd[i], \
-                bs.traf.actwp.xtoalt[i], toalt, \
-                    bs.traf.actwp.xtorta[i], bs.traf.actwp.torta[i], \
-                    lnavon, flyby, flyturn, turnrad, turnspd,\
-                    bs.traf.actwp.next_qdr[i], bs.traf.actwp.swlastwp[i] =      \
-                    self.route[i].getnextwp()  # [m] note: xtoalt,nextaltco are in meters
-
-                bs.traf.actwp.nextturnlat[i], bs.traf.actwp.nextturnlon[i], \
-                bs.traf.actwp.nextturnspd[i], bs.traf.actwp.nextturnrad[i], \
-                bs.traf.actwp.nextturnidx[i] = self.route[i].getnextturnwp()
+            turnspd = np.where(bs.traf.actwp.turnspd[idx] >= 0., bs.traf.actwp.turnspd[idx],
+                               bs.traf.tas[idx])
+            turnrad = bs.traf.actwp.turnrad[idx]
+            useturnrad = np.logical_and(bs.traf.actwp.flyturn[idx], turnrad > 0.)
+            self.turnphi[idx] = np.where(useturnrad,
+                np.arctan(turnspd * turnspd / (np.where(useturnrad, turnrad, 1.) * nm * g0)),
+                0.0)  # [rad] or leave untouched???
+
+            # Execute stack commands for the still active waypoint, which we pass,
+            # per aircraft, and keep aircraft that landed on the runway
+            lastwp = bs.traf.actwp.swlastwp[idx]
+            landed = self.routetable.landed[self.routeid[idx]] & ~lastwp
+            for i, keeprunway in zip(idx, landed):
+                self.route[i].runactwpstack()
+                if keeprunway:
+                    self.route[i].keeprunway()
 
             # Prevent trying to activate the next waypoint when it was already the last waypoint
-            else:
-                bs.traf.swlnav[i] = False
-                bs.traf.swvnav[i] = False
-                bs.traf.swvnavspd[i] = False
-                continue # Go to next a/c which reached its active waypoint
+            ilast = idx[lastwp]
+            bs.traf.swlnav[ilast] = False
+            bs.traf.swvnav[ilast] = False
+            bs.traf.swvnavspd[ilast] = False
+
+            # Get next wp for the other aircraft
+            idx = idx[~lastwp]
+            rid = self.routeid[idx]
+            tbl = self.routetable
+            row, lnavon, bs.traf.actwp.next_qdr[idx], bs.traf.actwp.swlastwp[idx] = \
+                Route.getnextwps(tbl, rid)
+
+            alt   = tbl.alt[row]    # [m] note: xtoalt,nextaltco are in meters
+            toalt = tbl.toalt[row]
+            bs.traf.actwp.nextspd[idx] = tbl.spd[row]
+            bs.traf.actwp.xtoalt[idx]  = tbl.xtoalt[row]
+            bs.traf.actwp.xtorta[idx]  = tbl.xtorta[row]
+            bs.traf.actwp.torta[idx]   = tbl.torta[row]
+            flyturn = tbl.flyturn[row]
+            turnrad = tbl.turnrad[row]
+
+            # Next turn waypoint, if any
+            iturn = tbl.findnext('flyturn', rid, tbl.iactwp[rid])
+            hasturn = iturn >= 0
+            turnrow = tbl.start[rid] + iturn
+            bs.traf.actwp.nextturnlat[idx] = np.where(hasturn, tbl.lat[turnrow], 0.)
+            bs.traf.actwp.nextturnlon[idx] = np.where(hasturn, tbl.lon[turnrow], 0.)
+            bs.traf.actwp.nextturnspd[idx] = np.where(hasturn, tbl.turnspd[turnrow], -999.)
+            bs.traf.actwp.nextturnrad[idx] = np.where(hasturn, tbl.turnrad[turnrow], -999.)
+            bs.traf.actwp.nextturnidx[idx] = np.where(hasturn, iturn, -999.)
 
             # End of route/no more waypoints: switch off LNAV using the lnavon
-            # switch returned by getnextwp
-            if not lnavon and bs.traf.swlnav[i]:
-                bs.traf.swlnav[i] = False
-                # Last wp: copy last wp values for alt and speed in autopilot
-                if bs.traf.swvnavspd[i] and bs.traf.actwp.nextspd[i]>= 0.0:
-                    bs.traf.selspd[i] = bs.traf.actwp.nextspd[i]
+            # switch returned by getnextwps
+            iend = idx[~lnavon & bs.traf.swlnav[idx]]
+            bs.traf.swlnav[iend] = False
+            # Last wp: copy last wp values for alt and speed in autopilot
+            iend = iend[bs.traf.swvnavspd[iend] * (bs.traf.actwp.nextspd[iend] >= 0.0)]
+            bs.traf.selspd[iend] = bs.traf.actwp.nextspd[iend]
 
             # In case of no LNAV, do not allow VNAV mode on its own
-            bs.traf.swvnav[i] = bs.traf.swvnav[i] and bs.traf.swlnav[i]
+            bs.traf.swvnav[idx] = bs.traf.swvnav[idx] * bs.traf.swlnav[idx]
 
-            bs.traf.actwp.lat[i] = lat  # [deg]
-            bs.traf.actwp.lon[i] = lon  # [deg]
+            bs.traf.actwp.lat[idx] = tbl.lat[row]  # [deg]
+            bs.traf.actwp.lon[idx] = tbl.lon[row]  # [deg]
             # 1.0 in case of fly by, else fly over
-            bs.traf.actwp.flyby[i] = int(flyby)
+            bs.traf.actwp.flyby[idx] = tbl.flyby[row]
 
             # Update qdr and turndist for this new waypoint for ComputeVNAV
-            qdr[i], distnmi = geo.qdrdist(bs.traf.lat[i], bs.traf.lon[i],
-                                          bs.traf.actwp.lat[i], bs.traf.actwp.lon[i])
+            qdr[idx], distnmi = geo.qdrdist(bs.traf.lat[idx], bs.traf.lon[idx],
+                                            bs.traf.actwp.lat[idx], bs.traf.actwp.lon[idx])
 
-            #dist[i] = distnmi * nm
-            self.dist2wp[i] = distnmi*nm
+            self.dist2wp[idx] = distnmi*nm
 
-            bs.traf.actwp.curlegdir[i] = qdr[i]
-            bs.traf.actwp.curleglen[i] = self.dist2wp[i]
+            bs.traf.actwp.curlegdir[idx] = qdr[idx]
+            bs.traf.actwp.curleglen[idx] = self.dist2wp[idx]
 
             # User has entered an altitude for this waypoint
-            if alt >= -0.01: # positive alt on this waypoint means altitude constraint
-                bs.traf.actwp.nextaltco[i] = alt  # [m]
-                bs.traf.actwp.xtoalt[i] = 0.0
-            else:
-                bs.traf.actwp.nextaltco[i] = toalt  # [m]
-
-            #if not bs.traf.swlnav[i]:
-            #    bs.traf.actwp.spd[i] = -997.
+            # positive alt on this waypoint means altitude constraint
+            altco = alt >= -0.01
+            bs.traf.actwp.nextaltco[idx] = np.where(altco, alt, toalt)  # [m]
+            bs.traf.actwp.xtoalt[idx] = np.where(altco, 0.0, bs.traf.actwp.xtoalt[idx])
 
             # VNAV spd mode: use speed of this waypoint as commanded speed
             # while passing waypoint and save next speed for passing next wp
             # Speed is now from speed! Next speed is ready in wpdata
-            if bs.traf.swvnavspd[i] and bs.traf.actwp.spd[i]>= 0.0:
-                    bs.traf.selspd[i] = bs.traf.actwp.spd[i]
+            ispd = idx[bs.traf.swvnavspd[idx] * (bs.traf.actwp.spd[idx] >= 0.0)]
+            bs.traf.selspd[ispd] = bs.traf.actwp.spd[ispd]
 
             # Update turndist so ComputeVNAV works, is there a next leg direction or not?
-            if bs.traf.actwp.next_qdr[i] < -900.:
-                local_next_qdr = qdr[i]
-            else:
-                local_next_qdr = bs.traf.actwp.next_qdr[i]
+            local_next_qdr = np.where(bs.traf.actwp.next_qdr[idx] < -900., qdr[idx],
+                                      bs.traf.actwp.next_qdr[idx])
 
             # Get flyturn switches and data
-            bs.traf.actwp.flyturn[i]     = flyturn
-            bs.traf.actwp.turnrad[i]     = turnrad
+            bs.traf.actwp.flyturn[idx]     = flyturn
+            bs.traf.actwp.turnrad[idx]     = turnrad
 
             # Pass on whether currently flyturn mode:
             # at beginning of leg,c copy tonextwp to lastwp
             # set next turn False
-            bs.traf.actwp.turnfromlastwp[i] = bs.traf.actwp.turntonextwp[i]
-            bs.traf.actwp.turntonextwp[i]   = False
+            bs.traf.actwp.turnfromlastwp[idx] = bs.traf.actwp.turntonextwp[idx]
+            bs.traf.actwp.turntonextwp[idx]   = False
 
             # Keep both turning speeds: turn to leg and turn from leg
-            bs.traf.actwp.oldturnspd[i]  = bs.traf.actwp.turnspd[i] # old turnspd, turning by this waypoint
-            if bs.traf.actwp.flyturn[i]:
-                bs.traf.actwp.turnspd[i] = turnspd                  # new turnspd, turning by next waypoint
-            else:
-                bs.traf.actwp.turnspd[i] = -990.
+            bs.traf.actwp.oldturnspd[idx]  = bs.traf.actwp.turnspd[idx] # old turnspd, turning by this waypoint
+            # new turnspd, turning by next waypoint
+            bs.traf.actwp.turnspd[idx] = np.where(flyturn, tbl.turnspd[row], -990.)
 
-            # Calculate turn dist (and radius which we do not use) now for scalar variable [i]
-            bs.traf.actwp.turndist[i], dummy = \
-                bs.traf.actwp.calcturn(bs.traf.tas[i], self.bankdef[i],
-                                        qdr[i], local_next_qdr,turnrad)  # update turn distance for VNAV
+            # Calculate turn dist (and radius which we do not use) now for the new legs
+            bs.traf.actwp.turndist[idx], dummy = \
+                bs.traf.actwp.calcturn(bs.traf.tas[idx], self.bankdef[idx],
+                                        qdr[idx], local_next_qdr, turnrad)  # update turn distance for VNAV
 
             # Reduce turn dist for reduced turnspd
-            if bs.traf.actwp.flyturn[i] and bs.traf.actwp.turnrad[i]<0.0 and bs.traf.actwp.turnspd[i]>=0.:
-                turntas = cas2tas(bs.traf.actwp.turnspd[i], bs.traf.alt[i])
-                bs.traf.actwp.turndist[i] = bs.traf.actwp.turndist[i]*turntas*turntas/(bs.traf.tas[i]*bs.traf.tas[i])
+            ired = idx[flyturn * (turnrad < 0.0) * (bs.traf.actwp.turnspd[idx] >= 0.)]
+            turntas = vcas2tas(bs.traf.actwp.turnspd[ired], bs.traf.alt[ired])
+            bs.traf.actwp.turndist[ired] *= turntas*turntas/(bs.traf.tas[ired]*bs.traf.tas[ired])
 
             # VNAV = FMS ALT/SPD mode incl. RTA
-            self.ComputeVNAV(i, toalt, bs.traf.actwp.xtoalt[i], bs.traf.actwp.torta[i],
-                             bs.traf.actwp.xtorta[i])
-
-        
+            self.ComputeVNAV(idx, toalt, bs.traf.actwp.xtoalt[idx], bs.traf.actwp.torta[idx],
+                             bs.traf.actwp.xtorta[idx])
 
         # End of per waypoint i switching loop
         # Update qdr2wp with up-to-date qdr, now that we have checked passing wp
+        if icheck is not None:
+            self.qdr2wp[icheck] = qdr[icheck]%360.
+            return
         self.qdr2wp = qdr%360.
 
         # Continuous guidance when speed constraint on active leg is in update-method
 
         # If still an RTA in the route and currently no speed constraint
-        for iac in np.where((bs.traf.actwp.torta > -99.)*(bs.traf.actwp.spdcon<0.0))[0]:
-            iwp = bs.traf.ap.route[iac].iactwp
-            if bs.traf.ap.route[iac].wprta[iwp]>-99.:
+        iac = np.where((bs.traf.actwp.torta > -99.)*(bs.traf.actwp.spdcon<0.0))[0]
+        if len(iac) > 0:
+            # Only for a/c flying to an RTA waypoint
+            rid = self.routeid[iac]
+            iwp = self.routetable.iactwp[rid]
+            row = self.routetable.start[rid] + np.where(iwp < 0, iwp + self.routetable.nwp[rid], iwp)
+            rtawp = self.routetable.rta[row] > -99.
+            iac, row = iac[rtawp], row[rtawp]
+
+            # For all a/c flying to an RTA waypoint, recalculate speed more often
+            dist2go4rta = geo.kwikdist(bs.traf.lat[iac],bs.traf.lon[iac],
+                                       bs.traf.actwp.lat[iac],bs.traf.actwp.lon[iac])*nm \
+                           + self.routetable.xtorta[row] # last term zero for active wp rta
+
+            # Set bs.traf.actwp.spd to rta speed, if necessary
+            self.setspeedforRTA(iac,bs.traf.actwp.torta[iac],dist2go4rta)
+
+            # If VNAV speed is on (by default coupled to VNAV), use it for speed guidance
+            iac = iac[bs.traf.swvnavspd[iac] * (bs.traf.actwp.spd[iac]>=0.0)]
+            bs.traf.selspd[iac] = bs.traf.actwp.spd[iac]
 
-                 # For all a/c flying to an RTA waypoint, recalculate speed more often
-                dist2go4rta = geo.kwikdist(bs.traf.lat[iac],bs.traf.lon[iac],
-                                           bs.traf.actwp.lat[iac],bs.traf.actwp.lon[iac])*nm \
-                               + bs.traf.ap.route[iac].wpxtorta[iwp] # last term zero for active wp rta
+    def update(self):
+        # Full FMS update with guidance of all aircraft every fms_guidance_dt, and in
+        # between only a waypoint passing check of aircraft that are close
+        # to their active waypoint
+        if self.fmstimer.readynext():
+            tstart = perf_counter_ns()
+            self.update_guidance()
+            self.fmstimer.record(tstart)
+        else:
+            self.update_wpcheck()
 
-                # Set bs.traf.actwp.spd to rta speed, if necessary
-                self.setspeedforRTA(iac,bs.traf.actwp.torta[iac],dist2go4rta)
+    def update_wpcheck(self):
+        ''' Waypoint passing check in between full FMS updates, for the
+            aircraft that could have reached their active waypoint. '''
+        icheck = np.flatnonzero(self.twpcheck <= bs.sim.simt)
+        if len(icheck) == 0:
+            return
+        qdr, distinnm = geo.qdrdist(bs.traf.lat[icheck], bs.traf.lon[icheck],
+                                    bs.traf.actwp.lat[icheck], bs.traf.actwp.lon[icheck])
+        self.qdr2wp[icheck]  = qdr
+        self.dist2wp[icheck] = distinnm*nm
+        self.update_fms(self.qdr2wp, self.dist2wp, icheck)
 
-                # If VNAV speed is on (by default coupled to VNAV), use it for speed guidance
-                if bs.traf.swvnavspd[iac] and bs.traf.actwp.spd[iac]>=0.0:
-                     bs.traf.selspd[iac] = bs.traf.actwp.spd[iac]
+        # Keep the LNAV track of these aircraft up to date
+        self.trk[icheck] = np.where(bs.traf.swlnav[icheck], self.qdr2wp[icheck], self.trk[icheck])
 
-    def update(self):
+    def update_guidance(self):
         # FMS LNAV mode:
         # qdr[deg],distinnm[nm]
-        qdr, distinnm = geo.qdrdist(bs.traf.lat, bs.traf.lon,
-                                    bs.traf.actwp.lat, bs.traf.actwp.lon)  # [deg][nm])
+        if bs.settings.legcache:
+            qdr, distinnm = self.leg.qdrdist(bs.traf.lat, bs.traf.lon,
+                                             bs.traf.actwp.lat, bs.traf.actwp.lon)  # [deg][nm]
+        else:
+            qdr, distinnm = geo.qdrdist(bs.traf.lat, bs.traf.lon,
+                                        bs.traf.actwp.lat, bs.traf.actwp.lon)  # [deg][nm])
 
         self.qdr2wp  = qdr
         self.dist2wp = distinnm*nm  # Conversion to meters
@@ -424,6 +498,27 @@ class Autopilot(Entity, replaceable=True):
         # Below crossover altitude: CAS=const, above crossover altitude: Mach = const
         self.tas = vcasormach2tas(bs.traf.selspd, bs.traf.alt)
 
+        # Predict from when on each aircraft could reach its active waypoint
+        self.twpcheck = bs.sim.simt + self.timetoreach()
+
+    def timetoreach(self):
+        ''' Lower bound of the time [s] it takes each aircraft to reach its
+            active waypoint, based on the criteria of ActiveWaypoint.Reached. '''
+        # Upper bound of the closing speed, with a margin for acceleration and wind
+        vmax = 1.2 * np.maximum(bs.traf.gs, bs.traf.tas) + 10.
+
+        # Reached within the turn distance, or when flying away within 4 s of the waypoint
+        reachdist = 1.5 * np.maximum(bs.traf.actwp.turndist, 4. * vmax)
+        treach = (self.dist2wp - reachdist) / vmax
+
+        # The last waypoint is also reached when flying away from it, which
+        # is limited by the turn rate and the rate of change of the bearing
+        trkdiff = np.abs(degto180(bs.traf.trk - self.qdr2wp))
+        rate = np.degrees(g0 * np.tan(np.maximum(self.bankdef, self.turnphi)) /
+                          np.maximum(bs.traf.tas, 1.) + vmax / np.maximum(self.dist2wp, 1.))
+        taway = (90. - trkdiff) / (1.5 * rate)
+        return np.where(bs.traf.actwp.swlastwp, np.minimum(treach, taway), treach)
+
     def ComputeVNAV(self, idx, toalt, xtoalt, torta, xtorta):
         """
         This function to do VNAV (and RTA) calculations is only called only once per leg.
@@ -451,20 +546,24 @@ class Autopilot(Entity, replaceable=True):
         Output if this function:
         self.dist2vs = distance 2 next waypoint where climb/descent needs to activated
         bs.traf.actwp.vs =  V/S to be used during climb/descent part, so when dist2wp<dist2vs [m] (to next waypoint)
+
+        idx can be a single aircraft index, or an array of indices with the
+        other arguments given per aircraft, to prepare the legs of many
+        aircraft at once.
         """
 
-        #print ("ComputeVNAV for",bs.traf.id[idx],":",toalt/ft,"ft  ",xtoalt/nm,"nm")
-        #print("Called by",callstack()[1].function)
+        idx = np.atleast_1d(idx)
+        toalt, xtoalt, torta, xtorta = (np.broadcast_to(v, idx.shape)
+                                        for v in (toalt, xtoalt, torta, xtorta))
 
         # Check  whether active waypoint speed needs to be adjusted for RTA
         # sets bs.traf.actwp.spd, if necessary
-        # debug print("xtorta+legdist =",(xtorta+legdist)/nm)
-        self.setspeedforRTA(idx, torta, xtorta + self.dist2wp[idx])  # all scalar
+        self.setspeedforRTA(idx, torta, xtorta + self.dist2wp[idx])
 
-        # Check if there is a target altitude and VNAV is on, else return doing nothing
-        if toalt < 0 or not bs.traf.swvnav[idx]:
-            self.dist2vs[idx] = -999999. #dist to next wp will never be less than this, so VNAV will do nothing
-            return
+        # Check if there is a target altitude and VNAV is on, else do nothing
+        vnav = np.logical_and(toalt >= 0, bs.traf.swvnav[idx])
+        self.dist2vs[idx[~vnav]] = -999999. #dist to next wp will never be less than this, so VNAV will do nothing
+        idx, toalt, xtoalt = idx[vnav], toalt[vnav], xtoalt[vnav]
 
         # So: somewhere there is an altitude constraint ahead
         # Compute proper values for bs.traf.actwp.nextaltco, self.dist2vs, self.alt, bs.traf.actwp.vs
@@ -502,119 +601,106 @@ class Autopilot(Entity, replaceable=True):
         # - Descend at the latest when necessary for next altitude constraint
         #   which can be many waypoints beyond current actual waypoint
         epsalt = 2.*ft # deadzone
-        if bs.traf.alt[idx] > toalt + epsalt:
-            # Stop potential current climb (e.g. due to not making it to previous altco)
-            # then stop immediately, as in: do not make it worse.
-            if bs.traf.vs[idx]>0.0001:
-                self.vnavvs[idx] = 0.0
-                self.alt[idx] = bs.traf.alt[idx]
-                if bs.traf.swvnav[idx]:
-                    bs.traf.selalt[idx] = bs.traf.alt[idx]
-
-            # Descent modes: VNAV (= swtod/Top of Descent logic) or aiming at next alt constraint
-
-            # Calculate max allowed altitude at next wp (above toalt)
-            bs.traf.actwp.nextaltco[idx] = toalt  # [m] next alt constraint
-            bs.traf.actwp.xtoalt[idx]    = xtoalt # [m] distance to next alt constraint measured from next waypoint
-
-
-            # VNAV ToD logic
-            if self.swtod[idx]:
-                # Get distance to waypoint
-                self.dist2wp[idx] = nm*geo.kwikdist(bs.traf.lat[idx], bs.traf.lon[idx],
-                                                 bs.traf.actwp.lat[idx],
-                                                 bs.traf.actwp.lon[idx])  # was not always up to date, so update first
-
-                # Distance to next waypoint where we need to start descent (top of descent) [m]
-                descdist = abs(bs.traf.alt[idx] - toalt) / self.steepness  # [m] required length for descent
-                self.dist2vs[idx] = descdist - xtoalt   # [m] part of that length on this leg
-
-                #print(bs.traf.id[idx],"traf.alt =",bs.traf.alt[idx]/ft,"ft toalt = ",toalt/ft,"ft descdist =",descdist/nm,"nm")
-                #print ("d2wp = ",self.dist2wp[idx]/nm,"nm d2vs = ",self.dist2vs[idx]/nm,"nm")
-                #print("xtoalt =",xtoalt/nm,"nm descdist =",descdist/nm,"nm")
-
-                # Exceptions: Descend now? Or never on this leg?
-                if self.dist2wp[idx] < self.dist2vs[idx]:  # Urgent descent, we're late![m]
-                    # Descend now using whole remaining distance on leg to reach altitude
-                    self.alt[idx] = bs.traf.actwp.nextaltco[idx]  # dial in altitude of next waypoint as calculated
-                    t2go = self.dist2wp[idx]/max(0.01,bs.traf.gs[idx])
-                    bs.traf.actwp.vs[idx] = (bs.traf.alt[idx]-toalt)/max(0.01,t2go)
-
-                elif xtoalt<descdist: # Not even descending is needed at next waypoint
-                    # Top of decent needs to be on this leg, as next wp is in descent
-                    bs.traf.actwp.vs[idx] = -abs(self.steepness) * (bs.traf.gs[idx] +
-                                                                    (bs.traf.gs[idx] < 0.2 * bs.traf.tas[idx]) *
-                                                                    bs.traf.tas[idx])
+        alt = bs.traf.alt[idx]
+        gs  = bs.traf.gs[idx]
+        tas = bs.traf.tas[idx]
+        descent = alt > toalt + epsalt
+        climb   = np.logical_and(~descent, alt < toalt - 10. * ft)
+        level   = np.logical_and(~descent, ~climb)
+
+        # Stop potential current climb when we need to descend, or current descent
+        # when we need to climb (e.g. due to not making it to previous altco),
+        # then stop immediately, as in: do not make it worse.
+        stop = np.logical_or(descent * (bs.traf.vs[idx] > 0.0001),
+                             climb * (bs.traf.vs[idx] < -0.0001))
+        istop = idx[stop]
+        self.vnavvs[istop] = 0.0
+        self.alt[istop] = bs.traf.alt[istop]
+        bs.traf.selalt[istop] = bs.traf.alt[istop]
+
+        # Descent and climb: next alt constraint in our route (could be further down the route)
+        ichg = idx[~level]
+        bs.traf.actwp.nextaltco[ichg] = toalt[~level]  # [m] next alt constraint
+        bs.traf.actwp.xtoalt[ichg]    = xtoalt[~level] # [m] distance to next alt constraint measured from next waypoint
+
+        # Descent modes: VNAV (= swtod/Top of Descent logic) or aiming at next alt constraint
+        # VNAV ToD logic
+        tod = np.logical_and(descent, self.swtod[idx])
+        i = idx[tod]
+        # Get distance to waypoint
+        self.dist2wp[i] = nm*geo.kwikdist(bs.traf.lat[i], bs.traf.lon[i],
+                                          bs.traf.actwp.lat[i],
+                                          bs.traf.actwp.lon[i])  # was not always up to date, so update first
+
+        # Distance to next waypoint where we need to start descent (top of descent) [m]
+        descdist = np.abs(alt[tod] - toalt[tod]) / self.steepness  # [m] required length for descent
+        self.dist2vs[i] = descdist - xtoalt[tod]   # [m] part of that length on this leg
+
+        # Exceptions: Descend now? Or never on this leg?
+        # Urgent descent, we're late: descend now using whole remaining distance on leg to reach altitude
+        late = self.dist2wp[i] < self.dist2vs[i]  # [m]
+        self.alt[i[late]] = bs.traf.actwp.nextaltco[i[late]]  # dial in altitude of next waypoint as calculated
+        t2go = self.dist2wp[i] / np.maximum(0.01, gs[tod])
+
+        # Not even descending is needed at next waypoint: top of decent needs to be on this leg,
+        # as next wp is in descent, else still level
+        bs.traf.actwp.vs[i] = np.where(late, (alt[tod] - toalt[tod]) / np.maximum(0.01, t2go),
+                                       np.where(xtoalt[tod] < descdist,
+                                                -abs(self.steepness) * (gs[tod] + (gs[tod] < 0.2 * tas[tod]) * tas[tod]),
+                                                0.0))
+
+        # We are higher but swtod = False, so there is no ToD descent logic, simply aim at next altco
+        notod = np.logical_and(descent, np.logical_not(self.swtod[idx]))
+        i = idx[notod]
+        steepness = (alt[notod] - bs.traf.actwp.nextaltco[i]) / np.maximum(0.01, self.dist2wp[i] + xtoalt[notod])
+        bs.traf.actwp.vs[i] = -np.abs(steepness) * (gs[notod] + (gs[notod] < 0.2 * tas[notod]) * tas[notod])
 
-                else:
-                    # else still level
-                    bs.traf.actwp.vs[idx] = 0.0
-
-            else:
-                # We are higher but swtod = False, so there is no ToD descent logic, simply aim at next altco
-                steepness = (bs.traf.alt[idx]-bs.traf.actwp.nextaltco[idx])/(max(0.01,self.dist2wp[idx]+xtoalt))
-                bs.traf.actwp.vs[idx] = -abs(steepness) * (bs.traf.gs[idx] +
-                                                           (bs.traf.gs[idx] < 0.2 * bs.traf.tas[idx]) * bs.traf.tas[
-                                                               idx])
         # VNAV climb mode: climb as soon as possible (T/C logic)
-        elif bs.traf.alt[idx] < toalt - 10. * ft:
-            # Stop potential current descent (e.g. due to not making it to previous altco)
-            # then stop immediately, as in: do not make it worse.
-            if bs.traf.vs[idx] < -0.0001:
-                self.vnavvs[idx] = 0.0
-                self.alt[idx] = bs.traf.alt[idx]
-                if bs.traf.swvnav[idx]:
-                    bs.traf.selalt[idx] = bs.traf.alt[idx]
-
-            # Altitude we want to climb to: next alt constraint in our route (could be further down the route)
-            bs.traf.actwp.nextaltco[idx] = toalt   # [m]
-            bs.traf.actwp.xtoalt[idx]    = xtoalt  # [m] distance to next alt constraint measured from next waypoint
-            self.alt[idx]          = bs.traf.actwp.nextaltco[idx]  # dial in altitude of next waypoint as calculated
-            self.dist2vs[idx]      = 99999. #[m] Forces immediate climb as current distance to next wp will be less
-
-
-            t2go = max(0.1, self.dist2wp[idx]+xtoalt) / max(0.01, bs.traf.gs[idx])
-            if self.swtoc[idx]:
-                steepness = self.steepness # default steepness
-            else:
-                steepness = (bs.traf.alt[idx] - bs.traf.actwp.nextaltco[idx]) / (max(0.01, self.dist2wp[idx] + xtoalt))
+        i = idx[climb]
+        self.alt[i]     = bs.traf.actwp.nextaltco[i]  # dial in altitude of next waypoint as calculated
+        self.dist2vs[i] = 99999. #[m] Forces immediate climb as current distance to next wp will be less
 
-            bs.traf.actwp.vs[idx]  = np.maximum(steepness*bs.traf.gs[idx],
-                                       (bs.traf.actwp.nextaltco[idx] - bs.traf.alt[idx]) / t2go) # [m/s]
-        # Level leg: never start V/S
-        else:
-            self.dist2vs[idx] = -999.  # [m]
+        t2go = np.maximum(0.1, self.dist2wp[i] + xtoalt[climb]) / np.maximum(0.01, gs[climb])
+        steepness = np.where(self.swtoc[i], self.steepness, # default steepness
+                             (alt[climb] - bs.traf.actwp.nextaltco[i]) / np.maximum(0.01, self.dist2wp[i] + xtoalt[climb]))
 
-        return
+        bs.traf.actwp.vs[i] = np.maximum(steepness * gs[climb],
+                                         (bs.traf.actwp.nextaltco[i] - alt[climb]) / t2go) # [m/s]
+
+        # Level leg: never start V/S
+        self.dist2vs[idx[level]] = -999.  # [m]
 
     def setspeedforRTA(self, idx, torta, xtorta):
-        #debug print("setspeedforRTA called, torta,xtorta =",torta,xtorta/nm)
+        """ Calculate required CAS to meet RTA for aircraft idx (index or array
+            of indices), and use it as active waypoint speed when there is no
+            speed constraint and VNAV speed is on.
+            Returns the RTA CAS per aircraft, negative when there is no RTA
+            defined in remainder of route, or when it can no longer be met. """
+        idx = np.atleast_1d(idx)
+        rtacas = np.full(len(idx), -999.)
+
+        # torta -999 signals there is no RTA defined in remainder of route
+        deltime = torta - bs.sim.simt # Remaining time to next RTA [s] in simtime
+        valid = (torta >= -90.) * (deltime > 0) # Still possible?
+        i = idx[valid]
+        if len(i) == 0:
+            return rtacas
 
-        # Calculate required CAS to meet RTA
-        # for aircraft nr. idx (scalar)
-        if torta < -90. : # -999 signals there is no RTA defined in remainder of route
-            return False
+        gsrta = calcvrta(bs.traf.gs[i], np.broadcast_to(xtorta, idx.shape)[valid],
+                         deltime[valid], bs.traf.perf.axmax[i])
 
-        deltime = torta-bs.sim.simt # Remaining time to next RTA [s] in simtime
-        if deltime>0: # Still possible?
-            gsrta = calcvrta(bs.traf.gs[idx], xtorta,
-                             deltime, bs.traf.perf.axmax[idx])
+        # Subtract tail wind speed vector
+        tailwind = (bs.traf.windnorth[i]*bs.traf.gsnorth[i] + bs.traf.windeast[i]*bs.traf.gseast[i]) / \
+                    bs.traf.gs[i]
 
-            # Subtract tail wind speed vector
-            tailwind = (bs.traf.windnorth[idx]*bs.traf.gsnorth[idx] + bs.traf.windeast[idx]*bs.traf.gseast[idx]) / \
-                        bs.traf.gs[idx]
+        # Convert to CAS
+        rtacas[valid] = vtas2cas(gsrta-tailwind,bs.traf.alt[i])
 
-            # Convert to CAS
-            rtacas = tas2cas(gsrta-tailwind,bs.traf.alt[idx])
+        # Performance limits on speed will be applied in traf.update
+        usespd = (bs.traf.actwp.spdcon[i]<0.) * bs.traf.swvnavspd[i]
+        bs.traf.actwp.spd[i[usespd]] = rtacas[valid][usespd]
 
-            # Performance limits on speed will be applied in traf.update
-            if bs.traf.actwp.spdcon[idx]<0. and bs.traf.swvnavspd[idx]:
-                bs.traf.actwp.spd[idx] = rtacas
-                #print("setspeedforRTA: xtorta =",xtorta)
-
-            return rtacas
-        else:
-            return False
+        return rtacas
 
     @stack.command(name='ALT')
     def selaltcmd(self, idx: 'acid', alt: 'alt', vspd: 'vspd'=None):
@@ -852,7 +938,7 @@ def calcvrta(v0, dx, deltime, trafax):
     # Calculate required target ground speed v1 [m/s]
     # to meet an RTA at this leg
     #
-    # Arguments are scalar
+    # Arguments are arrays (or scalars)
     #
     #   v0      = current ground speed [m/s]
     #   dx      = leg distance [m]
@@ -863,10 +949,7 @@ def calcvrta(v0, dx, deltime, trafax):
     dt = deltime
 
     # Do we need decelerate or accelerate
-    if v0 * dt < dx:
-        ax = max(0.01,abs(trafax))
-    else:
-        ax = -max(0.01,abs(trafax))
+    ax = np.where(v0 * dt < dx, 1., -1.) * np.maximum(0.01, np.abs(trafax))
 
     # Solve 2nd order equation for v1 which results from:
     #
@@ -885,31 +968,23 @@ def calcvrta(v0, dx, deltime, trafax):
     D = b * b - 4. * a * c
 
     # Possibly two v1 solutions
-    vlst = []
-
-    if D >= 0.:
-        x1 = (-b - sqrt(D)) / (2. * a)
-        x2 = (-b + sqrt(D)) / (2. * a)
+    sqrtD = np.sqrt(np.maximum(0., D))
+    x1 = (-b - sqrtD) / (2. * a)
+    x2 = (-b + sqrtD) / (2. * a)
 
-        # Check solutions for v1
-        for v1 in (x1, x2):
-            dtacc = (v1 - v0) / ax
-            dtconst = dt - dtacc
-
-            # Physically possible: both dtacc and dtconst >0
-            if dtacc >= 0 and dtconst >= 0.:
-                vlst.append(v1)
-
-    if len(vlst) == 0:  # Not possible? Maybe borderline, so then simple calculation
-        vtarg = dx/dt
+    # Check solutions for v1
+    # Physically possible: both dtacc and dtconst >0
+    dtacc1 = (x1 - v0) / ax
+    dtacc2 = (x2 - v0) / ax
+    valid1 = (D >= 0.) * (dtacc1 >= 0.) * (dt - dtacc1 >= 0.)
+    valid2 = (D >= 0.) * (dtacc2 >= 0.) * (dt - dtacc2 >= 0.)
 
     # Just in case both would be valid, take closest to v0
-    elif len(vlst) == 2:
-        vtarg = vlst[int(abs(vlst[1] - v0) < abs(vlst[0] - v0))]
-
     # Normal case is one solution
-    else:
-        vtarg = vlst[0]
+    # Not possible? Maybe borderline, so then simple calculation
+    vtarg = np.where(valid1 * valid2,
+                     np.where(np.abs(x2 - v0) < np.abs(x1 - v0), x2, x1),
+                     np.where(valid1, x1, np.where(valid2, x2, dx / dt)))
 
     return vtarg
 
@@ -5,93 +5,73 @@ KL204 ATALT FL100 KL204 SPD 350
 import numpy as np
 import bluesky as bs
 from bluesky import stack
+from bluesky.core import timed_function
 from bluesky.tools.geo import qdrdist
 
+# Update interval of the conditional commands, 0 to check them every simulation timestep
+bs.settings.set_variable_defaults(cond_dt=0.0)
+
 # Enumerated condtion types
 alttype, spdtype, postype = 0, 1, 2
 
 
 class Condition():
+    ''' Conditional commands, stored per condition in arrays.
+
+        Conditions are keyed by the unique id (uid) of their aircraft, which
+        doesn't change when other aircraft are deleted or when the aircraft
+        is renamed. Deleting an aircraft therefore doesn't touch the
+        conditions: conditions of aircraft that no longer exist are dropped
+        in the same vectorized pass that removes the triggered conditions.
+    '''
     def __init__(self):
 
         self.ncond = 0  # Number of conditions
 
-        self.id       = []                         # Id of aircraft of condition
-        self.condtype = np.array([],dtype=int)     # Condition type (0=alt,1=spd)
-        self.target   = np.array([],dtype=float)   # Target value (alt,speed,distance[nm])
-        self.lastdif  = np.array([],dtype=float)   # Difference during last update
-        self.posdata  = []                         # Data for postype: tuples lat[deg],lon[deg] of ref position
-        self.cmd      = []                         # Commands to be issued
+        self.uid      = np.array([],dtype=np.int64)  # Unique id of aircraft of condition
+        self.condtype = np.array([],dtype=int)       # Condition type (0=alt,1=spd,2=pos)
+        self.target   = np.array([],dtype=float)     # Target value (alt,speed,distance[nm])
+        self.lastdif  = np.array([],dtype=float)     # Difference during last update
+        self.lat      = np.array([],dtype=float)     # Reference position for postype [deg]
+        self.lon      = np.array([],dtype=float)
+        self.cmd      = []                           # Commands to be issued
+
+    def reset(self):
+        self.__init__()
 
+    @timed_function(name='cond', dt=bs.settings.cond_dt, manual=True, stagger=True)
     def update(self):
         if self.ncond==0:
             return
 
-        # Update indices based on list of id's
-        acidxlst = np.array(bs.traf.id2idx(self.id))
-        if len(acidxlst)>0:
-            idelcond = sorted(list(np.where(acidxlst<0)[0]))
-            for i in idelcond[::-1]:
-                del (self.id[i])
-                self.condtype = np.delete(self.condtype, i)
-                self.target = np.delete(self.target, i)
-                self.lastdif = np.delete(self.lastdif, i)
-                del self.posdata[i]
-                del self.cmd[i]
-
-            self.ncond = len(self.id)
-            if self.ncond==0:
-                return
-            acidxlst = np.array(bs.traf.id2idx(self.id))
-
-        # Check condition types
-        actdist = np.ones(self.ncond)*999e9  # Invalid number which never triggers anything is extremely large
-        for j in range(self.ncond):
-            if self.condtype[j] == postype:
-                qdr,dist = qdrdist(bs.traf.lat[acidxlst[j]],bs.traf.lon[acidxlst[j]],self.posdata[j][0],self.posdata[j][1])
-                actdist[j] = dist # [nm]
+        # Current index of the aircraft of each condition, -1 when deleted
+        acidx = bs.traf.uid2idx(self.uid)
+        exists = acidx >= 0
 
         # Get relevant actual value using index list as index to numpy arrays
-        self.actual = (self.condtype == alttype) * bs.traf.alt[acidxlst] + \
-                      (self.condtype == spdtype) * bs.traf.cas[acidxlst] + \
-                      (self.condtype == postype) * actdist
+        actual = np.full(self.ncond, 999e9)  # Invalid number which never triggers anything
+        isalt = (self.condtype == alttype) & exists
+        isspd = (self.condtype == spdtype) & exists
+        ispos = (self.condtype == postype) & exists
+        actual[isalt] = bs.traf.alt[acidx[isalt]]
+        actual[isspd] = bs.traf.cas[acidx[isspd]]
+        if ispos.any():
+            _, actual[ispos] = qdrdist(bs.traf.lat[acidx[ispos]], bs.traf.lon[acidx[ispos]],
+                                       self.lat[ispos], self.lon[ispos])  # [nm]
 
         # Compare sign of actual difference with sign of last difference
-        actdif       = self.target - self.actual
-
-        # Make sorted arrya of indices of true conditions and their conditional commands
-        idxtrue      = sorted(list(np.where(actdif*self.lastdif <= 0.0)[0]))# Sign changed
+        actdif = self.target - actual
+        istrue = exists & (actdif * self.lastdif <= 0.0)  # Sign changed
         self.lastdif = actdif
-        if idxtrue==None or len(idxtrue)==0:
-            return
 
+        # Execute commands found to have true condition, in order of creation
+        for i in np.flatnonzero(istrue):
+            stack.stack(self.cmd[i])
 
-        # Execute commands found to have true condition
-        for i in idxtrue:
-            if i>=0:
-                stack.stack(self.cmd[i])
-                # debug
-                # stack.stack(" ECHO Conditional command issued: "+self.cmd[i])
-
-        # Delete executed commands to clean up arrays and lists
-        # from highest index to lowest for consistency
-        for i in idxtrue[::-1]:
-            if i>=0:
-                del self.id[i]
-                self.condtype = np.delete(self.condtype,i)
-                self.target   = np.delete(self.target,i)
-                self.lastdif  = np.delete(self.lastdif,i)
-                del self.posdata[i]
-                del self.cmd[i]
-
-        # Adjust number of conditions
-        self.ncond = len(self.id)
-
-        if self.ncond!=len(self.cmd):
-            print ("self.ncond=",self.ncond)
-            print ("self.cmd=",self.cmd)
-            print ("traffic/conditional.py: self.delcondition: invalid condition array size")
-        return
+        # Remove executed conditions, and conditions of deleted aircraft
+        keep = exists & ~istrue
+        if not keep.all():
+            self.delcondition(keep)
 
     def ataltcmd(self,acidx,targalt,cmdtxt):
         actalt = bs.traf.alt[acidx]
@@ -109,35 +89,25 @@ class Condition():
         return True
 
     def addcondition(self,acidx, icondtype, target, actual, cmdtxt,latlon=None):
-        #print ("addcondition:", acidx, icondtype, target, actual, cmdtxt, latlon)
-
         # Add condition to arrays
-        self.id.append(bs.traf.id[acidx])
-
+        lat, lon = latlon or (np.nan, np.nan)
+        self.uid      = np.append(self.uid,bs.traf.uid[acidx])
         self.condtype = np.append(self.condtype,icondtype)
         self.target   = np.append(self.target,target)
         self.lastdif  = np.append(self.lastdif,target - actual)
-
-        self.posdata.append(latlon)
+        self.lat      = np.append(self.lat,lat)
+        self.lon      = np.append(self.lon,lon)
         self.cmd.append(cmdtxt)
 
         self.ncond = self.ncond+1
-        #print("addcondition: self.ncond",self.ncond)
-        return
-
-    def renameac(self,oldid,newid):
-        # Continonal commands are stored per id (ac name)
-        # When renamed, call this method to update list
-        # rename ids in list of ids
-        # Call this if RENAME command is implemented
-        if self.id.count(old.id) == 0:
-            return
-        for i in range(len(self.id)):
-            if self.id[i] == oldid:
-                self.id[i] = newid
-        return
-
-
-
-
 
+    def delcondition(self, keep):
+        ''' Keep only the conditions for which boolean array keep is True. '''
+        self.uid      = self.uid[keep]
+        self.condtype = self.condtype[keep]
+        self.target   = self.target[keep]
+        self.lastdif  = self.lastdif[keep]
+        self.lat      = self.lat[keep]
+        self.lon      = self.lon[keep]
+        self.cmd      = [cmd for cmd, k in zip(self.cmd, keep) if k]
+        self.ncond    = len(self.cmd)
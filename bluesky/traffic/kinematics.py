@@ -0,0 +1,228 @@
+""" Fused, in-place kinematics update of all aircraft. """
+import numpy as np
+import bluesky as bs
+from bluesky.tools.aero import fpm, ft, g0, gamma, R, p0, rho0, Rearth
+
+
+# fused_kinematics: Update the aircraft states in place, using preallocated
+#                   scratch buffers, instead of Traffic.update_airspeed,
+#                   update_groundspeed and update_pos
+bs.settings.set_variable_defaults(fused_kinematics=False)
+
+
+class Kinematics:
+    ''' In-place version of the kinematics update of Traffic.
+
+        Performs the same numpy operations in the same order as
+        Traffic.update_airspeed, update_groundspeed and update_pos, so the
+        results are identical, but writes all results into the existing
+        traffic arrays and all intermediate results into a fixed set of
+        scratch buffers, instead of allocating new arrays for both every
+        step. The atmosphere (p, rho, Temp) calculated at the start of
+        Traffic.update is reused for the CAS and Mach conversions.
+
+        Because the traffic arrays are updated in place, code that needs
+        the state of a previous step should keep a copy, not a reference.
+    '''
+    def __init__(self):
+        self.f = []  # Float scratch buffers
+        self.b = []  # Boolean scratch buffers
+        # Buffers for the traffic states that are not traffic arrays, but
+        # are recalculated for all aircraft every step
+        self.swaltsel = np.zeros(0, dtype=bool)
+        self.az = np.zeros(0)
+
+    def buffers(self, n):
+        ''' Return the scratch buffers, reallocated when the number of
+            aircraft has changed. '''
+        if not self.f or len(self.f[0]) != n:
+            self.f = [np.empty(n) for _ in range(4)]
+            self.b = [np.empty(n, dtype=bool) for _ in range(2)]
+            self.swaltsel = np.zeros(n, dtype=bool)
+            self.az = np.zeros(n)
+        return self.f, self.b
+
+    def update(self, traf):
+        ''' Update the speeds, heading and position of all aircraft. '''
+        # Arrays that are shared with another array (gs and tas, trk and hdg
+        # in the windless case of Traffic.update_groundspeed) can't be
+        # updated in place on their own
+        if traf.gs is traf.tas:
+            traf.gs = traf.tas.copy()
+        if traf.trk is traf.hdg:
+            traf.trk = traf.hdg.copy()
+
+        self.update_airspeed(traf, bs.sim.simdt)
+        self.update_groundspeed(traf, bs.sim.simdt)
+        self.update_pos(traf, bs.sim.simdt)
+
+    def update_airspeed(self, traf, simdt):
+        (f0, f1, f2, f3), (b0, b1) = self.buffers(traf.ntraf)
+        apas = traf.aporasas
+        traf.swaltsel, traf.az = self.swaltsel, self.az
+
+        # Compute horizontal acceleration
+        np.subtract(apas.tas, traf.tas, out=f0)         # delta_spd
+        np.multiply(simdt, traf.perf.axmax, out=f1)
+        np.abs(f1, out=f1)
+        np.abs(f0, out=f2)
+        np.greater(f2, f1, out=b0)                      # need_ax
+        np.sign(f0, out=f0)
+        np.multiply(b0, f0, out=f0)
+        np.multiply(f0, traf.perf.axmax, out=traf.ax)
+        # Update velocities
+        np.multiply(traf.ax, simdt, out=f0)
+        np.add(traf.tas, f0, out=f0)
+        np.copyto(traf.tas, apas.tas)
+        np.copyto(traf.tas, f0, where=b0)
+
+        # CAS, as vtas2cas
+        tas, p, rho = traf.tas, traf.p, traf.rho
+        np.multiply(rho, tas, out=f0)
+        np.multiply(f0, tas, out=f0)
+        np.multiply(7., p, out=f1)
+        np.divide(f0, f1, out=f0)
+        np.add(1., f0, out=f0)
+        np.power(f0, 3.5, out=f0)
+        np.subtract(f0, 1., out=f0)
+        np.multiply(p, f0, out=f0)                      # qdyn
+        np.divide(f0, p0, out=f0)
+        np.add(f0, 1., out=f0)
+        np.power(f0, 2. / 7., out=f0)
+        np.subtract(f0, 1., out=f0)
+        np.multiply(7. * p0 / rho0, f0, out=f0)
+        np.sqrt(f0, out=traf.cas)
+        np.less(tas, 0, out=b1)
+        np.negative(traf.cas, out=traf.cas, where=b1)
+
+        # Mach number, as vtas2mach
+        np.multiply(gamma * R, traf.Temp, out=f0)
+        np.sqrt(f0, out=f0)
+        np.divide(tas, f0, out=traf.M)
+
+        # Turning
+        np.greater(traf.ap.turnphi, traf.eps, out=b0)
+        np.copyto(f0, traf.ap.bankdef)
+        np.copyto(f0, traf.ap.turnphi, where=b0)
+        np.maximum(tas, traf.eps, out=f1)
+        np.divide(f0, f1, out=f0)
+        np.tan(f0, out=f0)
+        np.multiply(g0, f0, out=f0)
+        np.degrees(f0, out=f0)                          # turnrate
+        np.subtract(apas.hdg, traf.hdg, out=f1)
+        np.add(f1, 180, out=f1)
+        np.remainder(f1, 360, out=f1)
+        np.subtract(f1, 180, out=f1)                    # delhdg
+        np.multiply(simdt, f0, out=f0)
+        np.abs(f0, out=f2)
+        np.abs(f1, out=f3)
+        np.greater(f3, f2, out=traf.swhdgsel)
+
+        # Update heading
+        np.sign(f1, out=f1)
+        np.multiply(f0, f1, out=f0)
+        np.add(traf.hdg, f0, out=f0)
+        np.copyto(traf.hdg, apas.hdg)
+        np.copyto(traf.hdg, f0, where=traf.swhdgsel)
+        np.remainder(traf.hdg, 360.0, out=traf.hdg)
+
+        # Update vertical speed (alt select, capture and hold autopilot mode)
+        np.subtract(apas.alt, traf.alt, out=f0)         # delta_alt
+        np.multiply(simdt, apas.vs, out=f1)
+        np.abs(f1, out=f1)
+        np.multiply(simdt, traf.vs, out=f2)
+        np.abs(f2, out=f2)
+        np.maximum(f1, f2, out=f1)
+        np.multiply(1.05, f1, out=f1)
+        np.abs(f0, out=f2)
+        np.greater(f2, f1, out=traf.swaltsel)
+        np.sign(f0, out=f0)
+        np.multiply(traf.swaltsel, f0, out=f0)
+        np.abs(apas.vs, out=f1)
+        np.multiply(f0, f1, out=f0)                     # target_vs
+        np.subtract(f0, traf.vs, out=f1)                # delta_vs
+        np.abs(f1, out=f2)
+        np.greater(f2, 300 * fpm, out=b0)               # need_az
+        np.sign(f1, out=f1)
+        np.multiply(b0, f1, out=f1)
+        np.multiply(f1, 300 * fpm, out=traf.az)
+        np.multiply(traf.az, simdt, out=f1)
+        np.add(traf.vs, f1, out=f1)
+        np.copyto(traf.vs, f0)
+        np.copyto(traf.vs, f1, where=b0)
+        np.isfinite(traf.vs, out=b0)
+        np.logical_not(b0, out=b0)
+        np.copyto(traf.vs, 0, where=b0)
+
+    def update_groundspeed(self, traf, simdt):
+        (f0, f1, f2, f3), (b0, b1) = self.buffers(traf.ntraf)
+
+        # Compute ground speed and track from heading, airspeed and wind
+        np.radians(traf.hdg, out=f0)
+        np.cos(f0, out=f1)
+        np.multiply(traf.tas, f1, out=traf.gsnorth)
+        np.sin(f0, out=f1)
+        np.multiply(traf.tas, f1, out=traf.gseast)
+        if traf.wind.winddim == 0:  # no wind
+            np.copyto(traf.gs, traf.tas)
+            np.copyto(traf.trk, traf.hdg)
+            traf.windnorth[:], traf.windeast[:] = 0.0, 0.0
+
+        else:
+            np.greater(traf.alt, 50. * ft, out=b0)      # applywind
+            np.logical_not(b0, out=b1)
+
+            vnwnd, vewnd = traf.wind.getdata(traf.lat, traf.lon, traf.alt)
+            traf.windnorth[:], traf.windeast[:] = vnwnd, vewnd
+            np.multiply(traf.windnorth, b0, out=f0)
+            np.add(traf.gsnorth, f0, out=traf.gsnorth)
+            np.multiply(traf.windeast, b0, out=f0)
+            np.add(traf.gseast, f0, out=traf.gseast)
+
+            np.square(traf.gsnorth, out=f0)
+            np.square(traf.gseast, out=f1)
+            np.add(f0, f1, out=f0)
+            np.sqrt(f0, out=f0)
+            np.multiply(b0, f0, out=f0)
+            np.multiply(b1, traf.tas, out=traf.gs)
+            np.add(traf.gs, f0, out=traf.gs)
+
+            np.arctan2(traf.gseast, traf.gsnorth, out=f0)
+            np.degrees(f0, out=f0)
+            np.multiply(b0, f0, out=f0)
+            np.remainder(f0, 360., out=f0)
+            np.multiply(b1, traf.hdg, out=traf.trk)
+            np.add(traf.trk, f0, out=traf.trk)
+
+        np.multiply(traf.gs, traf.gs, out=f0)
+        np.multiply(traf.vs, traf.vs, out=f1)
+        np.add(f0, f1, out=f0)
+        np.sqrt(f0, out=f0)
+        np.multiply(traf.perf.thrust, simdt, out=f1)
+        np.multiply(f1, f0, out=f0)
+        np.add(traf.work, f0, out=traf.work)
+
+    def update_pos(self, traf, simdt):
+        (f0, f1, f2, f3), (b0, b1) = self.buffers(traf.ntraf)
+
+        # Update position
+        np.multiply(traf.vs, simdt, out=f0)
+        np.add(traf.alt, f0, out=f0)
+        np.round(f0, 6, out=f0)
+        np.copyto(traf.alt, traf.aporasas.alt)
+        np.copyto(traf.alt, f0, where=traf.swaltsel)
+
+        np.multiply(simdt, traf.gsnorth, out=f0)
+        np.divide(f0, Rearth, out=f0)
+        np.degrees(f0, out=f0)
+        np.add(traf.lat, f0, out=traf.lat)
+        np.deg2rad(traf.lat, out=f0)
+        np.cos(f0, out=traf.coslat)
+        np.multiply(simdt, traf.gseast, out=f0)
+        np.divide(f0, traf.coslat, out=f0)
+        np.divide(f0, Rearth, out=f0)
+        np.degrees(f0, out=f0)
+        np.add(traf.lon, f0, out=traf.lon)
+
+        np.multiply(traf.gs, simdt, out=f0)
+        np.add(traf.distflown, f0, out=traf.distflown)
@@ -0,0 +1,80 @@
+""" Incremental bearing and distance from each aircraft to its active waypoint. """
+import numpy as np
+import bluesky as bs
+from bluesky.core import TrafficArrays
+from bluesky.tools import geo
+from bluesky.tools.aero import nm
+
+
+# legcache:           Use the incremental calculation instead of the exact one every step
+# legcache_steps:     Maximum number of steps between exact calculations
+# legcache_maxshift:  Exact calculation when an aircraft has moved more than this
+#                     fraction of its distance to the waypoint since the last one
+bs.settings.set_variable_defaults(legcache=False, legcache_steps=20,
+                                  legcache_maxshift=0.05)
+
+
+class LegGeometry(TrafficArrays):
+    ''' Cached bearing and distance to the active waypoint of all aircraft.
+
+        When a waypoint becomes active, the great-circle bearing and
+        distance to it are calculated, and stored as a north/east vector
+        from the aircraft to the waypoint. In the following steps this
+        vector is updated with the flat-earth displacement of the aircraft
+        since then. The exact calculation is repeated every legcache_steps
+        steps, and as soon as the aircraft has moved more than a fraction
+        legcache_maxshift of the distance to its waypoint, which keeps the
+        error small close to the waypoint.
+    '''
+    def __init__(self):
+        super().__init__()
+        with self.settrafarrays():
+            self.valid  = np.array([], dtype=bool)  # False until the first exact calculation
+            self.age    = np.array([], dtype=int)   # Steps since the last exact calculation
+            self.lat0   = np.array([])  # [deg] Aircraft position at the last exact calculation
+            self.lon0   = np.array([])  # [deg]
+            self.wplat  = np.array([])  # [deg] Waypoint position at the last exact calculation
+            self.wplon  = np.array([])  # [deg]
+            self.north0 = np.array([])  # [m] Vector from aircraft to waypoint at
+            self.east0  = np.array([])  # [m] the last exact calculation
+            self.mlat   = np.array([])  # [m/deg] Length of a degree of latitude at lat0
+            self.mlon   = np.array([])  # [m/deg] Length of a degree of longitude at lat0
+
+    def qdrdist(self, lat, lon, wplat, wplon):
+        ''' Bearing [deg] and distance [nm] from all aircraft at lat, lon to
+            their active waypoint at wplat, wplon, like geo.qdrdist. '''
+        # Displacement since the last exact calculation [m]
+        dlon   = (lon - self.lon0 + 180.) % 360. - 180.
+        dnorth = (lat - self.lat0) * self.mlat
+        deast  = dlon * self.mlon
+        north  = self.north0 - dnorth
+        east   = self.east0 - deast
+        # Bearing relative to the local north, which turns with the meridians
+        qdr    = np.degrees(np.arctan2(east, north)) + \
+            dlon * np.sin(np.radians(0.5 * (lat + self.lat0)))
+        dist   = np.sqrt(north * north + east * east) / nm
+
+        # Exact calculation for new waypoints, periodically, and when the
+        # aircraft has moved too far for the flat-earth approximation
+        maxshift = bs.settings.legcache_maxshift
+        exact = np.logical_not(self.valid) | (self.age >= bs.settings.legcache_steps) | \
+            (wplat != self.wplat) | (wplon != self.wplon) | \
+            (dnorth * dnorth + deast * deast >
+             maxshift * maxshift * (self.north0 * self.north0 + self.east0 * self.east0))
+        self.age += 1
+
+        idx = np.flatnonzero(exact)
+        if len(idx):
+            qdr[idx], dist[idx] = geo.qdrdist(lat[idx], lon[idx], wplat[idx], wplon[idx])
+            self.valid[idx]  = True
+            self.age[idx]    = 0
+            self.lat0[idx]   = lat[idx]
+            self.lon0[idx]   = lon[idx]
+            self.wplat[idx]  = wplat[idx]
+            self.wplon[idx]  = wplon[idx]
+            self.north0[idx] = dist[idx] * nm * np.cos(np.radians(qdr[idx]))
+            self.east0[idx]  = dist[idx] * nm * np.sin(np.radians(qdr[idx]))
+            self.mlat[idx]   = np.radians(geo.rwgs84(lat[idx]))
+            self.mlon[idx]   = self.mlat[idx] * np.cos(np.radians(lat[idx]))
+
+        return qdr, dist
@@ -176,158 +176,164 @@ class BADA(PerfBase):
         # note: coefficients are initialized in SI units
 
         # general
-        # designate aircraft to its aircraft type
+        # designate aircraft to its aircraft type, and group the new aircraft
+        # by type, so that a batch of aircraft can have mixed types
+        ntraf = len(self.mass)
+        coeffs = dict()
         for i, actype in enumerate(actypes):
             syn, coeff = coeff_bada.getCoefficients(actype)
-            if syn:
-                continue
-            syn, coeff = coeff_bada.getCoefficients('B744')
-            bs.traf.type[-n + i] = syn.accode
-
-            if not settings.verbose:
-                if not self.warned:
-                    print("Aircraft is using default B747-400 performance.")
-                    self.warned = True
-            else:
-                print("Flight " + bs.traf.id[-n:] + " has an unknown aircraft type, " + actype + ", BlueSky then uses default B747-400 performance.")
-
-        # designate aicraft to its aircraft type
-        self.jet[-n:]       = 1 if coeff.engtype == 'Jet' else 0
-        self.turbo[-n:]     = 1 if coeff.engtype == 'Turboprop' else 0
-        self.piston[-n:]    = 1 if coeff.engtype == 'Piston' else 0
-
-        # Initial aircraft mass is currently reference mass.
-        # BADA 3.12 also supports masses between 1.2*mmin and mmax
-        self.mass[-n:]      = coeff.m_ref * 1000.0
-        self.mmin[-n:]      = coeff.m_min * 1000.0
-        self.mmax[-n:]      = coeff.m_max * 1000.0
-
-
-        # self.mpyld = np.append(self.mpyld, coeff.mpyld[coeffidx]*1000)
-        self.gw[-n:]        = coeff.mass_grad * ft
-
-        # Surface Area [m^2]
-        self.Sref[-n:]      = coeff.S
-
-        # flight envelope
-        # minimum speeds per phase
-        self.vmto[-n:]      = coeff.Vstall_to * coeff.CVmin_to * kts
-        self.vmic[-n:]      = coeff.Vstall_ic * coeff.CVmin * kts
-        self.vmcr[-n:]      = coeff.Vstall_cr * coeff.CVmin * kts
-        self.vmap[-n:]      = coeff.Vstall_ap * coeff.CVmin * kts
-        self.vmld[-n:]      = coeff.Vstall_ld * coeff.CVmin * kts
-        self.vmin[-n:]      = 0.0
-        self.vmo[-n:]       = coeff.VMO * kts
-        self.mmo[-n:]       = coeff.MMO
-        self.vmax[-n:]      = self.vmo[-n:]
-
-        # max. altitude parameters
-        self.hmo[-n:]       = coeff.h_MO * ft
-        self.hmax[-n:]      = coeff.h_max * ft
-        self.hmaxact[-n:]   = coeff.h_max * ft  # initialize with hmax
-        self.gt[-n:]        = coeff.temp_grad * ft
-
-        # max thrust setting
-        self.maxthr[-n:]    = 1e6  # initialize with excessive setting to avoid unrealistic limit setting
-
-        # Buffet Coefficients
-        self.clbo[-n:]      = coeff.Clbo
-        self.k[-n:]         = coeff.k
-        self.cm16[-n:]      = coeff.CM16
-
-        # reference speeds
-        # reference CAS speeds
-        self.cascl[-n:]     = coeff.CAScl1[0] * kts
-        self.cascr[-n:]     = coeff.CAScr1[0] * kts
-        self.casdes[-n:]    = coeff.CASdes1[0] * kts
-
-        # reference mach numbers
-        self.macl[-n:]      = coeff.Mcl[0]
-        self.macr[-n:]      = coeff.Mcr[0]
-        self.mades[-n:]     = coeff.Mdes[0]
-
-        # reference speed during descent
-        self.vdes[-n:]      = coeff.Vdes_ref * kts
-        self.mdes[-n:]      = coeff.Mdes_ref
-
-        # aerodynamics
-        # parasitic drag coefficients per phase
-        self.cd0to[-n:]     = coeff.CD0_to
-        self.cd0ic[-n:]     = coeff.CD0_ic
-        self.cd0cr[-n:]     = coeff.CD0_cr
-        self.cd0ap[-n:]     = coeff.CD0_ap
-        self.cd0ld[-n:]     = coeff.CD0_ld
-        self.gear[-n:]      = coeff.CD0_gear
-
-        # induced drag coefficients per phase
-        self.cd2to[-n:]     = coeff.CD2_to
-        self.cd2ic[-n:]     = coeff.CD2_ic
-        self.cd2cr[-n:]     = coeff.CD2_cr
-        self.cd2ap[-n:]     = coeff.CD2_ap
-        self.cd2ld[-n:]     = coeff.CD2_ld
-
-        # reduced climb coefficient
-        self.cred[-n:] = np.where(
-            self.jet[-n:], coeff.Cred_jet,
-            np.where(self.turbo[-n:], coeff.Cred_turboprop, coeff.Cred_piston)
-        )
-
-        # commented due to vectrization
-        # # NOTE: model only validated for jet and turbo aircraft
-        # if self.piston[-n:] and not self.warned2:
-        #     print "Using piston aircraft performance.",
-        #     print "Not valid for real performance calculations."
-        #     self.warned2 = True
-
-        # performance
-
-        # max climb thrust coefficients
-        self.ctcth1[-n:]    = coeff.CTC[0]  # jet/piston [N], turboprop [ktN]
-        self.ctcth2[-n:]    = coeff.CTC[1]  # [ft]
-        self.ctcth3[-n:]    = coeff.CTC[2]  # jet [1/ft^2], turboprop [N], piston [ktN]
-
-        # 1st and 2nd thrust temp coefficient
-        self.ctct1[-n:]     = coeff.CTC[3]  # [k]
-        self.ctct2[-n:]     = coeff.CTC[4]  # [1/k]
-        self.dtemp[-n:]     = 0.0  # [k], difference from current to ISA temperature. At the moment: 0, as ISA environment
-
-        # Descent Fuel Flow Coefficients
-        # Note: Ctdes,app and Ctdes,lnd assume a 3 degree descent gradient during app and lnd
-        self.ctdesl[-n:]    = coeff.CTdes_low
-        self.ctdesh[-n:]    = coeff.CTdes_high
-        self.ctdesa[-n:]    = coeff.CTdes_app
-        self.ctdesld[-n:]   = coeff.CTdes_land
-
-        # transition altitude for calculation of descent thrust
-        self.hpdes[-n:]     = coeff.Hp_des * ft
-        self.ESF[-n:]       = 1.0  # neutral initialisation
+            if not syn:
+                syn, coeff = coeff_bada.getCoefficients('B744')
+                bs.traf.type[-n + i] = syn.accode
+
+                if not settings.verbose:
+                    if not self.warned:
+                        print("Aircraft is using default B747-400 performance.")
+                        self.warned = True
+                else:
+                    print("Flight " + bs.traf.id[-n + i] + " has an unknown aircraft type, " + actype + ", BlueSky then uses default B747-400 performance.")
+            coeffs.setdefault(id(coeff), (coeff, []))[1].append(ntraf - n + i)
+
+        for coeff, idx in coeffs.values():
+            idx = np.array(idx)
+
+            # designate aicraft to its aircraft type
+            self.jet[idx]       = 1 if coeff.engtype == 'Jet' else 0
+            self.turbo[idx]     = 1 if coeff.engtype == 'Turboprop' else 0
+            self.piston[idx]    = 1 if coeff.engtype == 'Piston' else 0
+
+            # Initial aircraft mass is currently reference mass.
+            # BADA 3.12 also supports masses between 1.2*mmin and mmax
+            self.mass[idx]      = coeff.m_ref * 1000.0
+            self.mmin[idx]      = coeff.m_min * 1000.0
+            self.mmax[idx]      = coeff.m_max * 1000.0
+
+
+            # self.mpyld = np.append(self.mpyld, coeff.mpyld[coeffidx]*1000)
+            self.gw[idx]        = coeff.mass_grad * ft
+
+            # Surface Area [m^2]
+            self.Sref[idx]      = coeff.S
+
+            # flight envelope
+            # minimum speeds per phase
+            self.vmto[idx]      = coeff.Vstall_to * coeff.CVmin_to * kts
+            self.vmic[idx]      = coeff.Vstall_ic * coeff.CVmin * kts
+            self.vmcr[idx]      = coeff.Vstall_cr * coeff.CVmin * kts
+            self.vmap[idx]      = coeff.Vstall_ap * coeff.CVmin * kts
+            self.vmld[idx]      = coeff.Vstall_ld * coeff.CVmin * kts
+            self.vmin[idx]      = 0.0
+            self.vmo[idx]       = coeff.VMO * kts
+            self.mmo[idx]       = coeff.MMO
+            self.vmax[idx]      = self.vmo[idx]
+
+            # max. altitude parameters
+            self.hmo[idx]       = coeff.h_MO * ft
+            self.hmax[idx]      = coeff.h_max * ft
+            self.hmaxact[idx]   = coeff.h_max * ft  # initialize with hmax
+            self.gt[idx]        = coeff.temp_grad * ft
+
+            # max thrust setting
+            self.maxthr[idx]    = 1e6  # initialize with excessive setting to avoid unrealistic limit setting
 
-        # flight phase
-        self.phase[-n:]       = PHASE["None"]
-        self.post_flight[-n:] = False  # we assume prior
-        self.pf_flag[-n:]     = True
+            # Buffet Coefficients
+            self.clbo[idx]      = coeff.Clbo
+            self.k[idx]         = coeff.k
+            self.cm16[idx]      = coeff.CM16
 
-        # Thrust specific fuel consumption coefficients
-        # prevent from division per zero in fuelflow calculation
-        self.cf1[-n:]       = coeff.Cf1
-        self.cf2[-n:]       = 1.0 if coeff.Cf2 < 1e-9 else coeff.Cf2
-        self.cf3[-n:]       = coeff.Cf3
-        self.cf4[-n:]       = 1.0 if coeff.Cf4 < 1e-9 else coeff.Cf4
-        self.cf_cruise[-n:] = coeff.Cf_cruise
+            # reference speeds
+            # reference CAS speeds
+            self.cascl[idx]     = coeff.CAScl1[0] * kts
+            self.cascr[idx]     = coeff.CAScr1[0] * kts
+            self.casdes[idx]    = coeff.CASdes1[0] * kts
 
-        self.thrust[-n:] = 0.0
-        self.D[-n:]         = 0.0
-        self.fuelflow[-n:]  = 0.0
+            # reference mach numbers
+            self.macl[idx]      = coeff.Mcl[0]
+            self.macr[idx]      = coeff.Mcr[0]
+            self.mades[idx]     = coeff.Mdes[0]
 
-        self.E[-n:]         = 0.0
+            # reference speed during descent
+            self.vdes[idx]      = coeff.Vdes_ref * kts
+            self.mdes[idx]      = coeff.Mdes_ref
+
+            # aerodynamics
+            # parasitic drag coefficients per phase
+            self.cd0to[idx]     = coeff.CD0_to
+            self.cd0ic[idx]     = coeff.CD0_ic
+            self.cd0cr[idx]     = coeff.CD0_cr
+            self.cd0ap[idx]     = coeff.CD0_ap
+            self.cd0ld[idx]     = coeff.CD0_ld
+            self.gear[idx]      = coeff.CD0_gear
+
+            # induced drag coefficients per phase
+            self.cd2to[idx]     = coeff.CD2_to
+            self.cd2ic[idx]     = coeff.CD2_ic
+            self.cd2cr[idx]     = coeff.CD2_cr
+            self.cd2ap[idx]     = coeff.CD2_ap
+            self.cd2ld[idx]     = coeff.CD2_ld
+
+            # reduced climb coefficient
+            self.cred[idx] = np.where(
+                self.jet[idx], coeff.Cred_jet,
+                np.where(self.turbo[idx], coeff.Cred_turboprop, coeff.Cred_piston)
+            )
+
+            # commented due to vectrization
+            # # NOTE: model only validated for jet and turbo aircraft
+            # if self.piston[idx] and not self.warned2:
+            #     print "Using piston aircraft performance.",
+            #     print "Not valid for real performance calculations."
+            #     self.warned2 = True
 
-        # ground
-        self.tol[-n:]       = coeff.TOL
-        self.ldl[-n:]       = coeff.LDL
-        self.ws[-n:]        = coeff.wingspan
-        self.len[-n:]       = coeff.length
-        # for now, BADA aircraft have the same acceleration as deceleration
-        self.gr_acc[-n:]    = coeff.gr_acc
+            # performance
+
+            # max climb thrust coefficients
+            self.ctcth1[idx]    = coeff.CTC[0]  # jet/piston [N], turboprop [ktN]
+            self.ctcth2[idx]    = coeff.CTC[1]  # [ft]
+            self.ctcth3[idx]    = coeff.CTC[2]  # jet [1/ft^2], turboprop [N], piston [ktN]
+
+            # 1st and 2nd thrust temp coefficient
+            self.ctct1[idx]     = coeff.CTC[3]  # [k]
+            self.ctct2[idx]     = coeff.CTC[4]  # [1/k]
+            self.dtemp[idx]     = 0.0  # [k], difference from current to ISA temperature. At the moment: 0, as ISA environment
+
+            # Descent Fuel Flow Coefficients
+            # Note: Ctdes,app and Ctdes,lnd assume a 3 degree descent gradient during app and lnd
+            self.ctdesl[idx]    = coeff.CTdes_low
+            self.ctdesh[idx]    = coeff.CTdes_high
+            self.ctdesa[idx]    = coeff.CTdes_app
+            self.ctdesld[idx]   = coeff.CTdes_land
+
+            # transition altitude for calculation of descent thrust
+            self.hpdes[idx]     = coeff.Hp_des * ft
+            self.ESF[idx]       = 1.0  # neutral initialisation
+
+            # flight phase
+            self.phase[idx]       = PHASE["None"]
+            self.post_flight[idx] = False  # we assume prior
+            self.pf_flag[idx]     = True
+
+            # Thrust specific fuel consumption coefficients
+            # prevent from division per zero in fuelflow calculation
+            self.cf1[idx]       = coeff.Cf1
+            self.cf2[idx]       = 1.0 if coeff.Cf2 < 1e-9 else coeff.Cf2
+            self.cf3[idx]       = coeff.Cf3
+            self.cf4[idx]       = 1.0 if coeff.Cf4 < 1e-9 else coeff.Cf4
+            self.cf_cruise[idx] = coeff.Cf_cruise
+
+            self.thrust[idx] = 0.0
+            self.D[idx]         = 0.0
+            self.fuelflow[idx]  = 0.0
+
+            self.E[idx]         = 0.0
+
+            # ground
+            self.tol[idx]       = coeff.TOL
+            self.ldl[idx]       = coeff.LDL
+            self.ws[idx]        = coeff.wingspan
+            self.len[idx]       = coeff.length
+            # for now, BADA aircraft have the same acceleration as deceleration
+            self.gr_acc[idx]    = coeff.gr_acc
 
     def update(self, dt):
         ''' Periodic update function for performance calculations. '''
@@ -5,12 +5,34 @@ from numpy import *
 import bluesky as bs
 from bluesky.tools import geo
 from bluesky.core import Replaceable
-from bluesky.tools.aero import ft, kts, g0, nm, mach2cas, casormach2tas
+from bluesky.tools.aero import ft, kts, g0, nm, mach2cas, vcasormach2tas
 from bluesky.tools.misc import degto180, txt2tim, txt2alt, txt2spd
 from bluesky.tools.position import txt2pos
 from bluesky import stack
 from bluesky.stack.cmdparser import Command, command, commandgroup
+from bluesky.traffic.routetable import RouteTable
 
+def nextindex(mask):
+    """ For each element, return the index of the first True element of mask
+        at or after it, or -1 if there is none. """
+    n = len(mask)
+    idx = minimum.accumulate(where(mask, arange(n), n)[::-1])[::-1]
+    return where(idx < n, idx, -1)
+
+
+class WaypointColumn:
+    """ Route attribute that is a view on a column of the route table,
+        with the waypoints of this route. """
+    def __init__(self, col):
+        self.col = col
+
+    def __get__(self, route, owner=None):
+        if route is None:
+            return self
+        return getattr(route.table, self.col)[route.table.rows(route.rid)]
+
+    def __set__(self, route, value):
+        getattr(route.table, self.col)[route.table.rows(route.rid)] = value
 
 
 class Route(Replaceable):
@@ -23,6 +45,10 @@ class Route(Replaceable):
 
     For lat/lon waypoints: use call sign as wpname, number will be added
 
+    The waypoint data of all routes is stored in a RouteTable. The
+    waypoint attributes of a route (wpname, wplat, ...) are numpy views
+    on the rows of this route in the table.
+
     Created by  : Jacco M. Hoekstra
     """
 
@@ -37,31 +63,74 @@ class Route(Replaceable):
     # Aircraft route objects
     _routes = WeakValueDictionary()
 
-    def __init__(self, acid):
+    # Waypoint data
+    wpname  = WaypointColumn('name')    # Waypoint names for this flight plan
+    wptype  = WaypointColumn('type')    # Waypoint types
+    wplat   = WaypointColumn('lat')     # Waypoint latitudes
+    wplon   = WaypointColumn('lon')     # Waypoint longitudes
+    wpalt   = WaypointColumn('alt')     # [m] negative value means not specified
+    wpspd   = WaypointColumn('spd')     # [m/s] negative value means not specified
+    wprta   = WaypointColumn('rta')     # [s] negative value means not specified
+    wpflyby = WaypointColumn('flyby')   # Flyby (True)/flyover(False) switch
+    wpstack = WaypointColumn('stack')   # Stack with command execured when passing this waypoint
+
+    # Made for drones: fly turn mode, means use specified turn radius and optionally turn speed
+    wpflyturn = WaypointColumn('flyturn')   # Flyturn (True) or flyover/flyby (False) switch
+    wpturnrad = WaypointColumn('turnrad')   # [nm] Turn radius per waypoint (<0 = not specified)
+    wpturnspd = WaypointColumn('turnspd')   # [kts] Turn speed (IAS/CAS) per waypoint (<0 = not specified)
+
+    # Flight plan data, calculated by calcfp
+    wpdirfrom = WaypointColumn('dirfrom')
+    wpdistto  = WaypointColumn('distto')
+    wpialt    = WaypointColumn('ialt')
+    wptoalt   = WaypointColumn('toalt')
+    wpxtoalt  = WaypointColumn('xtoalt')
+    wpirta    = WaypointColumn('irta')
+    wptorta   = WaypointColumn('torta')
+    wpxtorta  = WaypointColumn('xtorta')
+
+    def __init__(self, acid='', table=None):
         # Add self to dictionary of all aircraft routes
         Route._routes[acid] = self
         # Aircraft id (callsign) of the aircraft to which this route belongs
         self.acid = acid
-        self.nwp = 0
-
-       # Waypoint data
-        self.wpname = []    # List of waypoint names for this flight plan
-        self.wptype = []    # List of waypoint types
-        self.wplat  = []    # List of waypoint latitudes
-        self.wplon  = []    # List of waypoint longitudes
-        self.wpalt  = []    # [m] negative value means not specified
-        self.wpspd  = []    # [m/s] negative value means not specified
-        self.wprta  = []    # [m/s] negative value means not specified
-        self.wpflyby = []   # Flyby (True)/flyover(False) switch
-        self.wpstack = []   # Stack with command execured when passing this waypoint
-
-        # Made for drones: fly turn mode, means use specified turn radius and optionally turn speed
-        self.wpflyturn = []   # Flyturn (True) or flyover/flyby (False) switch
-        self.wpturnrad = []   # [nm] Turn radius per waypoint (<0 = not specified)
-        self.wpturnspd = []   # [kts] Turn speed (IAS/CAS) per waypoint (<0 = not specified)
-
-        # Current actual waypoint
-        self.iactwp = -1
+
+        # Waypoint table in which this route is stored, and id of this route
+        self.table = RouteTable() if table is None else table
+        self.rid = self.table.newroute()
+        self.clear()
+
+    @property
+    def nwp(self):
+        """ Number of waypoints in this route. """
+        return int(self.table.nwp[self.rid])
+
+    @property
+    def iactwp(self):
+        """ Index of the current active waypoint. """
+        return int(self.table.iactwp[self.rid])
+
+    @iactwp.setter
+    def iactwp(self, value):
+        self.table.iactwp[self.rid] = value
+
+    @property
+    def flag_landed_runway(self):
+        """ True when the aircraft has landed on a runway of this route. """
+        return bool(self.table.landed[self.rid])
+
+    @flag_landed_runway.setter
+    def flag_landed_runway(self, value):
+        self.table.landed[self.rid] = value
+
+    def wpindex(self, name):
+        """ Index of waypoint name in the route, -1 if not in the route. """
+        idx = flatnonzero(self.wpname == name)
+        return int(idx[0]) if len(idx) else -1
+
+    def clear(self):
+        """ Remove all waypoints, and return to the default settings. """
+        self.table.clear(self.rid)
 
         # Set to default addwpt wpmode
         # Note that neither flyby nor flyturn means: flyover)
@@ -77,14 +146,6 @@ class Route(Replaceable):
         # default: False
         self.flag_landed_runway = False
 
-        self.wpdirfrom = []
-        self.wpdistto  = []
-        self.wpialt    = []
-        self.wptoalt   = []
-        self.wpxtoalt  = []
-        self.wptorta   = []
-        self.wpxtorta  = []
-
     @staticmethod
     def get_available_name(data, name_, len_=2):
         """
@@ -95,11 +156,11 @@ class Route(Replaceable):
         fmt_ = "{:0" + str(len_) + "d}"
 
         # Avoid using call sign without number
-        if bs.traf.id.count(name_) > 0:
+        if name_ in bs.traf.idmap:
             appi = 1
             name_ = name_+fmt_.format(appi)
 
-        while data.count(name_) > 0 :
+        while name_ in data:
             appi += 1
             name_ = name_[:-len_]+fmt_.format(appi)
         return name_
@@ -112,7 +173,7 @@ class Route(Replaceable):
         TURNSPEED or TURNRADIUS.'''
         # Get aircraft route
         acid = bs.traf.id[acidx]
-        acrte = Route._routes.get(acid)
+        acrte = bs.traf.ap.route[acidx]
         # First, we want to check what 'mode' is, and then call addwptStack 
         # accordingly.
         if mode in ['FLYBY', 'FLYOVER', 'FLYTURN']:
@@ -145,7 +206,7 @@ class Route(Replaceable):
         """ADDWPT acid, (wpname/lat,lon),[alt],[spd],[afterwp],[beforewp]"""
         # First get the appropriate ac route
         acid = bs.traf.id[acidx]
-        acrte = Route._routes.get(acid)
+        acrte = bs.traf.ap.route[acidx]
         
         #debug print ("addwptStack:",args)
         #print("active = ",self.wpname[self.iactwp])
@@ -326,7 +387,7 @@ class Route(Replaceable):
             if rwyrteidx > 0:
                 afterwp = acrte.wpname[rwyrteidx]
 
-            elif acrte.wptype and acrte.wptype[0] == Route.orig:
+            elif acrte.nwp > 0 and acrte.wptype[0] == Route.orig:
                 afterwp = acrte.wpname[0]
 
             else:
@@ -335,11 +396,9 @@ class Route(Replaceable):
 
             name = "T/O-" + acid # Use lat/lon naming convention
         # Add waypoint
+        # Add waypoint (this also recalculates the flight plan)
         wpidx = acrte.addwpt(acidx, name, wptype, lat, lon, alt, spd, afterwp, beforewp)
 
-        # Recalculate flight plan
-        acrte.calcfp()
-
         # Check for success by checking inserted location in flight plan >= 0
         if wpidx < 0:
             return False, "Waypoint " + name + " not added."
@@ -355,7 +414,7 @@ class Route(Replaceable):
             #print("direct ",self.wpname[norig])
             bs.traf.swlnav[acidx] = True
 
-        if afterwp and acrte.wpname.count(afterwp) == 0:
+        if afterwp and afterwp not in acrte.wpname:
             print(afterwp, acrte.wpname)
             return True, "Waypoint " + afterwp + " not found\n" + \
                 "waypoint added at end of route"
@@ -371,7 +430,7 @@ class Route(Replaceable):
             return
 
         acid = bs.traf.id[acidx]
-        acrte = Route._routes.get(acid)
+        acrte = bs.traf.ap.route[acidx]
 
         args = reshape(args, (int(len(args)/6), 6))
 
@@ -408,18 +467,21 @@ class Route(Replaceable):
 
             wpidx = acrte.addwpt_simple(acidx, name, wptype, lat, lon, alt, spd)
 
-        # Calculate flight plan
-        acrte.calcfp()
+        # Calculate flight plan and update autopilot settings once for all
+        # added waypoints
+        if 0 <= acrte.iactwp < acrte.nwp:
+            acrte.direct(acidx, acrte.wpname[acrte.iactwp])
+        else:
+            acrte.calcfp()
 
         # Check for success by checking inserted location in flight plan >= 0
         if wpidx < 0:
             return False, "Waypoint " + name + " not added."
 
     def addwpt_simple(self, iac, name, wptype, lat, lon, alt=-999., spd=-999.):
-        """Adds waypoint in the most simple way possible"""
-        # For safety
-        self.nwp = len(self.wplat)
-
+        """Adds waypoint in the most simple way possible.
+           The flight plan calculation and autopilot update are left to the
+           caller, so that they are done once when adding many waypoints."""
         name = name.upper().strip()
 
         wplat = lat
@@ -432,19 +494,109 @@ class Route(Replaceable):
         self.addwpt_data(
             False, self.nwp, newname, wplat, wplon, wptype, alt, spd)
 
-        idx = self.nwp
-        self.nwp += 1
+        idx = self.nwp - 1
 
         #update qdr and "last waypoint switch" in traffic
         if idx>=0:
             bs.traf.actwp.next_qdr[iac] = self.getnextqdr()
             bs.traf.actwp.swlastwp[iac] = (self.iactwp==self.nwp-1)
 
-        # Update autopilot settings
+        return idx
+
+    @stack.command(name='ROUTE', annotations='acid,txt,...')
+    @staticmethod
+    def routecmd(acidx, *names):
+        """ROUTE acid wpt1 wpt2 ...
+
+           Add a list of navaids, fixes and/or airports to the route of an
+           aircraft in one go, with the same result as an ADDWPT command
+           per name."""
+        if not names:
+            return False, "ROUTE: no waypoints given"
+
+        missing = bs.traf.ap.route[acidx].addnavwpts(acidx, names)
+        if missing:
+            return False, "Waypoint(s) " + " ".join(missing) + " not found."
+        return True
+
+    def addnavwpts(self, iac, names):
+        """Append navaids, fixes and/or airports given by name to the route,
+           before the destination if there is one.
+           All names are looked up in the navigation database at once, the
+           waypoints are inserted in one go, and the flight plan is calculated
+           once. Returns the names that were not found, in which case no
+           waypoints are added."""
+        names = [name.upper().strip() for name in names]
+
+        # Airports are placed at the nearest navaid/fix with the same name,
+        # if there is one
+        iapt = bs.navdb.getaptidxs(names)
+        isapt = iapt >= 0
+        aptlat = where(isapt, bs.navdb.aptlat[iapt], 999999.)
+        aptlon = where(isapt, bs.navdb.aptlon[iapt], 999999.)
+
+        # Other names get the navaid/fix nearest to the previous waypoint,
+        # starting from the aircraft position or the last waypoint before
+        # the destination
+        if self.nwp == 0:
+            lat0, lon0 = bs.traf.lat[iac], bs.traf.lon[iac]
+        elif self.wptype[-1] != Route.dest or self.nwp == 1:
+            lat0, lon0 = self.wplat[-1], self.wplon[-1]
+        else:
+            lat0, lon0 = self.wplat[-2], self.wplon[-2]
+
+        # Start with the first occurrence of each name, and repeat the lookup
+        # with the resulting previous waypoints until no choice changes, which
+        # takes at most one pass per waypoint plus one
+        iwp = bs.navdb.getwpidxs(names, aptlat, aptlon)
+        notfound = (iwp < 0) & ~isapt
+        if any(notfound):
+            return [name for name, nf in zip(names, notfound) if nf]
+
+        for _ in range(len(names) + 1):
+            lat = where(iwp >= 0, bs.navdb.wplat[iwp], aptlat)
+            lon = where(iwp >= 0, bs.navdb.wplon[iwp], aptlon)
+            reflat = where(isapt, aptlat, concatenate(([lat0], lat[:-1])))
+            reflon = where(isapt, aptlon, concatenate(([lon0], lon[:-1])))
+            newiwp = bs.navdb.getwpidxs(names, reflat, reflon)
+            if all(newiwp == iwp):
+                break
+            iwp = newiwp
+
+        # Give waypoints that are already in the route a numbered name
+        usednames = set(self.wpname)
+        for i, name in enumerate(names):
+            names[i] = Route.get_available_name(usednames, name)
+            usednames.add(names[i])
+
+        # Insert all waypoints at once, just before the destination if any
+        n = len(names)
+        if self.nwp > 0 and self.wptype[-1] == Route.dest:
+            wpidx = self.nwp - 1
+        else:
+            wpidx = self.nwp
+        self.table.insert(self.rid, wpidx, n)
+        new = slice(wpidx, wpidx + n)
+        self.wpname[new]    = names
+        self.wplat[new]     = (lat + 90.) % 180. - 90.
+        self.wplon[new]     = (lon + 180.) % 360. - 180.
+        self.wptype[new]    = Route.wpnav
+        self.wpflyby[new]   = self.swflyby
+        self.wpflyturn[new] = self.swflyturn
+        self.wpturnrad[new] = self.turnrad
+        self.wpturnspd[new] = self.turnspd
+
+        #update qdr and "last waypoint switch" in traffic
+        bs.traf.actwp.next_qdr[iac] = self.getnextqdr()
+        bs.traf.actwp.swlastwp[iac] = (self.iactwp==self.nwp-1)
+
+        # Update autopilot settings and flight plan once for all waypoints
         if 0 <= self.iactwp < self.nwp:
             self.direct(iac, self.wpname[self.iactwp])
+        else:
+            self.calcfp()
 
-        return idx
+        return []
 
     @stack.command
     @staticmethod
@@ -470,9 +622,9 @@ class Route(Replaceable):
         ''' AT acid, wpinroute [DEL] ALT/SPD/DO alt/spd/stack command'''
         # args = wpname,SPD/ALT, spd/alt(string)
         acid = bs.traf.id[acidx]
-        acrte = Route._routes.get(acid)
-        if atwp in acrte.wpname:
-            wpidx = acrte.wpname.index(atwp)
+        acrte = bs.traf.ap.route[acidx]
+        wpidx = acrte.wpindex(atwp)
+        if wpidx >= 0:
 
             if not args or \
                     (len(args) == 1 and not args[0].count("/") == 1):
@@ -604,7 +756,7 @@ class Route(Replaceable):
 
                     # IF command starts with aircraft id, it is not missing
                     cmd = args[1].upper()
-                    if not(cmd in bs.traf.id):
+                    if not(cmd in bs.traf.idmap):
                         # Look up arg types
                         try:
                             cmdobj = Command.cmddict.get(cmd)
@@ -612,7 +764,7 @@ class Route(Replaceable):
                             # Command found, check arguments
                             argtypes = cmdobj.annotations
 
-                            if argtypes[0]=="acid" and not (args[2].upper() in bs.traf.id):
+                            if argtypes[0]=="acid" and not (args[2].upper() in bs.traf.idmap):
                                 # missing acid, so add ownship acid
                                 acrte.wpstack[wpidx].append(acid+" "+" ".join(args[1:]))
                             else:
@@ -680,34 +832,21 @@ class Route(Replaceable):
         wplat = (wplat + 90.) % 180. - 90.
         wplon = (wplon + 180.) % 360. - 180.
 
-        if overwrt:
-            self.wpname[wpidx]  = wpname
-            self.wplat[wpidx]   = wplat
-            self.wplon[wpidx]   = wplon
-            self.wpalt[wpidx]   = wpalt
-            self.wpspd[wpidx]   = wpspd
-            self.wptype[wpidx]  = wptype
-            self.wpflyby[wpidx] = self.swflyby
-            self.wpflyturn[wpidx] = self.swflyturn
-            self.wpturnrad[wpidx] = self.turnrad
-            self.wpturnspd[wpidx] = self.turnspd
-            self.wprta[wpidx]   = -999.0 # initially no RTA
-            self.wpstack[wpidx] = []
-
-        else:
-            self.wpname.insert(wpidx, wpname)
-            self.wplat.insert(wpidx, wplat)
-            self.wplon.insert(wpidx, wplon)
-            self.wpalt.insert(wpidx, wpalt)
-            self.wpspd.insert(wpidx, wpspd)
-            self.wptype.insert(wpidx, wptype)
-            self.wpflyby.insert(wpidx, self.swflyby)
-            self.wpflyturn.insert(wpidx, self.swflyturn)
-            self.wpturnrad.insert(wpidx, self.turnrad)
-            self.wpturnspd.insert(wpidx, self.turnspd)
-            self.wprta.insert(wpidx,-999.0)       # initially no RTA
-            self.wpstack.insert(wpidx,[])
-
+        if not overwrt:
+            self.table.insert(self.rid, wpidx)
+
+        self.wpname[wpidx]  = wpname
+        self.wplat[wpidx]   = wplat
+        self.wplon[wpidx]   = wplon
+        self.wpalt[wpidx]   = wpalt
+        self.wpspd[wpidx]   = wpspd
+        self.wptype[wpidx]  = wptype
+        self.wpflyby[wpidx] = self.swflyby
+        self.wpflyturn[wpidx] = self.swflyturn
+        self.wpturnrad[wpidx] = self.turnrad
+        self.wpturnspd[wpidx] = self.turnspd
+        self.wprta[wpidx]   = -999.0 # initially no RTA
+        self.wpstack[wpidx] = []
 
     def addwpt(self, iac, name, wptype, lat, lon, alt=-999., spd=-999., afterwp="", beforewp=""):
         """Adds waypoint an returns index of waypoint, lat/lon [deg], alt[m]"""
@@ -718,9 +857,6 @@ class Route(Replaceable):
 #        print ("spd = ",spd)
 #        print ("afterwp ="+afterwp)
 #        print
-        # For safety
-        self.nwp = len(self.wplat)
-
         name = name.upper().strip()
 
         wplat = lat
@@ -761,7 +897,6 @@ class Route(Replaceable):
                 self.insert_wpt_data(
                     wpidx, wprtename, wplat, wplon, wptype, alt, spd)
 
-                self.nwp += 1
                 if orig and self.iactwp >= 0:
                     self.iactwp += 1
                 elif not orig and self.iactwp < 0 and self.nwp == 1:
@@ -801,11 +936,11 @@ class Route(Replaceable):
 
             if wpok:
 
-                if (afterwp and self.wpname.count(aftwp) > 0) or \
-                        (beforewp and self.wpname.count(bfwp) > 0):
+                if (afterwp and aftwp in self.wpname) or \
+                        (beforewp and bfwp in self.wpname):
 
-                    wpidx = self.wpname.index(aftwp) + 1 if afterwp else \
-                        self.wpname.index(bfwp)
+                    wpidx = self.wpindex(aftwp) + 1 if afterwp else \
+                        self.wpindex(bfwp)
 
                     self.insert_wpt_data(
                         wpidx, newname, wplat, wplon, wptype, alt, spd)
@@ -825,7 +960,6 @@ class Route(Replaceable):
                         False, wpidx, newname, wplat, wplon, wptype, alt, spd)
 
                 idx = wpidx
-                self.nwp += 1
 
             else:
                 idx = -1
@@ -837,14 +971,12 @@ class Route(Replaceable):
             bs.traf.actwp.next_qdr[iac] = self.getnextqdr()
             bs.traf.actwp.swlastwp[iac] = (self.iactwp==self.nwp-1)
 
-        # Update waypoints
-        if not (wptype == Route.calcwp):
-            self.calcfp()
-
-        # Update autopilot settings
+        # Update autopilot settings, which also updates the flight plan,
+        # or only update the flight plan
         if wpok and 0 <= self.iactwp < self.nwp:
             self.direct(iac, self.wpname[self.iactwp])
-
+        elif not (wptype == Route.calcwp):
+            self.calcfp()
 
         return idx
 
@@ -855,8 +987,8 @@ class Route(Replaceable):
         
             Go direct to specified waypoint in route (FMS)"""
         acid = bs.traf.id[acidx]
-        acrte = Route._routes.get(acid)
-        wpidx = acrte.wpname.index(wpname)
+        acrte = bs.traf.ap.route[acidx]
+        wpidx = acrte.wpindex(wpname)
 
         acrte.iactwp = wpidx
         bs.traf.actwp.lat[acidx]    = acrte.wplat[wpidx]
@@ -866,6 +998,9 @@ class Route(Replaceable):
         bs.traf.actwp.turnrad[acidx] = acrte.wpturnrad[wpidx]
         bs.traf.actwp.turnspd[acidx] = acrte.wpturnspd[wpidx]
 
+        # Check for passing the new active waypoint every step until the next full FMS update
+        bs.traf.ap.twpcheck[acidx] = 0.
+
         bs.traf.actwp.nextturnlat[acidx], bs.traf.actwp.nextturnlon[acidx], \
         bs.traf.actwp.nextturnspd[acidx], bs.traf.actwp.nextturnrad[acidx], \
         bs.traf.actwp.nextturnidx[acidx] = acrte.getnextturnwp()
@@ -937,8 +1072,8 @@ class Route(Replaceable):
         
             Add RTA to waypoint record"""
         acid = bs.traf.id[acidx]
-        acrte = Route._routes.get(acid)
-        wpidx = acrte.wpname.index(wpname)
+        acrte = bs.traf.ap.route[acidx]
+        wpidx = acrte.wpindex(wpname)
         acrte.wprta[wpidx] = time
 
         # Recompute route and update actwp because of RTA addition
@@ -954,7 +1089,7 @@ class Route(Replaceable):
             Show list of route in window per page of 5 waypoints/"""
         # First get the appropriate ac route
         acid = bs.traf.id[acidx]
-        acrte = Route._routes.get(acid)
+        acrte = bs.traf.ap.route[acidx]
         if acrte.nwp <= 0:
             return False, "Aircraft has no route."
 
@@ -1037,33 +1172,7 @@ class Route(Replaceable):
 
             # and the aircraft just needs a fixed heading to
             # remain on the runway
-            # syntax: HDG acid,hdg (deg,True)
-            name = self.wpname[self.iactwp]
-
-            # Change RW06,RWY18C,RWY24001 to resp. 06,18C,24
-            if "RWY" in name:
-                rwykey = name[8:10]
-                if len(name)>10:
-                    if not name[10].isdigit():
-                        rwykey = name[8:11]
-            # also if it is only RW
-            else:
-                rwykey = name[7:9]
-                if len(name) > 9:
-                    if not name[9].isdigit():
-                        rwykey = name[7:10]
-
-            # Use this code to look up runway heading
-            wphdg = bs.navdb.rwythresholds[name[:4]][rwykey][2]
-
-            # keep constant runway heading
-            stack.stack("HDG " + str(self.acid) + " " + str(wphdg))
-
-            # start decelerating
-            stack.stack("DELAY " + "10 " + "SPD " + str(self.acid) + " " + "10")
-
-            # delete aircraft
-            stack.stack("DELAY " + "42 " + "DEL " + str(self.acid))
+            self.keeprunway()
 
             swlastwp = (self.iactwp == self.nwp - 1)
 
@@ -1111,6 +1220,78 @@ class Route(Replaceable):
                self.wpturnspd[self.iactwp], \
                nextqdr, swlastwp
 
+    def keeprunway(self):
+        """Issue the commands for an aircraft that has landed on the runway
+           of its active waypoint: keep the runway heading, slow down, and
+           delete the aircraft."""
+        # syntax: HDG acid,hdg (deg,True)
+        name = self.wpname[self.iactwp]
+
+        # Change RW06,RWY18C,RWY24001 to resp. 06,18C,24
+        if "RWY" in name:
+            rwykey = name[8:10]
+            if len(name)>10:
+                if not name[10].isdigit():
+                    rwykey = name[8:11]
+        # also if it is only RW
+        else:
+            rwykey = name[7:9]
+            if len(name) > 9:
+                if not name[9].isdigit():
+                    rwykey = name[7:10]
+
+        # Use this code to look up runway heading
+        wphdg = bs.navdb.rwythresholds[name[:4]][rwykey][2]
+
+        # keep constant runway heading
+        stack.stack("HDG " + str(self.acid) + " " + str(wphdg))
+
+        # start decelerating
+        stack.stack("DELAY " + "10 " + "SPD " + str(self.acid) + " " + "10")
+
+        # delete aircraft
+        stack.stack("DELAY " + "42 " + "DEL " + str(self.acid))
+
+    @staticmethod
+    def getnextwps(table, rid):
+        """Go to the next waypoint in the routes rid (array) in the route
+           table, as getnextwp does for one route. Routes that have landed
+           on a runway keep their active waypoint; their keeprunway commands
+           are left to the caller.
+           Returns the table rows of the new active waypoints, and arrays
+           with the LNAV switch, the direction of the next leg, and the
+           last waypoint switch."""
+        start, nwp = table.start[rid], table.nwp[rid]
+        landed = table.landed[rid]
+
+        # Switch LNAV off when last waypoint has been passed or when landed,
+        # else increase counter
+        lnavon = (table.iactwp[rid] < nwp - 1) & ~landed
+        iactwp = table.iactwp[rid] + lnavon
+        table.iactwp[rid] = iactwp
+        row = start + iactwp
+
+        # Switch to indicate that this is the last waypoint
+        swlastwp = (iactwp == nwp - 1)
+
+        # Direction of the next leg, if any
+        hasnext = (iactwp > -1) & ~swlastwp
+        nextrow = where(hasnext, row + 1, row)
+        nextqdr = full(len(rid), -999.)
+        newleg = hasnext & ~landed
+        if any(newleg):
+            nextqdr[newleg], _ = geo.qdrdist(table.lat[row[newleg]], table.lon[row[newleg]],
+                                             table.lat[nextrow[newleg]], table.lon[nextrow[newleg]])
+
+        # Aircraft flying to a runway that is the last waypoint, or that is
+        # followed by the destination, should remain on the runway
+        onrunway = (table.type[row] == Route.runway) & \
+            ((table.name[row] == table.name[start + nwp - 1]) |
+             (hasnext & (table.type[nextrow] == Route.dest)))
+        table.landed[rid[onrunway]] = True
+
+        return row, lnavon, nextqdr, swlastwp
+
     def runactwpstack(self):
         for cmdline in self.wpstack[self.iactwp]:
             stack.stack(cmdline)
@@ -1131,8 +1312,8 @@ class Route(Replaceable):
             acidx = 0
         # Simple re-initialize this route as empty
         acid = bs.traf.id[acidx]
-        acrte = Route._routes.get(acid)
-        acrte.__init__(acid)
+        acrte = bs.traf.ap.route[acidx]
+        acrte.clear()
 
         # Also disable LNAV,VNAV if route is deleted
         bs.traf.swlnav[acidx]    = False
@@ -1153,24 +1334,16 @@ class Route(Replaceable):
 
         # Look up waypoint
         acid = bs.traf.id[acidx]
-        acrte = Route._routes.get(acid)
-        try:
-            wpidx = acrte.wpname.index(wpname.upper())
-        except ValueError:
+        acrte = bs.traf.ap.route[acidx]
+        wpidx = acrte.wpindex(wpname.upper())
+        if wpidx < 0:
             return False, "Waypoint " + wpname + " not found"
         # check if active way point is the one being deleted and that it is not the last wpt.
         # If active wpt is deleted then change path of aircraft
         if acrte.iactwp == wpidx and not wpidx == acrte.nwp - 1:
             acrte.direct(acidx, acrte.wpname[wpidx + 1])
 
-        acrte.nwp =acrte.nwp - 1
-        del acrte.wpname[wpidx]
-        del acrte.wplat[wpidx]
-        del acrte.wplon[wpidx]
-        del acrte.wpalt[wpidx]
-        del acrte.wpspd[wpidx]
-        del acrte.wprta[wpidx]
-        del acrte.wptype[wpidx]
+        acrte.table.remove(acrte.rid, wpidx)
         if acrte.iactwp > wpidx:
             acrte.iactwp = max(0, acrte.iactwp - 1)
 
@@ -1188,14 +1361,14 @@ class Route(Replaceable):
         """Do flight plan calculations"""
 
         # Remove old top of descents and old top of climbs
-        while self.wpname.count("T/D")>0:
+        while "T/D" in self.wpname:
             self.delwpt("T/D")
 
-        while self.wpname.count("T/C")>0:
+        while "T/C" in self.wpname:
             self.delwpt("T/C")
 
         # Remove old actual position waypoints
-        while self.wpname.count("A/C")>0:
+        while "A/C" in self.wpname:
             self.delwpt("A/C")
 
         # Insert actual position as A/C waypoint
@@ -1311,133 +1484,92 @@ class Route(Replaceable):
                 lat = f*self.wplat[j]+(1.-f)*self.wplat[j+1]
                 lon = f*self.wplon[j]+(1.-f)*self.wplon[j+1]
 
-                self.wpname.insert(j,name[i])
-                self.wptype.insert(j,Route.calcwp)
-                self.wplat.insert(j,lat)
-                self.wplon.insert(j,lon)
-                self.wpalt.insert(j,alt[i])
-                self.wpspd.insert(j,-999.)
+                self.insertcalcwp(j,name[i])
+                self.wplat[j] = lat
+                self.wplon[j] = lon
+                self.wpalt[j] = alt[i]
 
     def insertcalcwp(self, i, name):
         """Insert empty wp with no attributes at location i"""
 
-        self.wpname.insert(i,name)
-        self.wplat.insert(i,0.)
-        self.wplon.insert(i,0.)
-        self.wpalt.insert(i,-999.)
-        self.wpspd.insert(i,-999.)
-        self.wptype.insert(i,Route.calcwp)
+        self.table.insert(self.rid, i)
+        self.wpname[i] = name
+        self.wptype[i] = Route.calcwp
 
     def calcfp(self): # Current Flight Plan calculations, which actualize based on flight condition
         """Do flight plan calculations"""
 #        self.delwpt("T/D")
 #        self.delwpt("T/C")
 
-        # Direction to waypoint
-        self.nwp = len(self.wpname)
-
-        # Create flight plan calculation table
-        self.wpdirfrom   = self.nwp*[0.]
-        self.wpdistto    = self.nwp*[0.]
-        self.wpialt      = self.nwp*[-1]
-        self.wptoalt     = self.nwp*[-999.]
-        self.wpxtoalt    = self.nwp*[1.]  # Avoid division by zero
-        self.wpirta      = self.nwp*[-1]
-        self.wptorta     = self.nwp*[-999.]
-        self.wpxtorta    = self.nwp*[1.]  #[m] Avoid division by zero
+        # Reset flight plan calculation table
+        self.wpdirfrom   = 0.
+        self.wpdistto    = 0.
+        self.wpialt      = -1
+        self.wptoalt     = -999.
+        self.wpxtoalt    = 1.  # Avoid division by zero
+        self.wpirta      = -1
+        self.wptorta     = -999.
+        self.wpxtorta    = 1.  #[m] Avoid division by zero
 
         # No waypoints: make empty variables to be safe and return: nothing to do
         if self.nwp==0:
             return
 
         # Calculate lateral leg data
-        # LNAV: Calculate leg distances and directions
+        # LNAV: Calculate leg distances and directions of all legs at once
+        if self.nwp > 1:
+            qdr, dist = geo.qdrdist(self.wplat[:-1], self.wplon[:-1],
+                                    self.wplat[1:], self.wplon[1:])
+            self.wpdirfrom[:-1] = qdr
+            self.wpdirfrom[-1]  = qdr[-1]
+            self.wpdistto[1:]   = dist #[nm]  distto is in nautical miles
 
-        for i in range(0, self.nwp - 1):
-            qdr,dist = geo.qdrdist(self.wplat[i]  ,self.wplon[i],
-                                self.wplat[i+1],self.wplon[i+1])
-            self.wpdirfrom[i] = qdr
-            self.wpdistto[i+1]  = dist #[nm]  distto is in nautical miles
-
-        if self.nwp>1:
-            self.wpdirfrom[-1] = self.wpdirfrom[-2]
+        # Distance along the route from the first waypoint [m]
+        xroute = cumsum(self.wpdistto * nm)
 
         # Calculate longitudinal leg data
         # VNAV: calc next altitude constraint: index, altitude and distance to it
-        ialt = -1     # index to waypoint with next altitude constraint
-        toalt = -999. # value of next altitude constraint
-        xtoalt = 0.   # distance to next altitude constraint from this wp
-        for i in range(self.nwp-1,-1,-1):
-
-            # waypoint with altitude constraint (dest of al specified)
-            if self.wptype[i]==Route.dest:
-                ialt   = i
-                toalt  = 0.
-                xtoalt = 0.                # [m]
-
-            elif self.wpalt[i] >= 0:
-                ialt   = i
-                toalt  = self.wpalt[i]
-                xtoalt = 0.                # [m]
-
-            # waypoint with no altitude constraint:keep counting
-            else:
-                if i!=self.nwp-1:
-                    xtoalt = xtoalt + self.wpdistto[i+1]*nm  # [m] xtoalt is in meters!
-                else:
-                    xtoalt = 0.0
+        # Waypoints with altitude constraint (dest or alt specified)
+        isdest = self.wptype == Route.dest
+        ialt   = nextindex(isdest | (self.wpalt >= 0))
+        hasalt = ialt >= 0
 
-            self.wpialt[i]   = ialt
-            self.wptoalt[i]  = toalt   #[m]
-            self.wpxtoalt[i] = xtoalt  #[m]
+        self.wpialt   = ialt
+        self.wptoalt  = where(hasalt, where(isdest[ialt], 0., self.wpalt[ialt]), -999.) #[m]
+        # Without a next constraint: distance to the end of the route
+        self.wpxtoalt = xroute[where(hasalt, ialt, -1)] - xroute #[m]
 
-        # RTA: calc next rta constraint: index, altitude and distance to it
+        # RTA: calc next rta constraint: index, time and distance to it
         # If any RTA.
-        if any(array(self.wprta)>=0.0):
-            #print("Yes, I found RTAs")
-            irta = -1       # index of wp
-            torta = -999.   # next rta value
-            xtorta = 0.     # distance to next rta
-            for i in range(self.nwp - 1, -1, -1):
-
-                # waypoint with rta: reset counter, update rts
-                if self.wprta[i] >= 0:
-                    irta = i
-                    torta = self.wprta[i]
-                    xtorta = 0.  # [m]
-
-                # waypoint with no altitude constraint:keep counting
-                else:
-                    if i != self.nwp - 1:
-                        # No speed or rta constraint: add to xtorta
-                        if self.wpspd[i] <= 0.0:
-                            xtorta = xtorta + self.wpdistto[i + 1] * nm  # [m] xtoalt is in meters!
-                        else:
-                            # speed constraint on this leg: shift torta to account for this
-                            # altitude unknown
-                            if self.wptoalt[i] >0.:
-                                alt = toalt
-                            else:
-                                # TODO: current a/c altitude would be better guess, but not accessible here
-                                # as we do not know aircraft index for this route
-                                alt = 10000.*ft # default to minimize errors, when no alt constraints are present
-                            legtas = casormach2tas(self.wpspd[i],alt)
-                            #TODO: account for wind at this position vy adding wind vectors to waypoints?
-
-                            # xtorta stays the same! This leg will not be available for RTA scheduling, so distance
-                            # is not in xtorta. Therefore we need to subtract legtime to ignore this leg for the RTA
-                            # scheduling
-                            legtime = self.wpdistto[i+1]/legtas
-                            torta = torta - legtime
-                    else:
-                        xtorta = 0.0
-                        torta = -999.0
-
-                self.wpirta[i]   = irta
-                self.wptorta[i]  = torta  # [s]
-                self.wpxtorta[i] = xtorta  # [m]
-            #print("wpxtorta=",self.wpxtorta)
-            #print("wptorta=", self.wptorta)
+        hasrta = self.wprta >= 0.0
+        if any(hasrta):
+            irta = nextindex(hasrta)
+            iend = where(irta >= 0, irta, self.nwp - 1)
+
+            # Legs from waypoints with a speed constraint are not available
+            # for RTA scheduling, so their distance is not in xtorta. Instead,
+            # their leg time is subtracted from torta.
+            spdleg = zeros(self.nwp, dtype=bool)
+            spdleg[:-1] = (self.wpspd[:-1] > 0.0) & ~hasrta[:-1]
+            legdist = zeros(self.nwp)
+            legdist[:-1] = self.wpdistto[1:] * nm # [m]
+            legtime = zeros(self.nwp)
+            if any(spdleg):
+                # Altitude unknown: use the next altitude constraint, or
+                # default to 10000 ft to minimize errors
+                # TODO: current a/c altitude would be better guess
+                alt = where(self.wptoalt[spdleg] > 0., self.wptoalt[spdleg], 10000. * ft)
+                legtas = vcasormach2tas(self.wpspd[spdleg], alt)
+                legtime[spdleg] = self.wpdistto[1:][spdleg[:-1]] / legtas
+
+            # Sum leg distances and times from each waypoint to the end
+            xleft = cumsum(where(spdleg | hasrta, 0., legdist)[::-1])[::-1]
+            tleft = cumsum(legtime[::-1])[::-1]
+
+            self.wpirta   = irta
+            self.wptorta  = where(irta >= 0, self.wprta[iend], -999.) \
+                                - (tleft - tleft[iend])  # [s]
+            self.wpxtorta = xleft - xleft[iend]  # [m]
 
     def findact(self,i):
         """ Find best default active waypoint.
@@ -1485,7 +1617,7 @@ class Route(Replaceable):
             Write route to output/routelog.txt.
         """
         acid = bs.traf.id[acidx]
-        acrte = Route._routes.get(acid)
+        acrte = bs.traf.ap.route[acidx]
         # Open file in append mode, write header
         with open(bs.settings.resolve_path(bs.settings.log_path) / 'routelog.txt', "a") as f:
             f.write("\nRoute "+acid+":\n")
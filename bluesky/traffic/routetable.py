@@ -0,0 +1,203 @@
+""" Columnar storage of the waypoints of all aircraft routes. """
+import numpy as np
+
+
+# Waypoint columns, with their type and default value
+columns = {
+    'name':    (object, ''),      # Waypoint name
+    'type':    (int, 0),          # Waypoint type (see Route)
+    'lat':     (float, 0.0),      # [deg] Latitude
+    'lon':     (float, 0.0),      # [deg] Longitude
+    'alt':     (float, -999.),    # [m] Altitude constraint, negative if not specified
+    'spd':     (float, -999.),    # [m/s] Speed constraint, negative if not specified
+    'rta':     (float, -999.),    # [s] Required time of arrival, negative if not specified
+    'flyby':   (bool, True),      # Flyby (True)/flyover(False) switch
+    'flyturn': (bool, False),     # Flyturn (True) or flyover/flyby (False) switch
+    'turnrad': (float, -999.),    # [nm] Turn radius, negative if not specified
+    'turnspd': (float, -999.),    # [m/s] Turn speed, negative if not specified
+    'stack':   (object, None),    # Stack commands executed when passing this waypoint
+    # Flight plan data, calculated by Route.calcfp
+    'dirfrom': (float, 0.),       # [deg] Direction of the leg from this waypoint
+    'distto':  (float, 0.),       # [nm] Length of the leg to this waypoint
+    'ialt':    (int, -1),         # Index of next altitude constraint
+    'toalt':   (float, -999.),    # [m] Next altitude constraint
+    'xtoalt':  (float, 1.),       # [m] Distance to next altitude constraint
+    'irta':    (int, -1),         # Index of next RTA
+    'torta':   (float, -999.),    # [s] Next RTA
+    'xtorta':  (float, 1.)        # [m] Distance to next RTA
+}
+
+# Minimum number of waypoint rows reserved for a route
+mincapacity = 8
+
+
+class RouteTable:
+    ''' Waypoint table for the routes of all aircraft.
+
+        The waypoints of all routes are stored together in one set of
+        numpy arrays (one per column in 'columns'), in a compressed sparse
+        row layout: the waypoints of route rid are the rows
+        start[rid] to start[rid] + nwp[rid]. Each route has cap[rid] rows
+        reserved, so that waypoints can be inserted without moving other
+        routes. A route that outgrows its rows is moved to the end of
+        the table with double capacity. The table is compacted when more
+        than half of its rows are no longer used.
+
+        Routes are identified by a route id, which stays the same during
+        the life of the route.
+    '''
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        ''' Remove all routes. '''
+        # Per route: first row, number of waypoints, number of reserved rows,
+        # active waypoint, and whether the aircraft has landed on a runway
+        self.start  = np.zeros(0, dtype=int)
+        self.nwp    = np.zeros(0, dtype=int)
+        self.cap    = np.zeros(0, dtype=int)
+        self.iactwp = np.zeros(0, dtype=int)
+        self.landed = np.zeros(0, dtype=bool)
+        self.free   = []  # Route ids of deleted routes, available for reuse
+
+        # Waypoint columns, and the number of rows reserved for routes
+        for col, (dtype, _) in columns.items():
+            setattr(self, col, np.zeros(0, dtype=dtype))
+        self.nrows = 0  # End of the last reserved segment
+        self.nused = 0  # Number of reserved rows of existing routes
+
+    def newroute(self):
+        ''' Add an empty route and return its route id. '''
+        if self.free:
+            rid = self.free.pop()
+        else:
+            rid = len(self.start)
+            for name in ('start', 'nwp', 'cap', 'iactwp', 'landed'):
+                setattr(self, name, np.append(getattr(self, name),
+                                              np.zeros(1, getattr(self, name).dtype)))
+        self.start[rid] = self.nrows
+        self.nwp[rid] = 0
+        self.cap[rid] = 0
+        self.iactwp[rid] = -1
+        self.landed[rid] = False
+        return rid
+
+    def delroute(self, rid):
+        ''' Delete route(s) rid, and release their rows. '''
+        for r in np.atleast_1d(rid):
+            self.clear(r)
+            self.nused -= self.cap[r]
+            self.cap[r] = 0
+            self.free.append(r)
+
+    def clear(self, rid):
+        ''' Remove all waypoints from route rid. The reserved rows are kept. '''
+        rows = self.rows(rid)
+        self.name[rows] = ''
+        self.stack[rows] = None
+        self.nwp[rid] = 0
+        self.iactwp[rid] = -1
+        self.landed[rid] = False
+
+    def findnext(self, col, rid, wpidx):
+        ''' For each route in array rid, return the index of the first
+            waypoint at or after the corresponding index in array wpidx
+            for which column col is True, or -1 if there is none. '''
+        count = np.maximum(self.nwp[rid] - wpidx, 0)
+        offset = np.cumsum(count) - count
+        within = np.arange(count.sum()) - np.repeat(offset, count)
+        rows = np.repeat(self.start[rid] + wpidx, count) + within
+        # First match of each route
+        found = np.flatnonzero(getattr(self, col)[rows])
+        route, first = np.unique(np.repeat(np.arange(len(count)), count)[found],
+                                 return_index=True)
+        result = np.full(len(count), -1)
+        result[route] = wpidx[route] + within[found[first]]
+        return result
+
+    def rows(self, rid):
+        ''' Return the slice of table rows with the waypoints of route rid. '''
+        return slice(self.start[rid], self.start[rid] + self.nwp[rid])
+
+    def insert(self, rid, wpidx, n=1):
+        ''' Insert n waypoints with default values in route rid before
+            waypoint wpidx, and return the table row of the first new
+            waypoint. '''
+        nwp = self.nwp[rid]
+        if nwp + n > self.cap[rid]:
+            self.relocate(rid, max(2 * self.cap[rid], nwp + n, mincapacity))
+        start = self.start[rid]
+        row = start + wpidx
+        end = start + nwp
+        for col, (_, default) in columns.items():
+            arr = getattr(self, col)
+            arr[row + n:end + n] = arr[row:end]
+            arr[row:row + n] = default
+        for i in range(row, row + n):
+            self.stack[i] = []
+        self.nwp[rid] = nwp + n
+        return row
+
+    def remove(self, rid, wpidx):
+        ''' Remove waypoint wpidx from route rid. '''
+        start = self.start[rid]
+        row = start + wpidx
+        end = start + self.nwp[rid]
+        for col in columns:
+            arr = getattr(self, col)
+            arr[row:end - 1] = arr[row + 1:end]
+        self.name[end - 1] = ''
+        self.stack[end - 1] = None
+        self.nwp[rid] -= 1
+
+    def relocate(self, rid, cap):
+        ''' Move route rid to the end of the table, with cap reserved rows. '''
+        if self.nrows + cap > len(self.lat):
+            # Reclaim unused rows before growing the table
+            if 2 * (self.nused - self.cap[rid] + cap) < self.nrows:
+                self.compact()
+            if self.nrows + cap > len(self.lat):
+                self.grow(max(2 * len(self.lat), self.nrows + cap))
+
+        rows = self.rows(rid)
+        newstart = self.nrows
+        newrows = slice(newstart, newstart + self.nwp[rid])
+        for col in columns:
+            arr = getattr(self, col)
+            arr[newrows] = arr[rows]
+        self.name[rows] = ''
+        self.stack[rows] = None
+        self.start[rid] = newstart
+        self.nused += cap - self.cap[rid]
+        self.cap[rid] = cap
+        self.nrows = newstart + cap
+
+    def grow(self, size):
+        ''' Increase the number of rows of the table to size. '''
+        for col, (dtype, default) in columns.items():
+            arr = getattr(self, col)
+            newarr = np.full(size, default, dtype=dtype)
+            newarr[:len(arr)] = arr
+            setattr(self, col, newarr)
+
+    def compact(self):
+        ''' Move all routes to the start of the table, keeping their current
+            order in the table, to reclaim the rows of deleted and relocated
+            routes. '''
+        live = np.flatnonzero(self.cap > 0)
+        live = live[np.argsort(self.start[live], kind='stable')]
+        newstart = np.cumsum(self.cap[live]) - self.cap[live]
+        # Gather the waypoint rows of all routes at their new position
+        counts = self.nwp[live]
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        src = np.repeat(self.start[live], counts) + within
+        dst = np.repeat(newstart, counts) + within
+        for col, (dtype, default) in columns.items():
+            arr = getattr(self, col)
+            newarr = np.full(len(arr), default, dtype=dtype)
+            newarr[dst] = arr[src]
+            setattr(self, col, newarr)
+        self.start[live] = newstart
+        self.nrows = self.nused = int(self.cap[live].sum())
+        # Empty routes without reserved rows start at the end of the table
+        self.start[self.cap == 0] = self.nrows
@@ -5,12 +5,13 @@ try:
 except ImportError:
     # In python <3.3 collections.abc doesn't exist
     from collections import Collection
+from itertools import repeat
 from math import *
 from random import randint
 import numpy as np
 
 import bluesky as bs
-from bluesky.core import Entity, timed_function
+from bluesky.core import Entity, profiler, timed_function
 from bluesky.stack import refdata
 from bluesky.stack.recorder import savecmd
 from bluesky.tools import geo
@@ -27,6 +28,7 @@ from .adsbmodel import ADSB
 from .aporasas import APorASAS
 from .autopilot import Autopilot
 from .activewpdata import ActiveWaypoint
+from .kinematics import Kinematics
 from .turbulence import Turbulence
 from .trafficgroups import TrafficGroups
 from .performance.perfbase import PerfBase
@@ -62,6 +64,8 @@ class Traffic(Entity):
         deletall()           : delete all traffic
         update(sim)          : do a numerical integration step
         id2idx(name)         : return index in traffic database of given call sign
+        ids2idx(names)       : return index array of an array of call signs
+        rename(idx,newid)    : change the call sign of an aircraft
         engchange(i,engtype) : change engine type of an aircraft
         setnoise(A)          : Add turbulence
     Members: see create
@@ -76,9 +80,16 @@ class Traffic(Entity):
 
         self.ntraf = 0
 
+        # Unique id for the next created aircraft
+        self.nextuid = 0
+
+        # Index of each aircraft callsign, kept up to date in cre, delete and rename
+        self.idmap = dict()
+
         self.cond = Condition()  # Conditional commands list
         self.wind = WindSim()
         self.turbulence = Turbulence()
+        self.kinematics = Kinematics()  # In-place kinematics, see fused_kinematics
         self.translvl = 5000.*ft # [m] Default transition level
 
         # Default commands issued for an aircraft after creation
@@ -88,6 +99,7 @@ class Traffic(Entity):
             # Aircraft Info
             self.id      = []  # identifier (string)
             self.type    = []  # aircaft type (string)
+            self.uid     = np.array([], dtype=np.int64)  # unique id, increasing with index
 
             # Positions
             self.lat     = np.array([])  # latitude [deg]
@@ -165,6 +177,9 @@ class Traffic(Entity):
         ''' Clear all traffic data upon simulation reset. '''
         # Some child reset functions depend on a correct value of self.ntraf
         self.ntraf = 0
+        self.nextuid = 0
+        self.idmap.clear()
+        self.cond.reset()
         # This ensures that the traffic arrays (which size is dynamic)
         # are all reset as well, so all lat,lon,sdp etc but also objects adsb
         super().reset()
@@ -209,7 +224,7 @@ class Traffic(Entity):
 
         if isinstance(acid, str):
             # Check if not already exist
-            if self.id.count(acid.upper()) > 0:
+            if acid.upper() in self.idmap:
                 return False, acid + " already exists."  # already exists do nothing
             acid = n * [acid]
 
@@ -234,7 +249,10 @@ class Traffic(Entity):
 
         # Aircraft Info
         self.id[-n:]   = acid
+        self.idmap.update(zip(acid, range(self.ntraf - n, self.ntraf)))
         self.type[-n:] = actype
+        self.uid[-n:]  = np.arange(self.nextuid, self.nextuid + n)
+        self.nextuid  += n
 
         # Positions
         self.lat[-n:]  = aclat
@@ -382,29 +400,58 @@ class Traffic(Entity):
         # (which will use list in reverse order to avoid index confusion)
         if isinstance(idx, Collection):
             idx = np.sort(idx)
+            if len(idx) == 0:
+                return True
+            imin = int(idx[0])
+            for i in idx:
+                self.idmap.pop(self.id[i], None)
+        else:
+            imin = int(idx)
+            self.idmap.pop(self.id[idx], None)
 
         # Call the actual delete function
         super().delete(idx)
 
         # Update number of aircraft
         self.ntraf = len(self.lat)
+
+        # Aircraft after the first deleted one have shifted in index
+        self.idmap.update(zip(self.id[imin:], range(imin, self.ntraf)))
         return True
 
+    def rename(self, idx, newid):
+        """ Rename an aircraft. """
+        newid = newid.upper()
+        if newid in self.idmap:
+            return False, newid + " already exists."
+        oldid = self.id[idx]
+        del self.idmap[oldid]
+        self.id[idx] = newid
+        self.idmap[newid] = idx
+        self.ap.route[idx].acid = newid
+        return True, f"{oldid} renamed to {newid}"
+
     def update(self):
         # Update only if there is traffic ---------------------
         if self.ntraf == 0:
             return
 
         #---------- Atmosphere --------------------------------
+        t = profiler.tic()
         self.p, self.rho, self.Temp = vatmos(self.alt)
+        t = profiler.toc('traffic.atmosphere', t)
 
         #---------- ADSB Update -------------------------------
         self.adsb.update()
+        t = profiler.toc('traffic.adsb', t)
 
         #---------- Fly the Aircraft --------------------------
         self.ap.update()  # Autopilot logic
+        t = profiler.toc('traffic.autopilot', t)
         self.update_asas()  # Airborne Separation Assurance
+        t = profiler.toc('traffic.asas', t)
         self.aporasas.update()   # Decide to use autopilot or ASAS for commands
+        t = profiler.toc('traffic.aporasas', t)
 
         #---------- Performance Update ------------------------
         self.perf.update()
@@ -413,20 +460,28 @@ class Traffic(Entity):
         self.aporasas.tas, self.aporasas.vs, self.aporasas.alt = \
             self.perf.limits(self.aporasas.tas, self.aporasas.vs,
                              self.aporasas.alt, self.ax)
+        t = profiler.toc('traffic.performance', t)
 
         #---------- Kinematics --------------------------------
-        self.update_airspeed()
-        self.update_groundspeed()
-        self.update_pos()
+        if bs.settings.fused_kinematics:
+            self.kinematics.update(self)
+        else:
+            self.update_airspeed()
+            self.update_groundspeed()
+            self.update_pos()
+        t = profiler.toc('traffic.kinematics', t)
 
         #---------- Simulate Turbulence -----------------------
         self.turbulence.update()
+        t = profiler.toc('traffic.turbulence', t)
 
         # Check whether new traffic state triggers conditional commands
         self.cond.update()
+        t = profiler.toc('traffic.cond', t)
 
         #---------- Aftermath ---------------------------------
         self.trails.update()
+        profiler.toc('traffic.trails', t)
 
     @timed_function(name='asas', dt=bs.settings.asas_dt, manual=True)
     def update_asas(self):
@@ -510,18 +565,31 @@ class Traffic(Entity):
         """Find index of aircraft id"""
         if not isinstance(acid, str):
             # id2idx is called for multiple id's
-            # Fast way of finding indices of all ACID's in a given list
-            tmp = dict((v, i) for i, v in enumerate(self.id))
-            return [tmp.get(acidi, -1) for acidi in acid]
+            return [self.idmap.get(acidi, -1) for acidi in acid]
         else:
              # Catch last created id (* or # symbol)
             if acid in ('#', '*'):
                 return self.ntraf - 1
 
-            try:
-                return self.id.index(acid.upper())
-            except:
-                return -1
+            return self.idmap.get(acid.upper(), -1)
+
+    def ids2idx(self, acids):
+        """ Find indices of an array of aircraft ids.
+            Returns an integer array, with -1 for ids that don't exist. """
+        acids = np.char.upper(np.asarray(acids, dtype=str)).tolist()
+        return np.fromiter(map(self.idmap.get, acids, repeat(-1, len(acids))),
+                           dtype=int, count=len(acids))
+
+    def uid2idx(self, uid):
+        """ Find indices of (an array of) unique aircraft ids.
+            Returns -1 for aircraft that no longer exist. """
+        # Unique ids are assigned in order of creation, and deletion keeps
+        # the order of the remaining aircraft, so self.uid is always sorted
+        idx = np.searchsorted(self.uid, uid)
+        if self.ntraf == 0:
+            return np.full(np.shape(uid), -1)
+        idx = np.minimum(idx, self.ntraf - 1)
+        return np.where(self.uid[idx] == uid, idx, -1)
 
     def setnoise(self, noise=None):
         """Noise (turbulence, ADBS-transmission noise, ADSB-truncated effect)"""
@@ -694,7 +762,7 @@ class Traffic(Entity):
 
 
                     # How many others?
-                    nother = bs.navdb.wpid.count(wp)-len(iwps)
+                    nother = len(bs.navdb.wpindex[wp])-len(iwps)
                     if nother>0:
                         verb = ["is ","are "][min(1,max(0,nother-1))]
                         lines = lines +"\nThere "+verb + str(nother) +\
@@ -732,7 +800,7 @@ class Traffic(Entity):
         ''' Show conections of a waypoint or airway. '''
         reflat, reflon = bs.scr.getviewctr()
 
-        if bs.navdb.awid.count(key) > 0:
+        if key in bs.navdb.awindex:
             return self.poscommand(key)
 
         # Find connecting airway legs
@@ -3,7 +3,10 @@ from math import *
 import numpy as np
 import bluesky as bs
 from bluesky import settings
-from bluesky.core import TrafficArrays
+from bluesky.core import TrafficArrays, timed_function
+
+# Update interval of the trails, 0 to update every simulation timestep
+settings.set_variable_defaults(trails_dt=0.0)
 
 
 class Trails(TrafficArrays):
@@ -64,15 +67,16 @@ class Trails(TrafficArrays):
     def create(self,n=1):
         super().create(n)
 
-        self.accolor[-1] = self.defcolor
-        self.lastlat[-1] = bs.traf.lat[-1]
-        self.lastlon[-1] = bs.traf.lon[-1]
+        self.accolor[-n:] = n * [self.defcolor]
+        self.lastlat[-n:] = bs.traf.lat[-n:]
+        self.lastlon[-n:] = bs.traf.lon[-n:]
 
+    @timed_function(name='trails', dt=settings.trails_dt, manual=True, stagger=True)
     def update(self):
         self.acid    = bs.traf.id
         if not self.active:
-            self.lastlat = bs.traf.lat
-            self.lastlon = bs.traf.lon
+            self.lastlat = bs.traf.lat.copy()
+            self.lastlon = bs.traf.lon.copy()
             self.lasttim[:] = bs.sim.simt
             return
         """Add linepieces for trails based on traffic data"""
@@ -2,7 +2,10 @@
 import numpy as np
 import bluesky as bs
 from bluesky.tools.aero import Rearth
-from bluesky.core import Entity
+from bluesky.core import Entity, timed_function
+
+# Update interval of the turbulence, 0 to update every simulation timestep
+bs.settings.set_variable_defaults(turbulence_dt=0.0)
 
 
 class Turbulence(Entity, replaceable=True):
@@ -23,11 +26,12 @@ class Turbulence(Entity, replaceable=True):
         # in (horizontal flight direction, horizontal wing direction, vertical)
         self.sd = np.where(self.sd > 1e-6, self.sd, 1e-6)
 
-    def update(self):
+    @timed_function(name='turbulence', dt=bs.settings.turbulence_dt, manual=True, stagger=True)
+    def update(self, dt=bs.settings.simdt):
         if not self.active:
             return
 
-        timescale=np.sqrt(bs.sim.simdt)
+        timescale=np.sqrt(dt)
         # Horizontal flight direction
         turbhf=np.random.normal(0,self.sd[0]*timescale,bs.traf.ntraf) #[m]
 
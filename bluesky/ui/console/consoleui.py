@@ -60,11 +60,13 @@ class ConsoleClient(Client):
     def stream(self, name, data, sender_id):
 
         if name == b'SIMINFO' and ConsoleUI.instance is not None:
-            speed, simdt, simt, simutc, ntraf, state, scenname = data
+            speed, simdt, simt, simutc, ntraf, state, scenname, *profile = data
             simt = tim2txt(simt)[:-3]
             self.setNodeInfo(sender_id, simt, scenname)
             if sender_id == bs.net.actnode():
-                ConsoleUI.instance.set_infoline(f'[b]t:[/b] {simt} [b]dt:[/b] {simdt} [b]Speed:[/b] {speed:.1f} [b]UTC:[/b] {simutc} [b]Mode:[/b] {self.modes[state]} [b]Aircraft:[/b] {ntraf}')
+                # Duration of a simulation step, when the sim is profiling
+                step = f' [b]Step:[/b] {profile[0]["step"]:.2f} ms' if profile and 'step' in profile[0] else ''
+                ConsoleUI.instance.set_infoline(f'[b]t:[/b] {simt} [b]dt:[/b] {simdt} [b]Speed:[/b] {speed:.1f} [b]UTC:[/b] {simutc} [b]Mode:[/b] {self.modes[state]} [b]Aircraft:[/b] {ntraf}{step}')
 
             # concate times of all nodes
             node_times = "".join([self.nodes[key]['time'] for key in self.nodes])
@@ -465,10 +465,14 @@ class Screen:
             if self.navsel != navsel:
                 self.navsel = navsel
 
-                # Make list of indices of waypoints & airports on screen
-
-                self.wpinside = list(np.where(self.onradar(bs.navdb.wplat, \
-                                                           bs.navdb.wplon))[0])
+                # Make list of indices of waypoints & airports on screen,
+                # using the spatial index of the navdb in radar mode
+                if self.swnavdisp:
+                    self.wpinside = list(np.where(self.onradar(bs.navdb.wplat, \
+                                                               bs.navdb.wplon))[0])
+                else:
+                    self.wpinside = bs.navdb.getwpinside(self.lat0, self.lat1,
+                                                         self.lon0, self.lon1)
 
                 self.wptsel = []
                 for i in self.wpinside:
@@ -478,8 +482,12 @@ class Screen:
                         self.wptsel.append(i)
                 self.wptx, self.wpty = self.ll2xy(bs.navdb.wplat, bs.navdb.wplon)
 
-                self.apinside = list(np.where(self.onradar(bs.navdb.aptlat, \
-                                                           bs.navdb.aptlon))[0])
+                if self.swnavdisp:
+                    self.apinside = list(np.where(self.onradar(bs.navdb.aptlat, \
+                                                               bs.navdb.aptlon))[0])
+                else:
+                    self.apinside = bs.navdb.getapinside(self.lat0, self.lat1,
+                                                         self.lon0, self.lon1)
 
                 self.aptsel = []
                 for i in self.apinside:
@@ -297,13 +297,17 @@ class MainWindow(QMainWindow):
 
     def on_simstream_received(self, streamname, data, sender_id):
         if streamname == b'SIMINFO':
-            speed, simdt, simt, simutc, ntraf, state, scenname = data
+            speed, simdt, simt, simutc, ntraf, state, scenname, *profile = data
             simt = tim2txt(simt)[:-3]
             self.setNodeInfo(sender_id, simt, scenname)
             if sender_id == bs.net.actnode():
                 acdata = bs.net.get_nodedata().acdata
-                self.siminfoLabel.setText(u'<b>t:</b> %s, <b>\u0394t:</b> %.2f, <b>Speed:</b> %.1fx, <b>UTC:</b> %s, <b>Mode:</b> %s, <b>Aircraft:</b> %d, <b>Conflicts:</b> %d/%d, <b>LoS:</b> %d/%d'
-                    % (simt, simdt, speed, simutc, self.modes[state], ntraf, acdata.nconf_cur, acdata.nconf_tot, acdata.nlos_cur, acdata.nlos_tot))
+                text = u'<b>t:</b> %s, <b>\u0394t:</b> %.2f, <b>Speed:</b> %.1fx, <b>UTC:</b> %s, <b>Mode:</b> %s, <b>Aircraft:</b> %d, <b>Conflicts:</b> %d/%d, <b>LoS:</b> %d/%d' \
+                    % (simt, simdt, speed, simutc, self.modes[state], ntraf, acdata.nconf_cur, acdata.nconf_tot, acdata.nlos_cur, acdata.nlos_tot)
+                # Duration of a simulation step, when the sim is profiling
+                if profile and 'step' in profile[0]:
+                    text += u', <b>Step:</b> %.2f ms' % profile[0]['step']
+                self.siminfoLabel.setText(text)
 
     def setNodeInfo(self, connid, time, scenname):
         node = self.nodes.get(connid)
@@ -127,9 +127,9 @@ def radarclick(cmdline, lat, lon, acdata=None, route=None):
                     todisplay += str(round(geo.kwikdist(latref, lonref, lat, lon), 6))
 
                 elif clicktype == "apt":
-                    idx = findnearest(lat, lon, bs.navdb.aptlat, bs.navdb.aptlon)
-                    if idx >= 0:
-                        todisplay += bs.navdb.aptid[idx] + " "
+                    idx = bs.navdb.apttree.knearest(lat, lon)
+                    if len(idx) > 0:
+                        todisplay += bs.navdb.aptid[idx[0]] + " "
 
                 elif clicktype == "wpinroute":  # Find nearest waypoint in route
                     if acdata.id.count(args[0]) > 0:
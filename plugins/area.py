@@ -226,7 +226,7 @@ class Area(Entity):
         if not self.swtaxi:
             delidxalt = np.where((self.oldalt >= self.swtaxialt)
                                  * (traf.alt < self.swtaxialt))[0]
-            self.oldalt = traf.alt
+            self.oldalt = traf.alt.copy()
             if len(delidxalt) > 0:
                 traf.delete(list(delidxalt))
 
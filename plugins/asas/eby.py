@@ -26,9 +26,7 @@ class Eby(ConflictResolution):
         # required change in velocity
         dv = np.zeros((ownship.ntraf, 3))
 
-        for ((ac1, ac2), qdr, dist, tcpa, tLOS) in zip(conf.confpairs, conf.qdr, conf.dist, conf.tcpa, conf.tLOS):
-            idx1 = ownship.id.index(ac1)
-            idx2 = intruder.id.index(ac2)
+        for ((idx1, idx2), qdr, dist, tcpa, tLOS) in zip(conf.confpairs_idx.tolist(), conf.qdr, conf.dist, conf.tcpa, conf.tLOS):
             if idx1 > -1 and idx2 > -1:
                 dv_eby = self.Eby_straight(
                     ownship, intruder, conf, qdr, dist, tcpa, tLOS, idx1, idx2)
@@ -4,6 +4,7 @@ from bluesky import stack, traf, sim  #, settings, navdb, traf, sim, scr, tools
 from bluesky.core import Entity, timed_function
 from bluesky.tools import areafilter, datalog, plotter, geo
 from bluesky.tools.aero import nm, ft
+from bluesky.traffic.asas.detection import pairs2idx
 
 # Metrics object
 metrics = None
@@ -88,11 +89,10 @@ class Metrics(Entity):
         confpairs, lospairs, inconf, tcpamax, qdr, dist, dcpa, tcpa, tLOS = \
             traf.cd.detect(traf, traf, np.ones(traf.ntraf) * 20 * nm, traf.cd.hpz, np.ones(traf.ntraf) * 3600)
 
-        if confpairs:
-            own, intr = zip(*confpairs)
-            ownidx = traf.id2idx(own)
+        if len(confpairs):
+            ownidx = pairs2idx(confpairs, traf)[:, 0]
             mask = traf.alt[ownidx] > 70 * ft
-            ownidx = np.array(ownidx)[mask]
+            ownidx = ownidx[mask]
             dcpa = np.array(dcpa)[mask]
             tcpa = np.array(tcpa)[mask]
         else: